@@ -1,28 +1,69 @@
 """Agent for the application."""
 
 import os
-from typing import Set
+import threading
+from typing import Any, Set
 
 from dotenv import load_dotenv
+from langchain_core.language_models import LanguageModelInput
+from langchain_core.runnables import Runnable
 from langchain_openai import ChatOpenAI
-from pydantic import BaseModel
+from pydantic import BaseModel, SecretStr
 
+from agent.http_pool import async_http_client, http_client
+from agent.llm_cache import get_response_cache
+from agent.telemetry import prompt_cache_telemetry
 from agent.tools import tools
 
+MODEL = "gpt-4o-mini"
 
-def create_custom_agent(
-    output_model: BaseModel | None = None, use_tools: bool | Set[str] = True
-):
-    """Create an agent for a user."""
-    load_dotenv()
-    # llm = ChatGoogleGenerativeAI(
-    #     model="gemini-2.5-flash", api_key=os.getenv("GEMINI_API_KEY")
-    # )
-    llm = ChatOpenAI(
-        model="gpt-4o-mini",
-        api_key=os.getenv("OPENAI_API_KEY"),
-        base_url=os.getenv("OPENAI_BASE_URL"),
-    )
+Agent = Runnable[LanguageModelInput, Any]
+
+# 节点每一步都会调用 create_custom_agent，缓存客户端和绑定后的 runnable
+_llm: ChatOpenAI | None = None
+_cache: dict[tuple[type[BaseModel] | None, bool | frozenset[str]], Agent] = {}
+_cache_config: tuple[str | None, ...] | None = None
+_cache_lock = threading.Lock()
+_env_loaded = False
+
+# 变化时需要重新创建客户端的环境变量
+CONFIG_VARIABLES = (
+    "OPENAI_API_KEY",
+    "OPENAI_BASE_URL",
+    "LLM_CACHE",
+    "LLM_CACHE_PATH",
+)
+
+
+def _config() -> tuple[str | None, ...]:
+    """Return the settings the client is built from, loading .env once."""
+    global _env_loaded
+    if not _env_loaded:
+        load_dotenv()
+        _env_loaded = True
+    return tuple(os.getenv(name) for name in CONFIG_VARIABLES)
+
+
+def clear_agent_cache(reload_env: bool = False) -> None:
+    """Forget the cached clients, e.g. after changing the configuration.
+
+    Args:
+        reload_env: Also read the .env file again on the next call.
+    """
+    global _cache_config, _env_loaded, _llm
+    with _cache_lock:
+        _llm = None
+        _cache.clear()
+        _cache_config = None
+        if reload_env:
+            _env_loaded = False
+
+
+def _build(
+    llm: ChatOpenAI,
+    output_model: type[BaseModel] | None,
+    use_tools: bool | Set[str],
+) -> Agent:
     if isinstance(use_tools, Set):
         tools_to_use = [tool for tool in tools if tool.name in use_tools]
     elif use_tools:
@@ -35,3 +76,41 @@ def create_custom_agent(
     if output_model:
         return llm.with_structured_output(output_model, tools=tools_to_use)
     return llm.bind_tools(tools_to_use)
+
+
+def create_custom_agent(
+    output_model: type[BaseModel] | None = None, use_tools: bool | Set[str] = True
+) -> Agent:
+    """Create an agent for a user.
+
+    The client and the runnables derived from it are cached by output model
+    and tool set, so repeated calls only cost a dictionary lookup. The cache
+    is dropped when one of `CONFIG_VARIABLES` changes.
+    """
+    global _cache_config, _llm
+    config = _config()
+    tools_key = frozenset(use_tools) if isinstance(use_tools, Set) else use_tools
+    key = (output_model, tools_key)
+    with _cache_lock:
+        if config != _cache_config:
+            _llm = None
+            _cache.clear()
+            _cache_config = config
+        if (agent := _cache.get(key)) is not None:
+            return agent
+        if _llm is None:
+            api_key, base_url = config[:2]
+            # llm = ChatGoogleGenerativeAI(
+            #     model="gemini-2.5-flash", api_key=os.getenv("GEMINI_API_KEY")
+            # )
+            _llm = ChatOpenAI(
+                model=MODEL,
+                api_key=SecretStr(api_key) if api_key is not None else None,
+                base_url=base_url,
+                http_client=http_client(),
+                http_async_client=async_http_client(),
+                cache=get_response_cache(),
+                callbacks=[prompt_cache_telemetry()],
+            )
+        agent = _cache[key] = _build(_llm, output_model, use_tools)
+        return agent
@@ -0,0 +1,199 @@
+"""Process-wide HTTP connection pool shared by every model client.
+
+`ChatOpenAI` opens its own httpx client by default, so each instance pays
+for new TCP connections and TLS handshakes. `http_client` and
+`async_http_client` return one sync and one async client for the whole
+process; the async client keeps a transport per event loop because httpx
+connections cannot move between loops.
+
+Every request is traced through httpcore, so `pool_metrics` reports how many
+requests were served and how many connections and TLS handshakes they needed.
+
+Configuration is read from the environment:
+
+- `LLM_HTTP_MAX_CONNECTIONS`: connections open at once (default 100). LLM
+  calls go to a single host, so this is effectively the per-host limit.
+- `LLM_HTTP_MAX_KEEPALIVE`: idle connections kept open (default 20).
+- `LLM_HTTP_KEEPALIVE_SECONDS`: how long an idle connection is kept (default 30).
+- `LLM_HTTP2`: `1` to negotiate HTTP/2; needs the `h2` package and falls back
+  to HTTP/1.1 without it.
+"""
+
+import asyncio
+import importlib.util
+import os
+import threading
+import weakref
+from dataclasses import asdict, dataclass
+from typing import Any
+
+import httpx
+
+DEFAULT_MAX_CONNECTIONS = 100
+DEFAULT_MAX_KEEPALIVE = 20
+DEFAULT_KEEPALIVE_SECONDS = 30.0
+
+
+@dataclass
+class PoolMetrics:
+    """Counters of the shared HTTP clients."""
+
+    requests: int = 0
+    responses: int = 0
+    errors: int = 0
+    connections_opened: int = 0
+    tls_handshakes: int = 0
+    http2: bool = False
+
+    @property
+    def reused(self) -> int:
+        """Requests served on a connection opened by an earlier request."""
+        return max(0, self.requests - self.connections_opened)
+
+
+_metrics = PoolMetrics()
+_metrics_lock = threading.Lock()
+
+
+def _count(name: str) -> None:
+    with _metrics_lock:
+        setattr(_metrics, name, getattr(_metrics, name) + 1)
+
+
+def _on_trace(event: str) -> None:
+    if event == "connection.connect_tcp.complete":
+        _count("connections_opened")
+    elif event == "connection.start_tls.complete":
+        _count("tls_handshakes")
+
+
+def _trace(event: str, info: dict[str, Any]) -> None:
+    _on_trace(event)
+
+
+async def _atrace(event: str, info: dict[str, Any]) -> None:
+    _on_trace(event)
+
+
+def _on_request(request: httpx.Request) -> None:
+    _count("requests")
+    request.extensions["trace"] = _trace
+
+
+def _on_response(response: httpx.Response) -> None:
+    _count("responses" if response.status_code < 500 else "errors")
+
+
+async def _aon_request(request: httpx.Request) -> None:
+    _count("requests")
+    request.extensions["trace"] = _atrace
+
+
+async def _aon_response(response: httpx.Response) -> None:
+    _on_response(response)
+
+
+def http2_enabled() -> bool:
+    """Whether HTTP/2 is requested and the `h2` package is available."""
+    requested = os.getenv("LLM_HTTP2", "").lower() in ("1", "true", "yes")
+    return requested and importlib.util.find_spec("h2") is not None
+
+
+def limits() -> httpx.Limits:
+    """Return the connection limits of the shared clients."""
+    return httpx.Limits(
+        max_connections=int(
+            os.getenv("LLM_HTTP_MAX_CONNECTIONS", str(DEFAULT_MAX_CONNECTIONS))
+        ),
+        max_keepalive_connections=int(
+            os.getenv("LLM_HTTP_MAX_KEEPALIVE", str(DEFAULT_MAX_KEEPALIVE))
+        ),
+        keepalive_expiry=float(
+            os.getenv("LLM_HTTP_KEEPALIVE_SECONDS", str(DEFAULT_KEEPALIVE_SECONDS))
+        ),
+    )
+
+
+class _LoopLocalTransport(httpx.AsyncBaseTransport):
+    """Async transport keeping one connection pool per event loop."""
+
+    def __init__(self, limits: httpx.Limits, http2: bool) -> None:
+        self._limits = limits
+        self._http2 = http2
+        self._transports: weakref.WeakKeyDictionary[
+            asyncio.AbstractEventLoop, httpx.AsyncHTTPTransport
+        ] = weakref.WeakKeyDictionary()
+
+    def _transport(self) -> httpx.AsyncHTTPTransport:
+        loop = asyncio.get_running_loop()
+        transport = self._transports.get(loop)
+        if transport is None:
+            transport = self._transports[loop] = httpx.AsyncHTTPTransport(
+                limits=self._limits, http2=self._http2
+            )
+        return transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        return await self._transport().handle_async_request(request)
+
+    async def aclose(self) -> None:
+        transport = self._transports.pop(asyncio.get_running_loop(), None)
+        if transport is not None:
+            await transport.aclose()
+
+
+_client: httpx.Client | None = None
+_async_client: httpx.AsyncClient | None = None
+_clients_lock = threading.Lock()
+
+
+def http_client() -> httpx.Client:
+    """Return the process-wide sync HTTP client."""
+    global _client
+    with _clients_lock:
+        if _client is None:
+            http2 = _metrics.http2 = http2_enabled()
+            _client = httpx.Client(
+                limits=limits(),
+                http2=http2,
+                event_hooks={"request": [_on_request], "response": [_on_response]},
+            )
+        return _client
+
+
+def async_http_client() -> httpx.AsyncClient:
+    """Return the process-wide async HTTP client."""
+    global _async_client
+    with _clients_lock:
+        if _async_client is None:
+            http2 = _metrics.http2 = http2_enabled()
+            _async_client = httpx.AsyncClient(
+                transport=_LoopLocalTransport(limits(), http2),
+                event_hooks={
+                    "request": [_aon_request],
+                    "response": [_aon_response],
+                },
+            )
+        return _async_client
+
+
+def pool_metrics() -> dict[str, int | bool]:
+    """Return the counters of the shared clients, including `reused`."""
+    with _metrics_lock:
+        return {**asdict(_metrics), "reused": _metrics.reused}
+
+
+def reset_pool() -> None:
+    """Close the sync client and forget both clients and the counters.
+
+    Clients created afterwards read the configuration again. The async
+    client is dropped rather than closed because its connections belong to
+    event loops that may be gone.
+    """
+    global _client, _async_client, _metrics
+    with _clients_lock:
+        if _client is not None:
+            _client.close()
+        _client = _async_client = None
+        with _metrics_lock:
+            _metrics = PoolMetrics()
@@ -0,0 +1,505 @@
+"""Persistent cache of model responses.
+
+Many calls in the graphs are deterministic classifications that repeat with
+identical inputs. When `LLM_CACHE` is enabled, the models built by
+`create_custom_agent` look their responses up in a SQLite database first.
+
+Entries are keyed by a SHA-256 of langchain's model description, which
+includes the model, its parameters, the bound tools and the structured
+output schema, and of the messages with their ids removed. The database runs
+in WAL mode so that concurrent readers never wait for a writer. Entries
+older than `LLM_CACHE_TTL_SECONDS` are ignored and purged, and the least
+recently used ones are evicted when the database grows past
+`LLM_CACHE_MAX_MB`.
+
+The cache is bypassed, neither read nor written, for the graph nodes listed
+in `LLM_CACHE_BYPASS_NODES`, and per run through the configurable keys
+`llm_cache` (False disables it) and `llm_cache_bypass` (a list of nodes)::
+
+    graph.invoke(state, {"configurable": {"llm_cache_bypass": ["research_node"]}})
+
+Nodes listed in `LLM_NEAR_CACHE_NODES`, or in the configurable key
+`llm_near_cache`, also accept near duplicates: when the exact lookup misses,
+the MinHash signature of the conversation text is matched through LSH bands
+against the earlier calls with the same model, tools, schema and system
+messages, and the response of the most similar one is returned if its
+estimated similarity is at least `LLM_NEAR_CACHE_THRESHOLD`. Near duplicates
+are only shared within a scope, so one user is never served an answer to
+another user's conversation. The scope is the configurable key
+`llm_near_cache_scope` if set, otherwise the `user_id` of the run context or
+configurable values, otherwise the `thread_id`; runs without any of them do
+not use near duplicates. Every near hit is logged to the JSON lines file
+`LLM_NEAR_CACHE_AUDIT`, together with its scope. A fraction `LLM_NEAR_CACHE_AUDIT_RATE`
+of near hits is not served but sent to the model, and the log records
+whether its answer agreed with the cached one, which measures the false
+positive rate of the threshold.
+"""
+
+import hashlib
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+from array import array
+from pathlib import Path
+from typing import Any, Mapping, Sequence
+
+from langchain_core.caches import RETURN_VAL_TYPE, BaseCache
+from langchain_core.messages import message_to_dict, messages_from_dict
+from langchain_core.outputs import ChatGeneration, Generation
+from langchain_core.runnables.config import var_child_runnable_config
+from langgraph.runtime import get_runtime
+
+from agent.minhash import band_keys, signature, similarity
+
+DEFAULT_PATH = "user_data/.llm_cache.sqlite3"
+DEFAULT_TTL_SECONDS = 7 * 24 * 3600
+DEFAULT_MAX_MB = 256
+DEFAULT_NEAR_THRESHOLD = 0.9
+DEFAULT_AUDIT_PATH = "user_data/.llm_near_cache_audit.jsonl"
+# 每写入这么多条检查一次过期和容量
+EVICT_INTERVAL = 64
+# 审计日志中每段文本保留的字符数
+AUDIT_EXCERPT = 500
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    created REAL NOT NULL,
+    accessed REAL NOT NULL,
+    size INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed);
+CREATE TABLE IF NOT EXISTS near (
+    key TEXT PRIMARY KEY,
+    signature BLOB NOT NULL,
+    text TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS near_bands (
+    band TEXT NOT NULL,
+    key TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS near_bands_band ON near_bands (band);
+"""
+
+
+def cache_enabled() -> bool:
+    """Whether the response cache is enabled through `LLM_CACHE`."""
+    return os.getenv("LLM_CACHE", "").lower() in ("1", "true", "yes")
+
+
+def _env_nodes(name: str) -> set[str]:
+    return set(filter(None, os.getenv(name, "").split(",")))
+
+
+def bypass_nodes() -> set[str]:
+    """Return the graph nodes configured to bypass the cache."""
+    return _env_nodes("LLM_CACHE_BYPASS_NODES")
+
+
+def near_nodes() -> set[str]:
+    """Return the graph nodes configured to accept near-duplicate responses."""
+    return _env_nodes("LLM_NEAR_CACHE_NODES")
+
+
+def _run_config() -> tuple[dict[str, Any], str | None]:
+    """Return the configurable values and the graph node of the current run."""
+    config = var_child_runnable_config.get() or {}
+    node = (config.get("metadata") or {}).get("langgraph_node")
+    return config.get("configurable") or {}, node
+
+
+def _bypassed() -> bool:
+    """Whether the current run or graph node bypasses the cache."""
+    configurable, node = _run_config()
+    if configurable.get("llm_cache") is False:
+        return True
+    if node is None:
+        return False
+    return node in bypass_nodes() or node in configurable.get("llm_cache_bypass", ())
+
+
+def _near_node() -> str | None:
+    """Return the current graph node if it accepts near duplicates."""
+    configurable, node = _run_config()
+    if node is not None and (
+        node in near_nodes() or node in configurable.get("llm_near_cache", ())
+    ):
+        return node
+    return None
+
+
+def _near_scope() -> str | None:
+    """Return the scope the current run shares near duplicates in, or None."""
+    configurable, _ = _run_config()
+    if (scope := configurable.get("llm_near_cache_scope")) is not None:
+        return f"scope:{scope}"
+    try:
+        context = getattr(get_runtime(), "context", None)
+    except RuntimeError:
+        context = None
+    if isinstance(context, Mapping):
+        user = context.get("user_id")
+    else:
+        user = getattr(context, "user_id", None)
+    if (user := user or configurable.get("user_id")) is not None:
+        return f"user:{user}"
+    if (thread := configurable.get("thread_id")) is not None:
+        return f"thread:{thread}"
+    return None
+
+
+def cache_key(prompt: str, llm_string: str) -> str:
+    """Return the key of the messages `prompt` sent to the model `llm_string`."""
+    return hashlib.sha256(f"{llm_string}\0{prompt}".encode()).hexdigest()
+
+
+def prompt_text(prompt: str) -> tuple[str, str]:
+    """Return the system text and the conversation text of the messages `prompt`.
+
+    System prompts are long and shared by every call of a node, so they would
+    dominate the similarity; near duplicates must match them exactly instead.
+    """
+    system, lines = [], []
+    for message in json.loads(prompt):
+        kwargs = message.get("kwargs", {})
+        content = kwargs.get("content", "")
+        if isinstance(content, list):
+            content = " ".join(
+                part if isinstance(part, str) else str(part.get("text", ""))
+                for part in content
+            )
+        if kwargs.get("type") == "system":
+            system.append(content)
+        else:
+            lines.append(f"{kwargs.get('type', '')}: {content}")
+    return "\n".join(system), "\n".join(lines)
+
+
+def _encode(generations: Sequence[Generation]) -> str:
+    items = []
+    for generation in generations:
+        item: dict[str, Any] = {"generation_info": generation.generation_info}
+        if isinstance(generation, ChatGeneration):
+            item["message"] = message_to_dict(generation.message)
+        else:
+            item["text"] = generation.text
+        items.append(item)
+    return json.dumps(items)
+
+
+def _decode(value: str) -> list[Generation]:
+    generations: list[Generation] = []
+    for item in json.loads(value):
+        if "message" in item:
+            message = messages_from_dict([item["message"]])[0]
+            generations.append(
+                ChatGeneration(message=message, generation_info=item["generation_info"])
+            )
+        else:
+            generations.append(
+                Generation(text=item["text"], generation_info=item["generation_info"])
+            )
+    return generations
+
+
+def _answer(generations: Sequence[Generation]) -> str:
+    """Return what two responses must share to be considered the same answer."""
+    return json.dumps(
+        [
+            (
+                g.text,
+                [(c["name"], c["args"]) for c in getattr(g.message, "tool_calls", [])]
+                if isinstance(g, ChatGeneration)
+                else [],
+            )
+            for g in generations
+        ],
+        sort_keys=True,
+        ensure_ascii=False,
+    )
+
+
+class SQLiteResponseCache(BaseCache):
+    """Response cache stored in a SQLite database in WAL mode."""
+
+    def __init__(
+        self,
+        path: str | Path,
+        ttl: float | None = DEFAULT_TTL_SECONDS,
+        max_bytes: int = DEFAULT_MAX_MB * 1024 * 1024,
+        near_threshold: float = DEFAULT_NEAR_THRESHOLD,
+        audit_path: str | Path | None = None,
+        audit_rate: float = 0.0,
+    ) -> None:
+        """Open or create the cache at `path`.
+
+        Args:
+            path: The SQLite database.
+            ttl: Seconds an entry is valid, None or 0 for no limit.
+            max_bytes: Size of the cached responses above which the least
+                recently used are evicted.
+            near_threshold: Smallest similarity of a near-duplicate hit.
+            audit_path: JSON lines file logging the near-duplicate hits.
+            audit_rate: Fraction of near-duplicate hits checked against the
+                model instead of being served.
+        """
+        self.path = Path(path)
+        self.ttl = ttl or None
+        self.max_bytes = max_bytes
+        self.near_threshold = near_threshold
+        self.audit_path = None if audit_path is None else Path(audit_path)
+        self.audit_rate = audit_rate
+        self.hits = 0
+        self.misses = 0
+        self.near_hits = 0
+        self.near_misses = 0
+        self.audits = 0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._updates = 0
+        self._random = random.Random()
+        # 未命中的签名留给随后的 update 复用；抽检中的近似命中等待模型的回答
+        self._signatures: dict[str, tuple[str, str, array[int]]] = {}
+        self._pending_audits: dict[str, dict[str, Any]] = {}
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._connection().executescript(_SCHEMA)
+
+    def _connection(self) -> sqlite3.Connection:
+        # sqlite3 连接不能跨线程使用，每个线程一个
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _expired(self, created: float, now: float) -> bool:
+        return self.ttl is not None and now - created > self.ttl
+
+    def lookup(self, prompt: str, llm_string: str) -> RETURN_VAL_TYPE | None:
+        """Return the cached response to `prompt`, or None."""
+        if _bypassed():
+            return None
+        key = cache_key(prompt, llm_string)
+        conn = self._connection()
+        row = conn.execute(
+            "SELECT value, created FROM responses WHERE key = ?", (key,)
+        ).fetchone()
+        now = time.time()
+        if row is not None and not self._expired(row[1], now):
+            conn.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+            self.hits += 1
+            return _decode(row[0])
+        self.misses += 1
+        node, scope = _near_node(), _near_scope()
+        if node is not None and scope is not None:
+            return self._near_lookup(node, scope, key, prompt, llm_string)
+        return None
+
+    def _bands(
+        self, scope: str, llm_string: str, system: str, sig: array[int]
+    ) -> list[str]:
+        # 只在同一用户、模型、工具、输出结构和系统提示都相同的调用之间比较
+        prefix = f"{scope}\0{llm_string}\0{system}"
+        model = hashlib.sha256(prefix.encode()).hexdigest()[:16]
+        return [f"{model}:{band}" for band in band_keys(sig)]
+
+    def _near_lookup(
+        self, node: str, scope: str, key: str, prompt: str, llm_string: str
+    ) -> RETURN_VAL_TYPE | None:
+        system, text = prompt_text(prompt)
+        sig = signature(text)
+        with self._lock:
+            if len(self._signatures) > 1024:
+                self._signatures.clear()
+            self._signatures[key] = (system, text, sig)
+        bands = self._bands(scope, llm_string, system, sig)
+        conn = self._connection()
+        rows = conn.execute(
+            "SELECT n.key, n.signature, n.text, r.value, r.created FROM near n "
+            "JOIN responses r ON r.key = n.key WHERE n.key IN "
+            f"(SELECT key FROM near_bands WHERE band IN ({','.join('?' * len(bands))}))",
+            bands,
+        ).fetchall()
+        now = time.time()
+        best, best_similarity = None, 0.0
+        for row in rows:
+            if self._expired(row[4], now):
+                continue
+            score = similarity(sig, array("Q", row[1]))
+            if score > best_similarity:
+                best, best_similarity = row, score
+        if best is None or best_similarity < self.near_threshold:
+            self.near_misses += 1
+            return None
+        record = {
+            "time": now,
+            "node": node,
+            "scope": scope,
+            "similarity": round(best_similarity, 4),
+            "key": key,
+            "matched_key": best[0],
+            "query": text[-AUDIT_EXCERPT:],
+            "matched": best[2][-AUDIT_EXCERPT:],
+        }
+        if self.audit_rate and self._random.random() < self.audit_rate:
+            # 抽检：不返回缓存，等模型回答后在 update 中比较
+            self.audits += 1
+            record["cached_answer"] = _answer(_decode(best[3]))
+            with self._lock:
+                self._pending_audits[key] = record
+            return None
+        self.near_hits += 1
+        conn.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, best[0]))
+        self._log({"event": "hit", **record})
+        return _decode(best[3])
+
+    def _log(self, record: dict[str, Any]) -> None:
+        if self.audit_path is None:
+            return
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self._lock:
+            self.audit_path.parent.mkdir(parents=True, exist_ok=True)
+            with self.audit_path.open("a", encoding="utf-8") as f:
+                f.write(line)
+
+    def update(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+        """Store the response `return_val` to `prompt`."""
+        if _bypassed():
+            return
+        key = cache_key(prompt, llm_string)
+        value = _encode(return_val)
+        now = time.time()
+        conn = self._connection()
+        conn.execute(
+            "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)",
+            (key, value, now, now, len(value)),
+        )
+        with self._lock:
+            self._updates += 1
+            evict = self._updates % EVICT_INTERVAL == 1
+            signed = self._signatures.pop(key, None)
+            audit = self._pending_audits.pop(key, None)
+        scope = _near_scope()
+        if _near_node() is not None and scope is not None:
+            if signed is None:
+                system, text = prompt_text(prompt)
+                signed = system, text, signature(text)
+            system, text, sig = signed
+            conn.execute(
+                "INSERT OR REPLACE INTO near VALUES (?, ?, ?)",
+                (key, sig.tobytes(), text),
+            )
+            conn.execute("DELETE FROM near_bands WHERE key = ?", (key,))
+            conn.executemany(
+                "INSERT INTO near_bands VALUES (?, ?)",
+                [(band, key) for band in self._bands(scope, llm_string, system, sig)],
+            )
+        if audit is not None:
+            answer = _answer(return_val)
+            self._log(
+                {
+                    "event": "audit",
+                    **audit,
+                    "agree": answer == audit["cached_answer"],
+                    "answer": answer,
+                }
+            )
+        if evict:
+            self.evict()
+
+    def evict(self) -> int:
+        """Delete expired entries, then the least recently used over the size limit.
+
+        Returns:
+            The number of entries deleted.
+        """
+        conn = self._connection()
+        removed = 0
+        if self.ttl is not None:
+            removed += conn.execute(
+                "DELETE FROM responses WHERE created < ?", (time.time() - self.ttl,)
+            ).rowcount
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()
+        excess = total[0] - self.max_bytes
+        if excess > 0:
+            keys = []
+            for key, size in conn.execute(
+                "SELECT key, size FROM responses ORDER BY accessed"
+            ):
+                keys.append((key,))
+                excess -= size
+                if excess <= 0:
+                    break
+            conn.executemany("DELETE FROM responses WHERE key = ?", keys)
+            removed += len(keys)
+        if removed:
+            conn.execute(
+                "DELETE FROM near WHERE key NOT IN (SELECT key FROM responses)"
+            )
+            conn.execute(
+                "DELETE FROM near_bands WHERE key NOT IN (SELECT key FROM near)"
+            )
+        return removed
+
+    def stats(self) -> dict[str, float]:
+        """Return the lookup counters and hit rates of this process."""
+        lookups = self.hits + self.misses
+        near_lookups = self.near_hits + self.near_misses + self.audits
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "near_hits": self.near_hits,
+            "near_misses": self.near_misses,
+            "audits": self.audits,
+            "hit_rate": (self.hits + self.near_hits) / lookups if lookups else 0.0,
+            "near_hit_rate": self.near_hits / near_lookups if near_lookups else 0.0,
+        }
+
+    def clear(self, **kwargs: Any) -> None:
+        """Delete every cached response."""
+        conn = self._connection()
+        for table in ("responses", "near", "near_bands"):
+            conn.execute(f"DELETE FROM {table}")
+
+    def __len__(self) -> int:
+        """Return the number of cached responses."""
+        count: int = (
+            self._connection().execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        )
+        return count
+
+
+_caches: dict[Path, SQLiteResponseCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_response_cache() -> SQLiteResponseCache | None:
+    """Return the configured response cache, or None if it is disabled."""
+    if not cache_enabled():
+        return None
+    path = Path(os.getenv("LLM_CACHE_PATH", DEFAULT_PATH)).absolute()
+    with _caches_lock:
+        if path not in _caches:
+            _caches[path] = SQLiteResponseCache(
+                path,
+                ttl=float(os.getenv("LLM_CACHE_TTL_SECONDS", str(DEFAULT_TTL_SECONDS))),
+                max_bytes=int(
+                    float(os.getenv("LLM_CACHE_MAX_MB", str(DEFAULT_MAX_MB)))
+                    * 1024
+                    * 1024
+                ),
+                near_threshold=float(
+                    os.getenv("LLM_NEAR_CACHE_THRESHOLD", str(DEFAULT_NEAR_THRESHOLD))
+                ),
+                audit_path=Path(
+                    os.getenv("LLM_NEAR_CACHE_AUDIT", DEFAULT_AUDIT_PATH)
+                ).absolute(),
+                audit_rate=float(os.getenv("LLM_NEAR_CACHE_AUDIT_RATE", "0")),
+            )
+        return _caches[path]
@@ -0,0 +1,78 @@
+"""MinHash signatures and LSH bands for near-duplicate text detection.
+
+Texts are normalised (lower case, collapsed whitespace) and cut into
+overlapping character shingles, which works for Chinese as well as for
+space-separated languages. The fraction of equal positions in two
+signatures estimates the Jaccard similarity of their shingle sets.
+
+Each shingle is hashed once. Rather than applying `NUM_PERM` permutations
+to every hash, which costs `NUM_PERM` multiplications per shingle, the hash
+picks one of `NUM_PERM` bins and the signature keeps the minimum per bin
+(one-permutation hashing). A bin that no shingle fell into borrows the value
+of the first non-empty bin in a fixed random order, so two signatures still
+agree at a position with probability equal to the Jaccard similarity.
+
+Signatures are cut into bands for locality-sensitive hashing: two texts
+share at least one band with high probability when their similarity is
+above roughly `(1 / bands) ** (1 / rows)`.
+"""
+
+import hashlib
+import random
+import re
+from array import array
+
+NUM_PERM = 128
+SHINGLE_SIZE = 5
+BANDS = 16
+_EMPTY = 1 << 64
+
+_rng = random.Random(20240601)
+# 固定种子，签名在不同进程之间可以比较；空桶按各自的顺序查找非空桶
+_PROBES = [_rng.sample(range(NUM_PERM), NUM_PERM) for _ in range(NUM_PERM)]
+
+
+def normalize(text: str) -> str:
+    """Return `text` in lower case with whitespace runs collapsed."""
+    return re.sub(r"\s+", " ", text.lower()).strip()
+
+
+def shingles(text: str, size: int = SHINGLE_SIZE) -> set[str]:
+    """Return the character shingles of the normalised `text`."""
+    text = normalize(text)
+    if len(text) <= size:
+        return {text}
+    return {text[i : i + size] for i in range(len(text) - size + 1)}
+
+
+def signature(text: str) -> array[int]:
+    """Return the MinHash signature of `text`."""
+    mins = [_EMPTY] * NUM_PERM
+    for s in shingles(text):
+        h = int.from_bytes(
+            hashlib.blake2b(s.encode(), digest_size=8).digest(), "little"
+        )
+        i, value = h % NUM_PERM, h // NUM_PERM
+        if value < mins[i]:
+            mins[i] = value
+    return array(
+        "Q",
+        (
+            m if m != _EMPTY else next(v for j in probes if (v := mins[j]) != _EMPTY)
+            for m, probes in zip(mins, _PROBES)
+        ),
+    )
+
+
+def similarity(a: array[int], b: array[int]) -> float:
+    """Return the Jaccard similarity estimated from two signatures."""
+    return sum(x == y for x, y in zip(a, b)) / len(a)
+
+
+def band_keys(sig: array[int], bands: int = BANDS) -> list[str]:
+    """Return one hash per band of `sig`, prefixed by the band number."""
+    rows = len(sig) // bands
+    return [
+        f"{i}:{hashlib.blake2b(sig[i * rows : (i + 1) * rows].tobytes(), digest_size=8).hexdigest()}"
+        for i in range(bands)
+    ]
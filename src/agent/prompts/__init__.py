@@ -0,0 +1,39 @@
+"""Message layout that keeps prompt prefixes cacheable.
+
+Providers cache the longest prefix of a request they have seen before, so a
+prompt is only cheap to resend if it starts with the same bytes. Messages
+are therefore laid out from the most to the least stable part:
+
+1. the static system prompt of the node, never formatted with run data;
+2. context that changes per run, such as the user goal, as a second system
+   message;
+3. the conversation history, which only grows at its end;
+4. the request of this step, which changes on every call.
+"""
+
+from typing import Sequence
+
+from langchain.messages import AnyMessage, HumanMessage, SystemMessage
+
+
+def layout_messages(
+    system: str,
+    context: str | None = None,
+    history: Sequence[AnyMessage] = (),
+    request: str | None = None,
+) -> list[AnyMessage]:
+    """Return the messages of a call ordered for prefix caching.
+
+    Args:
+        system: The static system prompt of the node.
+        context: Run-specific instructions, sent after the static prompt.
+        history: The conversation so far.
+        request: The request of this step, sent last.
+    """
+    messages: list[AnyMessage] = [SystemMessage(content=system)]
+    if context:
+        messages.append(SystemMessage(content=context))
+    messages.extend(history)
+    if request is not None:
+        messages.append(HumanMessage(content=request))
+    return messages
@@ -9,6 +9,7 @@ from pydantic import BaseModel, Field
 from typing_extensions import Literal, TypedDict
 
 from agent.agent import create_custom_agent
+from agent.prompts import layout_messages
 
 exam_prompt = """
 **角色设定 (Role Definition):**
@@ -381,12 +382,16 @@ def generate_plan_prompt(state: State):
 def test_user_goal(state: State):
     """Test the user goal."""
     llm = create_custom_agent()
-    system_prompt = f"""{answer_prompt}\n\n ## 用户意图: \n{state["user_goal"]}"""
     re_answers = state.get("re_answers", AIAnswerList(answers=[]))
     answers_index = len(re_answers.answers)
     question = state["exam"].questions[answers_index]
+    # 用户意图放在静态提示词之后，保证提示词前缀可被缓存
     msg = llm.invoke(
-        [SystemMessage(content=system_prompt), HumanMessage(content=f"{question}")]
+        layout_messages(
+            answer_prompt,
+            context=f"## 用户意图: \n{state['user_goal']}",
+            request=f"{question}",
+        )
     )
     re_answers.answers.append(msg.content)
     return {"re_answers": re_answers}
@@ -9,6 +9,7 @@ from pydantic import BaseModel, Field
 from typing_extensions import Literal, TypedDict
 
 from agent.agent import create_custom_agent
+from agent.prompts import layout_messages
 
 qa_prompt = """
 **角色设定 (Role Definition):**
@@ -194,21 +195,22 @@ def generate_choice(state: State):
     llm = create_custom_agent(ChoiceList)
     index = len(state["qa_list"].items)
     latest_quest = state["quest_list"].quests[index]
+    # 已知知识每一步都会变化，放在最后，系统提示词和对话历史作为稳定前缀
     choice_list = llm.invoke(
-        [SystemMessage(content=f"已知知识: {state['qa_list']} 根据问题生成备选答案")]
-        + state["messages"]
-        + [HumanMessage(content=f"根据问题生成备选答案: {latest_quest}")]
+        layout_messages(
+            "根据已知知识和问题生成备选答案",
+            history=state["messages"],
+            request=f"已知知识: {state['qa_list']}\n根据问题生成备选答案: {latest_quest}",
+        )
     )
 
     llm = create_custom_agent()
     agent_answer = llm.invoke(
-        [
-            SystemMessage(
-                content=f"已知知识: {state['qa_list']} 从选项中选择一个最符合的答案"
-            )
-        ]
-        + state["messages"]
-        + [HumanMessage(content=f"问题: {latest_quest}\n选项: {choice_list}")]
+        layout_messages(
+            "根据已知知识从选项中选择一个最符合的答案",
+            history=state["messages"],
+            request=f"已知知识: {state['qa_list']}\n问题: {latest_quest}\n选项: {choice_list}",
+        )
     )
 
     qa = QuestAndAnswer(
@@ -7,6 +7,7 @@ from langgraph.prebuilt import ToolNode, tools_condition
 from agent.agent import create_custom_agent
 from agent.role.context import UserContext
 from agent.tools import tools
+from agent.tools.filesystem import AppendFlusher
 
 
 # Nodes
@@ -42,4 +43,4 @@ wizard_builder.add_conditional_edges("llm_call", tools_condition)
 wizard_builder.add_edge("tools", "llm_call")
 
 # Compile the agent
-graph = wizard_builder.compile()
+graph = wizard_builder.compile().with_config(callbacks=[AppendFlusher()])
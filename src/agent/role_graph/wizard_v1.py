@@ -64,22 +64,29 @@ class WizardState(MessagesState):
 
 ALL_STAGE = Literal["research", "generator", "compiler", "lint", "quality", END]
 
+# 每个节点的系统提示词只包含静态内容，保证提示词前缀在多次调用之间完全相同；
+# 随运行变化的背景和示例放在单独的上下文消息中
 system_prompt_template = """Role: {role}
 Profile: {profile}
 
-{background}
-
 {constraints}
 
 {workflow}
 
 {standard_output}
+"""
+
+context_prompt_template = """{background}
 
 {examples}
 """
 
 prompt_template = ChatPromptTemplate.from_messages(
-    [("system", system_prompt_template), MessagesPlaceholder(variable_name="messages")]
+    [
+        ("system", system_prompt_template),
+        ("system", context_prompt_template),
+        MessagesPlaceholder(variable_name="messages"),
+    ]
 )
 
 
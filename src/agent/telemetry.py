@@ -0,0 +1,148 @@
+"""Per-node telemetry of the provider's prompt cache.
+
+`PromptCacheTelemetry` is attached to every model built by
+`create_custom_agent`. For each call it reads the input and cached input
+token counts from the usage metadata of the response and adds them to the
+graph node that made the call, so the prefix-cache hit rate of every node
+can be watched. Responses served by the local response cache are counted
+separately because they reach no provider.
+
+When `LLM_PROMPT_CACHE_LOG` names a file, every call is also appended to it
+as a JSON line.
+"""
+
+import json
+import os
+import threading
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import ChatGeneration, LLMResult
+
+
+@dataclass
+class NodeCacheStats:
+    """Token counts of the calls made by one graph node."""
+
+    calls: int = 0
+    local_hits: int = 0
+    input_tokens: int = 0
+    cached_tokens: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        """Fraction of the input tokens read from the provider's cache."""
+        return self.cached_tokens / self.input_tokens if self.input_tokens else 0.0
+
+
+def _usage(response: LLMResult) -> tuple[int, int, bool] | None:
+    """Return the input tokens, cached tokens and whether it was a local hit."""
+    for generations in response.generations:
+        for generation in generations:
+            if not isinstance(generation, ChatGeneration):
+                continue
+            usage = getattr(generation.message, "usage_metadata", None)
+            if not usage:
+                continue
+            details = usage.get("input_token_details") or {}
+            # 本地响应缓存命中时 langchain 会把 total_cost 置为 0
+            local = usage.get("total_cost") == 0
+            return usage.get("input_tokens", 0), details.get("cache_read", 0), local
+    return None
+
+
+class PromptCacheTelemetry(BaseCallbackHandler):
+    """Records the cached input tokens of every model call per graph node."""
+
+    def __init__(self, log_path: str | Path | None = None) -> None:
+        """Start with empty counters, logging calls to `log_path` if given."""
+        self.log_path = None if log_path is None else Path(log_path)
+        self._nodes: dict[str, NodeCacheStats] = {}
+        self._runs: dict[UUID, str] = {}
+        self._lock = threading.Lock()
+
+    def on_chat_model_start(
+        self,
+        serialized: dict[str, Any],
+        messages: list[list[BaseMessage]],
+        *,
+        run_id: UUID,
+        metadata: dict[str, Any] | None = None,
+        **kwargs: Any,
+    ) -> None:
+        """Remember the graph node of the call."""
+        node = (metadata or {}).get("langgraph_node", "")
+        with self._lock:
+            self._runs[run_id] = node
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> None:
+        """Add the token counts of the call to its node."""
+        with self._lock:
+            node = self._runs.pop(run_id, "")
+        usage = _usage(response)
+        if usage is None:
+            return
+        input_tokens, cached_tokens, local = usage
+        with self._lock:
+            stats = self._nodes.setdefault(node, NodeCacheStats())
+            stats.calls += 1
+            if local:
+                stats.local_hits += 1
+            else:
+                stats.input_tokens += input_tokens
+                stats.cached_tokens += cached_tokens
+        if self.log_path is not None:
+            record = {
+                "time": time.time(),
+                "node": node,
+                "input_tokens": input_tokens,
+                "cached_tokens": cached_tokens,
+                "local_hit": local,
+            }
+            with self._lock, self.log_path.open("a", encoding="utf-8") as f:
+                f.write(json.dumps(record) + "\n")
+
+    def on_llm_error(
+        self, error: BaseException, *, run_id: UUID, **kwargs: Any
+    ) -> None:
+        """Forget the failed call."""
+        with self._lock:
+            self._runs.pop(run_id, None)
+
+    def stats(self) -> dict[str, NodeCacheStats]:
+        """Return a copy of the counters by graph node."""
+        with self._lock:
+            return {
+                node: NodeCacheStats(**asdict(s)) for node, s in self._nodes.items()
+            }
+
+    def summary(self) -> str:
+        """Return one line per node with its prompt-cache hit rate."""
+        return "\n".join(
+            f"{node or '-'}: {s.calls} calls, {s.cached_tokens}/{s.input_tokens} "
+            f"input tokens cached ({s.hit_rate:.0%}), {s.local_hits} local hits"
+            for node, s in sorted(self.stats().items())
+        )
+
+    def reset(self) -> None:
+        """Clear the counters."""
+        with self._lock:
+            self._nodes.clear()
+
+
+_telemetry: PromptCacheTelemetry | None = None
+_telemetry_lock = threading.Lock()
+
+
+def prompt_cache_telemetry() -> PromptCacheTelemetry:
+    """Return the process-wide prompt-cache telemetry."""
+    global _telemetry
+    with _telemetry_lock:
+        if _telemetry is None:
+            _telemetry = PromptCacheTelemetry(os.getenv("LLM_PROMPT_CACHE_LOG") or None)
+        return _telemetry
@@ -1,10 +1,10 @@
 """Tools for the agent."""
 
-from .filesystem import fs_opt
+from .filesystem import fs_batch, fs_opt
 from .user import get_user_id, get_user_email
 
-__all__ = ["fs_opt", "get_user_id", "get_user_email"]
+__all__ = ["fs_opt", "fs_batch", "get_user_id", "get_user_email"]
 
-tools = [get_user_id, get_user_email, fs_opt]
+tools = [get_user_id, get_user_email, fs_opt, fs_batch]
 
 tools_by_name = {tool.name: tool for tool in tools}
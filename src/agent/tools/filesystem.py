@@ -1,24 +1,116 @@
 """Filesystem tools."""
 
-import glob as glob_module
-import multiprocessing as mp
+import asyncio
+import io
+import json
 import os
 import re
-import subprocess as sp
+import shutil
+from concurrent.futures import BrokenExecutor
+from itertools import islice
 from pathlib import Path
-from typing import Literal
+from typing import Any, Generator, Iterable, Iterator, Literal
+from uuid import UUID
 
-from langchain.tools import ToolRuntime, tool
+from langchain.tools import ToolRuntime
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.tools import StructuredTool
 from pydantic import BaseModel, Field, field_validator, model_validator
 
 from agent.role.context import UserContext
+from agent.tools.fs.appender import Appender, flush_all, get_appender
+from agent.tools.fs.atomic import append_bytes, atomic_write
+from agent.tools.fs.batch import run_batch
+from agent.tools.fs.compress import compress_stream, file_codec, open_decoded, pack
+from agent.tools.fs.content import content_cache
+from agent.tools.fs.dedup import blob_dir, dedup_enabled, dedup_file
+from agent.tools.fs.diff import (
+    FilePatch,
+    HunkResult,
+    PatchError,
+    apply_hunks,
+    parse_patch,
+)
+from agent.tools.fs.globbing import iter_glob
+from agent.tools.fs.lines import read_bytes, read_lines, read_tail
+from agent.tools.fs.paging import (
+    InvalidCursorError,
+    decode_cursor,
+    default_page_size,
+    fingerprint,
+    more_results_line,
+    paginate,
+)
+from agent.tools.fs.paths import (
+    PathEscapeError,
+    check_pattern,
+    display_path,
+    resolve_path,
+    resolve_root,
+    state_dir,
+)
+from agent.tools.fs.pool import (
+    FSThreadPool,
+    FSWorkerPool,
+    get_pool,
+    operation_timeout,
+)
+from agent.tools.fs.regex import (
+    Deadline,
+    UnsafePatternError,
+    compile_pattern,
+    hard_timeout,
+    regex_timeout,
+)
+from agent.tools.fs.replace import FileReplacement, replace
+from agent.tools.fs.search import (
+    DEFAULT_MAX_RESULTS,
+    SearchStats,
+    iter_files,
+    iter_matches,
+)
+from agent.tools.fs.snapshots import (
+    SnapshotError,
+    SnapshotInfo,
+    auto_snapshot_enabled,
+    get_store,
+)
+from agent.tools.fs.tree import get_snapshot
+from agent.tools.fs.trigram import (
+    TrigramIndex,
+    get_index,
+    index_enabled,
+    refresh_interval,
+)
+from agent.tools.fs.usage import Usage, get_ledger, measure
+from agent.tools.fs.walk import load_rules, summarize, walk
 
 operation_types = Literal[
-    "read", "write", "delete", "search", "glob", "patch", "list", "replace"
+    "read",
+    "write",
+    "delete",
+    "search",
+    "glob",
+    "patch",
+    "list",
+    "replace",
+    "snapshot",
+    "restore",
 ]
 
 NEED_WRITE_PERMISSION_TYPES = ("write", "patch", "replace")
 
+READ_ONLY_TYPES = ("read", "search", "glob", "list")
+
+MAX_BATCH_OPERATIONS = 50
+
+DEFAULT_MAX_ENTRIES = 10000
+
+# 只影响单个路径的操作，追加缓冲只需刷新该路径
+PATH_SCOPED_TYPES = ("read", "write", "delete", "list")
+
+REGEX_TYPES = ("search", "replace")
+
 operation_type_descriptions = """The operation to perform. One of:
 read: Read the content of the file.
 write: Write the content to the file.
@@ -26,7 +118,10 @@ delete: Delete the file.
 search: Search content in the file.
 glob: Glob the file path or directory path.
 patch: Patch the content of the file.
-list: List recursively the file or directory.
+list: List recursively the file or directory. Ignored directories such as .git and node_modules are not expanded.
+replace: Replace a regex pattern in the files matching a glob pattern.
+snapshot: Take a snapshot of the whole workspace, optionally labelled by content, and list the existing snapshots.
+restore: Restore the workspace to the snapshot snapshot_id. The current state is snapshotted first.
 """
 
 
@@ -68,11 +163,69 @@ class FSOperationArgs(BaseModel):
         description="The length of lines to read from the file. Required for read operation.",
     )
 
+    max_results: int | None = Field(
+        None,
+        description="Maximum number of matching lines to return for the search operation.",
+    )
+
+    max_matches_per_file: int | None = Field(
+        None,
+        description="Maximum number of matching lines to return per file for the search operation.",
+    )
+
+    cursor: str | None = Field(
+        None,
+        description="Continuation cursor returned by a previous search, glob or list call. Pass it back unchanged to fetch the next page.",
+    )
+
+    page_size: int | None = Field(
+        None,
+        description="Maximum number of result lines returned per page for search, glob and list operations.",
+    )
+
+    max_depth: int | None = Field(
+        None,
+        description="Maximum directory depth to descend for the list operation. Deeper directories are summarised by file count and size.",
+    )
+
+    max_entries: int | None = Field(
+        None,
+        description="Maximum number of entries to return for the list operation.",
+    )
+
+    dry_run: bool | None = Field(
+        None,
+        description="For the replace operation, only report how many replacements would be made without writing any file.",
+    )
+
+    max_files: int | None = Field(
+        None,
+        description="Maximum number of files the replace operation may rewrite.",
+    )
+
+    max_bytes: int | None = Field(
+        None,
+        description="Maximum number of bytes the replace operation may rewrite.",
+    )
+
+    read_mode: Literal["lines", "tail", "bytes"] | None = Field(
+        None,
+        description="How read_offset and read_length are interpreted for the read operation. "
+        "lines (default): read read_length lines starting at line read_offset. "
+        "tail: read the last read_length lines, skipping read_offset lines from the end. "
+        "bytes: read read_length bytes starting at byte read_offset.",
+    )
+
     write_append: bool | None = Field(
         None,
         description="Whether to append to the file. **Required for write operation.**",
     )
 
+    snapshot_id: str | None = Field(
+        None,
+        description="The snapshot to restore, as listed by the snapshot operation. Required for restore operation.",
+    )
+
     @field_validator("path", mode="before")
     def validate_path(cls, v) -> str:
         """Validate path."""
@@ -89,6 +242,17 @@ class FSOperation(BaseModel):
         ..., description="The arguments for the filesystem operation."
     )
 
+    @model_validator(mode="before")
+    @classmethod
+    def collect_args(cls, data):
+        """Allow operation arguments to be passed as top-level keywords."""
+        if isinstance(data, dict) and "args" not in data:
+            arg_names = FSOperationArgs.model_fields.keys()
+            args = {k: v for k, v in data.items() if k in arg_names}
+            data = {k: v for k, v in data.items() if k not in arg_names}
+            data["args"] = args
+        return data
+
     @model_validator(mode="after")
     def validate(self):
         """Validate required fields based on operation."""
@@ -104,6 +268,18 @@ class FSOperation(BaseModel):
                 "read_offset and read_length are required for 'read' operation"
             )
 
+        if self.args.page_size is not None and self.args.page_size < 1:
+            raise ValueError("page_size must be at least 1")
+
+        for name in ("max_depth", "max_entries", "max_files", "max_bytes"):
+            value = getattr(self.args, name)
+            if value is not None and value < 1:
+                raise ValueError(f"{name} must be at least 1")
+
+        offset, length = self.args.read_offset, self.args.read_length
+        if op == "read" and min(offset or 0, length or 0) < 0:
+            raise ValueError("read_offset and read_length must not be negative")
+
         if op == "write" and self.args.write_append is None:
             raise ValueError("write_append is required for 'write' operation")
 
@@ -120,31 +296,284 @@ class FSOperation(BaseModel):
         if op == "replace" and self.args.replace_pattern is None:
             raise ValueError("replace_pattern is required for 'replace' operation")
 
+        if op == "restore" and not self.args.snapshot_id:
+            raise ValueError("snapshot_id is required for 'restore' operation")
+
         return self
 
 
-@tool(args_schema=FSOperation)
-def fs_opt(
+class FSBatch(BaseModel):
+    """Batch of filesystem operations."""
+
+    operations: list[FSOperation] = Field(
+        ...,
+        min_length=1,
+        max_length=MAX_BATCH_OPERATIONS,
+        description="The filesystem operations to perform, in order. "
+        "Consecutive read, search, glob and list operations run concurrently; "
+        "write, delete, patch and replace operations run one at a time in order.",
+    )
+
+
+def _workspace(runtime: ToolRuntime[UserContext]) -> Path:
+    """Return the absolute workspace directory of the current user."""
+    if runtime is None:
+        raise ValueError("runtime is required")
+    path = Path("user_data") / runtime.context["user_id"]
+    if not path.exists():
+        path.mkdir(parents=True, exist_ok=True)
+    return path.absolute()
+
+
+def _fs_opt_tool(
     operation: operation_types,
     args: dict,
     runtime: ToolRuntime[UserContext],
 ) -> str:
     """Perform a filesystem operation."""
-    if runtime is None:
-        raise ValueError("runtime is required")
     operation = FSOperation(
         operation=operation,
         args=args,
     )
-    path = Path("user_data") / runtime.context["user_id"]
-    if not path.exists():
-        path.mkdir(parents=True, exist_ok=True)
-    return mp.Pool(processes=1).apply(_fs_opt, (operation, path))
+    cwd = _workspace(runtime)
+    if (result := _buffer_append(operation, cwd)) is not None:
+        return result
+    pool = get_pool()
+    timeout = _hard_timeout(operation)
+    future = pool.submit(_fs_opt, (operation, cwd))
+    try:
+        result = future.result(timeout)
+    except TimeoutError:
+        return _abandon(pool, [operation], timeout)
+    except BrokenExecutor:
+        return _interrupted([operation])
+    return _with_append_errors(cwd, result)
 
 
-def _fs_opt(operation: FSOperation, cwd: Path) -> str:
+async def _afs_opt_tool(
+    operation: operation_types,
+    args: dict,
+    runtime: ToolRuntime[UserContext],
+) -> str:
     """Perform a filesystem operation."""
-    os.chdir(cwd)
+    operation = FSOperation(
+        operation=operation,
+        args=args,
+    )
+    cwd = _workspace(runtime)
+    if _appender() is not None:
+        # 刷新缓冲可能写文件，放到线程里避免阻塞事件循环
+        result = await asyncio.to_thread(_buffer_append, operation, cwd)
+        if result is not None:
+            return result
+    pool = get_pool()
+    timeout = _hard_timeout(operation)
+    try:
+        result = await asyncio.wait_for(pool.run(_fs_opt, (operation, cwd)), timeout)
+    except TimeoutError:
+        return _abandon(pool, [operation], timeout)
+    except BrokenExecutor:
+        return _interrupted([operation])
+    return _with_append_errors(cwd, result)
+
+
+fs_opt = StructuredTool.from_function(
+    func=_fs_opt_tool,
+    coroutine=_afs_opt_tool,
+    name="fs_opt",
+    description="Perform a filesystem operation.",
+    args_schema=FSOperation,
+)
+
+
+def _fs_batch_tool(
+    operations: list[FSOperation],
+    runtime: ToolRuntime[UserContext],
+) -> str:
+    """Perform several filesystem operations in one call."""
+    operations = [FSOperation.model_validate(op) for op in operations]
+    cwd = _workspace(runtime)
+    if (appender := _appender()) is not None:
+        appender.flush(cwd)
+    pool = get_pool()
+    timeout = _batch_timeout(operations)
+    future = pool.submit(_fs_batch, (operations, cwd))
+    try:
+        result = future.result(timeout)
+    except TimeoutError:
+        return _abandon(pool, operations, timeout)
+    except BrokenExecutor:
+        return _interrupted(operations)
+    return _with_append_errors(cwd, result)
+
+
+async def _afs_batch_tool(
+    operations: list[FSOperation],
+    runtime: ToolRuntime[UserContext],
+) -> str:
+    """Perform several filesystem operations in one call."""
+    operations = [FSOperation.model_validate(op) for op in operations]
+    cwd = _workspace(runtime)
+    if (appender := _appender()) is not None:
+        await asyncio.to_thread(appender.flush, cwd)
+    pool = get_pool()
+    timeout = _batch_timeout(operations)
+    try:
+        result = await asyncio.wait_for(pool.run(_fs_batch, (operations, cwd)), timeout)
+    except TimeoutError:
+        return _abandon(pool, operations, timeout)
+    except BrokenExecutor:
+        return _interrupted(operations)
+    return _with_append_errors(cwd, result)
+
+
+fs_batch = StructuredTool.from_function(
+    func=_fs_batch_tool,
+    coroutine=_afs_batch_tool,
+    name="fs_batch",
+    description="Perform several filesystem operations in one call. "
+    "Returns a JSON list with one result per operation, in order.",
+    args_schema=FSBatch,
+)
+
+
+def _hard_timeout(operation: FSOperation) -> float | None:
+    """Return how long to wait for `operation`, None meaning no limit."""
+    if operation.operation in REGEX_TYPES:
+        return hard_timeout() or None
+    return operation_timeout() or None
+
+
+def _batch_timeout(operations: list[FSOperation]) -> float | None:
+    """Return how long to wait for a batch, None meaning no limit."""
+    timeouts = [_hard_timeout(operation) for operation in operations]
+    if None in timeouts:
+        return None
+    return sum(t for t in timeouts if t is not None)
+
+
+def _describe(operations: list[FSOperation]) -> str:
+    if len(operations) == 1:
+        return f"'{operations[0].operation}' operation"
+    return "batch"
+
+
+def _abandon(
+    pool: FSWorkerPool | FSThreadPool,
+    operations: list[FSOperation],
+    timeout: float | None,
+) -> str:
+    """Give up on operations that ran past their hard timeout."""
+    if isinstance(pool, FSWorkerPool):
+        # 进程池可以直接终止卡住的 worker，下次调用时重新创建；
+        # 其他在途任务会以 BrokenExecutor 失败而不是一直挂起
+        pool.terminate()
+        action = "its worker was stopped"
+    else:
+        action = "it was abandoned"
+    advice = (
+        "; try a simpler or more specific pattern"
+        if any(op.operation in REGEX_TYPES for op in operations)
+        else ""
+    )
+    return (
+        f"Error: {_describe(operations)} did not finish within "
+        f"{timeout or 0:g}s and {action}{advice}"
+    )
+
+
+def _interrupted(operations: list[FSOperation]) -> str:
+    """Report operations lost when another call stopped the worker pool."""
+    return (
+        f"Error: {_describe(operations)} was interrupted because the worker "
+        "pool was restarted; it may have been partly applied, check and retry"
+    )
+
+
+def _write_buffered(root: Path, rel: str, content: str) -> str:
+    """Append the coalesced content of buffered appends to `rel`."""
+    operation = FSOperation(
+        operation="write", path=rel, content=content, write_append=True
+    )
+    return write_file(operation, root)
+
+
+def _appender() -> Appender | None:
+    """Return the append buffers if `FS_APPEND_BUFFER_BYTES` enables them."""
+    return get_appender(_write_buffered)
+
+
+def _buffer_append(operation: FSOperation, cwd: Path) -> str | None:
+    """Buffer `operation` if it is an append, else flush what it depends on.
+
+    Returns:
+        The result of a buffered append, or None if `operation` still has
+        to be performed.
+    """
+    appender = _appender()
+    if appender is None:
+        return None
+    try:
+        root = resolve_root(cwd)
+        path = resolve_path(root, operation.args.path or ".")
+    except PathEscapeError as e:
+        return f"Error: {str(e)}"
+    if not (operation.operation == "write" and operation.args.write_append):
+        appender.flush(path if operation.operation in PATH_SCOPED_TYPES else root)
+        return None
+    if path.is_dir():
+        return None
+    growth = len(operation.args.content.encode("utf-8"))
+    growth += appender.pending_bytes(path)
+    if error := get_ledger(root).check(growth, 0 if path.exists() else 1):
+        return f"Error: {error}"
+    appender.append(root, operation.args.path, path, operation.args.content)
+    return _with_append_errors(cwd, f"Content appended to file '{operation.args.path}'")
+
+
+def _with_append_errors(cwd: Path, result: str) -> str:
+    """Prefix `result` with the failures of earlier buffered appends."""
+    appender = _appender()
+    if appender is None:
+        return result
+    errors = appender.take_errors(resolve_root(cwd))
+    return "\n".join([*errors, result])
+
+
+class AppendFlusher(BaseCallbackHandler):
+    """Writes the buffered appends when a top-level graph run ends.
+
+    Attach it to graphs that run the filesystem tools, so what a run appended
+    is on disk when the run returns.
+    """
+
+    def on_chain_end(
+        self,
+        outputs: dict[str, Any],
+        *,
+        run_id: UUID,
+        parent_run_id: UUID | None = None,
+        **kwargs: Any,
+    ) -> None:
+        """Flush when the outermost run finished."""
+        if parent_run_id is None:
+            flush_all()
+
+    def on_chain_error(
+        self,
+        error: BaseException,
+        *,
+        run_id: UUID,
+        parent_run_id: UUID | None = None,
+        **kwargs: Any,
+    ) -> None:
+        """Flush when the outermost run failed."""
+        if parent_run_id is None:
+            flush_all()
+
+
+def _fs_opt(operation: FSOperation, cwd: Path) -> str:
+    """Perform a filesystem operation inside the workspace `cwd`."""
     opt_map = {
         "read": read_file,
         "write": write_file,
@@ -154,182 +583,532 @@ def _fs_opt(operation: FSOperation, cwd: Path) -> str:
         "patch": patch_file,
         "list": list_file,
         "replace": replace_file,
+        "snapshot": snapshot_workspace,
+        "restore": restore_workspace,
     }
-    return opt_map[operation.operation](operation)
+    try:
+        return opt_map[operation.operation](operation, cwd)
+    except (PathEscapeError, InvalidCursorError) as e:
+        return f"Error: {str(e)}"
+
+
+def _fs_batch(operations: list[FSOperation], cwd: Path) -> str:
+    """Perform a batch of filesystem operations inside the workspace `cwd`."""
+
+    def run(operation: FSOperation) -> str:
+        try:
+            return _fs_opt(operation, cwd)
+        except Exception as e:
+            return f"Error: {str(e)}"
+
+    results = run_batch(
+        operations, run, lambda operation: operation.operation in READ_ONLY_TYPES
+    )
+    return json.dumps(
+        [
+            {
+                "index": i,
+                "operation": operation.operation,
+                "path": operation.args.path,
+                "ok": not result.startswith("Error"),
+                "result": result,
+            }
+            for i, (operation, result) in enumerate(zip(operations, results))
+        ],
+        ensure_ascii=False,
+    )
+
+
+def _trigram_index(root: Path) -> TrigramIndex | None:
+    """Return the workspace trigram index if `FS_TRIGRAM_INDEX` enables it."""
+    if not index_enabled():
+        return None
+    return get_index(root, state_dir(root) / "index")
+
+
+def _measure(root: Path, path: Path) -> Usage:
+    """Return the usage of `path`, with the part its snapshots also link."""
+    usage = measure(path)
+    usage.snapshot_files, usage.snapshot_bytes = get_store(root).held(path)
+    return usage
+
+
+def _total(usages: Iterable[Usage]) -> Usage:
+    total = Usage()
+    for usage in usages:
+        total.bytes += usage.bytes
+        total.files += usage.files
+        total.snapshot_bytes += usage.snapshot_bytes
+        total.snapshot_files += usage.snapshot_files
+    return total
+
+
+def _quota_delta(before: Usage, after: Usage) -> tuple[int, int, int, int]:
+    # 快照仍链接的旧文件不会释放，转为快照占用
+    return (
+        after.bytes - before.bytes,
+        after.files - before.files,
+        before.snapshot_bytes,
+        before.snapshot_files,
+    )
 
 
-def read_file(operation: FSOperation) -> str:
+def _reserve_quota(root: Path, before: dict[Path, Usage], after: Usage) -> str | None:
+    """Reserve replacing the paths of `before` by `after` if it fits the quotas.
+
+    While it does not fit, the oldest automatic snapshot is deleted: those
+    are a safety net, not storage the user asked for. The snapshot part of
+    `before` is then measured again.
+
+    Returns:
+        Why the change would exceed a quota, or None if it was reserved.
+    """
+    store, ledger = get_store(root), get_ledger(root)
+    while error := ledger.reserve(*_quota_delta(_total(before.values()), after)):
+        automatic = [s for s in store.list() if s.automatic]
+        if not automatic:
+            return error
+        store.delete(automatic[0].id)
+        ledger.record_snapshots(*store.storage())
+        for path, usage in before.items():
+            usage.snapshot_files, usage.snapshot_bytes = store.held(path)
+    return None
+
+
+def _release_quota(root: Path, before: Usage, after: Usage) -> None:
+    """Release a reservation of `_reserve_quota` whose change was not made."""
+    get_ledger(root).update(*(-delta for delta in _quota_delta(before, after)))
+
+
+def _mutated(
+    root: Path,
+    path: Path,
+    before: Usage | None = None,
+    deleted: bool = False,
+    dedup: bool = True,
+) -> None:
+    """Propagate a change of `path` to the workspace caches and usage ledger.
+
+    `before` is what the ledger records for `path`: what it held before the
+    change, as returned by `_measure`, or what was reserved for it. The
+    ledger is corrected by the difference to what `path` holds now; without
+    `before` it is assumed to be up to date already. `dedup` is cleared for
+    appends, see `agent.tools.fs.dedup`.
+    """
+    if before is not None:
+        after = measure(path)
+        get_ledger(root).update(
+            after.bytes - before.bytes,
+            after.files - before.files,
+            before.snapshot_bytes,
+            before.snapshot_files,
+        )
+    if dedup and not deleted and dedup_enabled() and path.is_file():
+        dedup_file(path, blob_dir(root))
+    get_snapshot(root).invalidate(path)
+    content_cache.invalidate(path)
+    if (index := _trigram_index(root)) is not None:
+        if deleted:
+            index.remove(path)
+        else:
+            index.update(path)
+
+
+def _take_snapshot(root: Path, label: str, automatic: bool = False) -> SnapshotInfo:
+    """Snapshot the workspace and charge the snapshots to its quota.
+
+    Older automatic snapshots are deleted while the snapshots do not fit.
+
+    Raises:
+        SnapshotError: If the new snapshot does not fit even then.
+    """
+    store, ledger = get_store(root), get_ledger(root)
+    info = store.take(label, automatic)
+    while error := ledger.record_snapshots(*store.storage()):
+        older = [s for s in store.list() if s.automatic and s.id != info.id]
+        if not older:
+            store.delete(info.id)
+            ledger.record_snapshots(*store.storage())
+            raise SnapshotError(f"{error}; the snapshot was not kept")
+        store.delete(older[0].id)
+    return info
+
+
+def _auto_snapshot(root: Path, operation: FSOperation) -> None:
+    """Snapshot the workspace before `operation` if `FS_AUTO_SNAPSHOT` asks to."""
+    if auto_snapshot_enabled(operation.operation):
+        target = operation.args.path or operation.args.glob_pattern
+        _take_snapshot(root, f"before {operation.operation} '{target}'", True)
+
+
+def read_file(operation: FSOperation, root: Path = Path(".")) -> str:
     """Read the content of the file."""
-    file_path = Path(operation.args.path)
+    file_path = resolve_path(resolve_root(root), operation.args.path)
     if not file_path.exists():
         return f"Error: File '{operation.args.path}' does not exist"
 
+    readers = {"lines": read_lines, "tail": read_tail, "bytes": read_bytes}
+    reader = readers[operation.args.read_mode or "lines"]
+    # 校验已保证 read 操作带有 read_offset 和 read_length
+    offset, length = operation.args.read_offset or 0, operation.args.read_length or 0
     try:
-        with file_path.open("r", encoding="utf-8") as f:
-            for _ in range(operation.args.read_offset):
-                f.readline()
-            content = f.readlines(operation.args.read_length)
-            return "\n".join(content)
+        return reader(file_path, offset, length)
     except Exception as e:
         return f"Error reading file '{operation.args.path}': {str(e)}"
 
 
-def write_file(operation: FSOperation) -> str:
+def write_file(operation: FSOperation, root: Path = Path(".")) -> str:
     """Write the content to the file."""
-    file_path = Path(operation.args.path)
+    root = resolve_root(root)
+    file_path = resolve_path(root, operation.args.path)
     try:
-        file_path.parent.mkdir(parents=True, exist_ok=True)
-        mode = "a" if operation.args.write_append else "w"
-        with file_path.open(mode, encoding="utf-8") as f:
-            f.write(operation.args.content)
+        before = _measure(root, file_path)
+        data = operation.args.content.encode("utf-8")
+        if not operation.args.write_append:
+            data = pack(data)
+        elif before.files and (codec := file_codec(file_path)) is not None:
+            # 压缩文件追加一段独立的压缩流
+            data = compress_stream(codec, data)
+        size = len(data) + (before.bytes if operation.args.write_append else 0)
+        reserved = Usage(size, 1)
+        if error := _reserve_quota(root, {file_path: before}, reserved):
+            return f"Error: {error}"
+        try:
+            file_path.parent.mkdir(parents=True, exist_ok=True)
+            if operation.args.write_append:
+                append_bytes(file_path, data)
+            else:
+                atomic_write(file_path, data)
+        except Exception:
+            _release_quota(root, before, reserved)
+            raise
+        _mutated(root, file_path, reserved, dedup=not operation.args.write_append)
         action = "appended to" if operation.args.write_append else "written to"
         return f"Content {action} file '{operation.args.path}'"
     except Exception as e:
         return f"Error writing file '{operation.args.path}': {str(e)}"
 
 
-def delete_file(operation: FSOperation) -> str:
+def delete_file(operation: FSOperation, root: Path = Path(".")) -> str:
     """Delete the file."""
-    file_path = Path(operation.args.path)
+    root = resolve_root(root)
+    file_path = resolve_path(root, operation.args.path)
     if not file_path.exists():
         return f"Error: File '{operation.args.path}' does not exist"
+    if file_path == root:
+        return "Error: Cannot delete the workspace root"
 
     try:
+        _auto_snapshot(root, operation)
+        before = _measure(root, file_path)
         if file_path.is_file():
             file_path.unlink()
-            return f"File '{operation.args.path}' deleted successfully"
+            result = f"File '{operation.args.path}' deleted successfully"
         elif file_path.is_dir():
-            import shutil
-
             shutil.rmtree(file_path)
-            return f"Directory '{operation.args.path}' deleted successfully"
+            result = f"Directory '{operation.args.path}' deleted successfully"
         else:
             return f"Error: '{operation.args.path}' is neither a file nor a directory"
     except Exception as e:
         return f"Error deleting '{operation.args.path}': {str(e)}"
+    _mutated(root, file_path, before, deleted=True)
+    return result
+
+
+def _iter_search_lines(
+    root: Path,
+    files: Iterable[Path],
+    pattern: re.Pattern[str],
+    operation: FSOperation,
+    stats: SearchStats,
+    deadline: Deadline | None = None,
+) -> Generator[str]:
+    """Yield formatted matching lines, prefixed by path for workspace search."""
+    matches = iter_matches(
+        files,
+        pattern,
+        max_matches_per_file=operation.args.max_matches_per_file,
+        stats=stats,
+        deadline=deadline,
+    )
+    try:
+        for file_matches in matches:
+            prefix = (
+                ""
+                if operation.args.path
+                else f"{display_path(root, file_matches.path)}:"
+            )
+            for line_num, line in file_matches.matches:
+                yield f"{prefix}{line_num}: {line}"
+    finally:
+        matches.close()
 
 
-def search_file(operation: FSOperation) -> str:
+def search_file(operation: FSOperation, root: Path = Path(".")) -> str:
     """Search the content of the file."""
-    if not operation.args.path:
-        # 如果没有指定路径，在当前工作目录递归搜索
-        search_path = Path(".")
-        results = []
-        try:
-            pattern = re.compile(operation.args.query)
-            for file_path in search_path.rglob("*"):
-                if file_path.is_file():
-                    try:
-                        with file_path.open(
-                            "r", encoding="utf-8", errors="ignore"
-                        ) as f:
-                            for line_num, line in enumerate(f, 1):
-                                if pattern.search(line):
-                                    results.append(
-                                        f"{file_path}:{line_num}: {line.strip()}"
-                                    )
-                    except Exception:
-                        continue
-        except re.error as e:
-            return f"Error: Invalid regex pattern '{operation.args.query}': {str(e)}"
-        except Exception as e:
-            return f"Error searching files: {str(e)}"
+    root = resolve_root(root)
+    max_results = operation.args.max_results
+    if max_results is None:
+        max_results = int(os.getenv("FS_SEARCH_MAX_RESULTS", str(DEFAULT_MAX_RESULTS)))
+    key = fingerprint(
+        "search",
+        operation.args.path,
+        operation.args.query,
+        max_results,
+        operation.args.max_matches_per_file,
+    )
+    offset = decode_cursor(operation.args.cursor, key)
+    try:
+        pattern = compile_pattern(operation.args.query)
+    except re.error as e:
+        return f"Error: Invalid regex pattern '{operation.args.query}': {str(e)}"
+    except UnsafePatternError as e:
+        return f"Error: {str(e)}"
 
-        if results:
-            return "\n".join(results)
-        else:
-            return f"No matches found for pattern '{operation.args.query}'"
+    if not operation.args.path:
+        # 如果没有指定路径，在工作区根目录递归搜索
+        files = None
+        if (index := _trigram_index(root)) is not None:
+            index.refresh(max_age=refresh_interval())
+            files = index.candidates(pattern)
+        error_message = "Error searching files"
+        no_match_message = f"No matches found for pattern '{operation.args.query}'"
     else:
         # 在指定文件中搜索
-        file_path = Path(operation.args.path)
+        file_path = resolve_path(root, operation.args.path)
         if not file_path.exists():
             return f"Error: File '{operation.args.path}' does not exist"
+        files = [file_path]
+        error_message = f"Error searching file '{operation.args.path}'"
+        no_match_message = f"No matches found for pattern '{operation.args.query}' in '{operation.args.path}'"
+
+    stats = SearchStats()
+    deadline = Deadline(regex_timeout())
+    lines = _iter_search_lines(
+        root,
+        iter_files(root) if files is None else files,
+        pattern,
+        operation,
+        stats,
+        deadline,
+    )
+    try:
+        page, has_more = paginate(
+            islice(lines, max_results), offset, _page_size(operation)
+        )
+        # 达到 max_results 上限时，多取一条判断是否被截断
+        truncated = not has_more and next(lines, None) is not None
+    except Exception as e:
+        return f"{error_message}: {str(e)}"
+    finally:
+        lines.close()
+
+    timed_out = ""
+    if stats.timed_out:
+        timed_out = (
+            f"... search stopped, {deadline.describe()}; "
+            f"results are partial ({stats.summary()})"
+        )
+    if not page:
+        if timed_out:
+            return f"{no_match_message}\n{timed_out}"
+        return no_match_message if offset == 0 else "No more matches"
+    if has_more:
+        page.append(more_results_line(key, offset + len(page)))
+    if timed_out:
+        page.append(timed_out)
+    if truncated:
+        page.append(
+            f"... results truncated at {max_results} matches ({stats.summary()})"
+        )
+    return "\n".join(page)
 
-        try:
-            pattern = re.compile(operation.args.query)
-            matches = []
-            with file_path.open("r", encoding="utf-8", errors="ignore") as f:
-                for line_num, line in enumerate(f, 1):
-                    if pattern.search(line):
-                        matches.append(f"{line_num}: {line.strip()}")
-            if matches:
-                return "\n".join(matches)
-            else:
-                return f"No matches found for pattern '{operation.args.query}' in '{operation.args.path}'"
-        except re.error as e:
-            return f"Error: Invalid regex pattern '{operation.args.query}': {str(e)}"
-        except Exception as e:
-            return f"Error searching file '{operation.args.path}': {str(e)}"
 
+def _page_size(operation: FSOperation) -> int:
+    """Return the requested page size, or the configured default."""
+    return operation.args.page_size or default_page_size()
 
-def glob_file(operation: FSOperation) -> str:
+
+def _glob(root: Path, pattern: str) -> list[str]:
+    """Glob `pattern` under `root`, returning sorted workspace-relative paths."""
+    check_pattern(pattern)
+    return list(iter_glob(root, pattern))
+
+
+def glob_file(operation: FSOperation, root: Path = Path(".")) -> str:
     """Glob the file."""
+    pattern = operation.args.glob_pattern
+    check_pattern(pattern)
+    key = fingerprint("glob", pattern)
+    offset = decode_cursor(operation.args.cursor, key)
     try:
-        matches = sorted(glob_module.glob(operation.args.glob_pattern, recursive=True))
-        if matches:
-            return "\n".join(matches)
-        else:
-            return f"No files matched pattern '{operation.args.glob_pattern}'"
+        page, has_more = paginate(
+            iter_glob(resolve_root(root), pattern), offset, _page_size(operation)
+        )
     except Exception as e:
-        return f"Error globbing pattern '{operation.args.glob_pattern}': {str(e)}"
-
-
-def patch_file(operation: FSOperation) -> str:
+        return f"Error globbing pattern '{pattern}': {str(e)}"
+    if not page:
+        if offset == 0:
+            return f"No files matched pattern '{pattern}'"
+        return "No more files"
+    if has_more:
+        page.append(more_results_line(key, offset + len(page)))
+    return "\n".join(page)
+
+
+def _apply_file_patch(
+    patch: FilePatch, file_path: Path
+) -> tuple[list[str] | None, list[HunkResult]]:
+    """Apply `patch` to `file_path` in memory.
+
+    Returns:
+        The patched lines, or None if the file is to be deleted, and the
+        result of every hunk.
+    """
+    lines: list[str] = []
+    if not patch.creates or file_path.exists():
+        with io.TextIOWrapper(open_decoded(file_path), "utf-8", newline="") as f:
+            lines = f.readlines()
+    patched, results = apply_hunks(lines, patch.hunks)
+    if patch.deletes and not patched:
+        return None, results
+    return patched, results
+
+
+def patch_file(operation: FSOperation, root: Path = Path(".")) -> str:
     """Patch the content of the file."""
-    file_path = Path(operation.args.path)
-    if not file_path.exists():
-        return f"Error: File '{operation.args.path}' does not exist"
+    root = resolve_root(root)
+    file_path = resolve_path(root, operation.args.path)
+    try:
+        patches = parse_patch(operation.args.content)
+    except PatchError as e:
+        return f"Error: Failed to patch file '{operation.args.path}': {str(e)}"
+    if len(patches) == 1:
+        # 单文件补丁作用于调用方指定的路径，与补丁头中的文件名无关
+        targets = [(patches[0], file_path)]
+    else:
+        targets = [(p, resolve_path(root, p.path)) for p in patches]
+    for patch, target in targets:
+        if not patch.creates and not target.exists():
+            return f"Error: File '{display_path(root, target)}' does not exist"
 
     try:
-        # patch 操作通常是在文件末尾追加内容
-        cmd = ["patch", "-p", "0"]
-        proc = sp.Popen(cmd, stdin=sp.PIPE, stdout=sp.PIPE, stderr=sp.STDOUT)
-        proc.stdin.write(operation.args.content.encode("utf-8"))
-        proc.stdin.close()
-        stdout, _ = proc.communicate(timeout=10)
-        if proc.returncode != 0:
-            return f"Error: Failed to patch file '{operation.args.path}': {stdout.decode('utf-8', errors='ignore')}"
-        return f"Content patched to file '{operation.args.path}'"
+        patched = []
+        report = []
+        clean = True
+        for patch, target in targets:
+            lines, results = _apply_file_patch(patch, target)
+            patched.append((target, lines))
+            prefix = f"'{display_path(root, target)}': " if len(targets) > 1 else ""
+            for number, result in enumerate(results, 1):
+                report.append(prefix + result.describe(number))
+                clean &= result.status == "applied" and not result.offset
+                clean &= not result.fuzz
+            if any(r.status == "rejected" for r in results):
+                return (
+                    f"Error: Failed to patch file '{operation.args.path}', "
+                    f"no changes were written:\n" + "\n".join(report)
+                )
+        before = {target: _measure(root, target) for target, _ in patched}
+        after = {}
+        stored = {}
+        for target, lines in patched:
+            if lines is None:
+                after[target] = Usage()
+            else:
+                stored[target] = pack("".join(lines).encode("utf-8"))
+                after[target] = Usage(len(stored[target]), 1)
+        if error := _reserve_quota(root, before, _total(after.values())):
+            return f"Error: {error}"
+        # 所有 hunk 都能应用后才逐个原子写入
+        written = set()
+        try:
+            for target, lines in patched:
+                if lines is None:
+                    target.unlink()
+                else:
+                    target.parent.mkdir(parents=True, exist_ok=True)
+                    atomic_write(target, stored[target])
+                written.add(target)
+                _mutated(root, target, after[target], deleted=lines is None)
+        finally:
+            for target in before.keys() - written:
+                _release_quota(root, before[target], after[target])
     except Exception as e:
         return f"Error patching file '{operation.args.path}': {str(e)}"
+    if len(targets) == 1:
+        message = f"Content patched to file '{operation.args.path}'"
+    else:
+        names = ", ".join(f"'{display_path(root, t)}'" for t, _ in patched)
+        message = f"Content patched to {len(targets)} file(s): {names}"
+    return message if clean else message + "\n" + "\n".join(report)
+
+
+def _iter_tree(
+    root: Path, path: Path, max_depth: int | None, max_entries: int
+) -> Iterator[str]:
+    """Yield the lines of a tree view of the directory `path`."""
+    rules = load_rules(root)
+    rel_dir = "" if path == root else display_path(root, path)
+    nodes = walk(
+        root,
+        rel_dir,
+        max_depth=max_depth,
+        rules=rules,
+        include_ignored=True,
+        sizes=True,
+    )
+    # lasts[i] 记录第 i+1 层当前节点是否为最后一个兄弟节点，用来画出树形前缀
+    lasts: list[bool] = []
+    for count, node in enumerate(nodes):
+        if count >= max_entries:
+            yield f"... listing truncated at {max_entries} entries"
+            return
+        del lasts[node.depth - 1 :]
+        prefix = "".join("    " if last else "│   " for last in lasts)
+        prefix += "└── " if node.is_last else "├── "
+        lasts.append(node.is_last)
+        name = node.entry.name
+        if node.entry.is_file:
+            yield f"{prefix}{name} ({node.entry.size} bytes)"
+        elif node.pruned == "ignored":
+            yield f"{prefix}{name}/ (ignored)"
+        elif node.pruned == "depth":
+            yield f"{prefix}{name}/ ({summarize(root, node.rel, rules=rules)})"
+        elif node.entry.is_dir:
+            yield f"{prefix}{name}/"
+        else:
+            yield f"{prefix}{name} (?)"
 
 
-def list_file(operation: FSOperation) -> str:
+def list_file(operation: FSOperation, root: Path = Path(".")) -> str:
     """List the content of the file."""
-    file_path = Path(operation.args.path)
+    root = resolve_root(root)
+    file_path = resolve_path(root, operation.args.path)
     if not file_path.exists():
         return f"Error: Path '{operation.args.path}' does not exist"
 
+    max_depth = operation.args.max_depth
+    if max_depth is None and os.getenv("FS_LIST_MAX_DEPTH"):
+        max_depth = int(os.environ["FS_LIST_MAX_DEPTH"])
+    max_entries = operation.args.max_entries
+    if max_entries is None:
+        max_entries = int(os.getenv("FS_LIST_MAX_ENTRIES", str(DEFAULT_MAX_ENTRIES)))
+    key = fingerprint("list", operation.args.path, max_depth, max_entries)
+    offset = decode_cursor(operation.args.cursor, key)
     try:
         if file_path.is_file():
             return (
                 f"File: {operation.args.path}\nSize: {file_path.stat().st_size} bytes"
             )
         elif file_path.is_dir():
-            items = []
-
-            def _list_recursive(path: Path, prefix: str = "") -> None:
-                """Recursively list directory contents."""
-                try:
-                    entries = sorted(path.iterdir())
-                    for i, item in enumerate(entries):
-                        is_last = i == len(entries) - 1
-                        current_prefix = "└── " if is_last else "├── "
-                        full_prefix = prefix + current_prefix
-
-                        if item.is_file():
-                            size = item.stat().st_size
-                            items.append(f"{full_prefix}{item.name} ({size} bytes)")
-                        elif item.is_dir():
-                            items.append(f"{full_prefix}{item.name}/")
-                            next_prefix = prefix + ("    " if is_last else "│   ")
-                            _list_recursive(item, next_prefix)
-                        else:
-                            items.append(f"{full_prefix}{item.name} (?)")
-                except PermissionError:
-                    items.append(f"{prefix}[Permission denied]")
-
-            _list_recursive(file_path)
+            items, has_more = paginate(
+                _iter_tree(root, file_path, max_depth, max_entries),
+                offset,
+                _page_size(operation),
+            )
+            if has_more:
+                items.append(more_results_line(key, offset + len(items)))
             if items:
                 return f"Directory: {operation.args.path}\n" + "\n".join(items)
             else:
@@ -340,53 +1119,133 @@ def list_file(operation: FSOperation) -> str:
         return f"Error listing '{operation.args.path}': {str(e)}"
 
 
-def replace_file(operation: FSOperation) -> str:
+def replace_file(operation: FSOperation, root: Path = Path(".")) -> str:
     """Replace the content of the file."""
+    root = resolve_root(root)
     try:
         # 使用 glob_pattern 查找文件
-        matched_files = sorted(
-            glob_module.glob(operation.args.glob_pattern, recursive=True)
-        )
+        matched_files = _glob(root, operation.args.glob_pattern)
         if not matched_files:
             return f"No files matched pattern '{operation.args.glob_pattern}'"
 
-        pattern = re.compile(operation.args.replace_pattern)
-        results = []
-        total_replacements = 0
-
+        pattern = compile_pattern(operation.args.replace_pattern)
+        paths = {}
+        errors = {}
         for file_path_str in matched_files:
-            file_path = Path(file_path_str)
-            if not file_path.is_file():
-                continue
-
             try:
-                with file_path.open("r", encoding="utf-8") as f:
-                    original_content = f.read()
-
-                new_content, count = pattern.subn(
-                    operation.args.content, original_content
-                )
-
-                if count > 0:
-                    with file_path.open("w", encoding="utf-8") as f:
-                        f.write(new_content)
-                    results.append(f"'{file_path_str}': {count} replacement(s)")
-                    total_replacements += count
-                else:
-                    results.append(f"'{file_path_str}': No matches found")
-            except Exception as e:
-                results.append(f"'{file_path_str}': Error - {str(e)}")
+                file_path = resolve_path(root, file_path_str)
+            except PathEscapeError as e:
+                errors[file_path_str] = str(e)
+                continue
+            if file_path.is_file():
+                paths[file_path] = file_path_str
+
+        dry_run = bool(operation.args.dry_run)
+        if not dry_run and paths:
+            _auto_snapshot(root, operation)
+
+        reserved: dict[Path, tuple[Usage, Usage]] = {}
+
+        def reserve(file_result: FileReplacement) -> str | None:
+            held_files, held_bytes = get_store(root).held(file_result.path)
+            before = Usage(
+                file_result.old_size,
+                1,
+                snapshot_bytes=held_bytes,
+                snapshot_files=held_files,
+            )
+            after = Usage(file_result.size, 1)
+            if error := _reserve_quota(root, {file_result.path: before}, after):
+                return error
+            reserved[file_result.path] = (before, after)
+            return None
+
+        def release(file_result: FileReplacement) -> None:
+            _release_quota(root, *reserved.pop(file_result.path))
+
+        outcome = replace(
+            paths,
+            pattern,
+            operation.args.content,
+            dry_run=dry_run,
+            max_files=operation.args.max_files,
+            max_bytes=operation.args.max_bytes,
+            reserve=reserve,
+            release=release,
+            deadline=Deadline(regex_timeout()),
+        )
+        results = [f"'{path}': Error - {error}" for path, error in errors.items()]
+        changed = 0
+        for file_result in outcome.files:
+            name = paths[file_result.path]
+            if file_result.error is not None:
+                results.append(f"'{name}': Error - {file_result.error}")
+            elif file_result.count > 0:
+                changed += 1
+                results.append(f"'{name}': {file_result.count} replacement(s)")
+                if not dry_run:
+                    _mutated(root, file_result.path)
+            else:
+                results.append(f"'{name}': No matches found")
+        for path in outcome.skipped:
+            results.append(f"'{paths[path]}': Skipped - {outcome.limit}")
 
-        if total_replacements > 0:
+        if dry_run:
             return (
-                f"Replacements made in {len([r for r in results if 'replacement(s)' in r])} file(s):\n"
-                + "\n".join(results)
+                f"Dry run, no files written. Replacements would be made in "
+                f"{changed} file(s):\n" + "\n".join(results)
             )
+        if outcome.total > 0:
+            return f"Replacements made in {changed} file(s):\n" + "\n".join(results)
         else:
             return "No replacements made:\n" + "\n".join(results)
+    except PathEscapeError:
+        raise
     except re.error as e:
         return (
             f"Error: Invalid regex pattern '{operation.args.replace_pattern}': {str(e)}"
         )
+    except UnsafePatternError as e:
+        return f"Error: {str(e)}"
+
     except Exception as e:
         return f"Error replacing in files: {str(e)}"
+
+
+def _list_snapshots(root: Path) -> str:
+    """Return the lines describing the snapshots of the workspace."""
+    snapshots = get_store(root).list()
+    if not snapshots:
+        return "No snapshots"
+    return "Snapshots:\n" + "\n".join(s.describe() for s in reversed(snapshots))
+
+
+def snapshot_workspace(operation: FSOperation, root: Path = Path(".")) -> str:
+    """Take a snapshot of the workspace."""
+    root = resolve_root(root)
+    try:
+        info = _take_snapshot(root, operation.args.content or "")
+    except Exception as e:
+        return f"Error taking snapshot: {str(e)}"
+    return f"Snapshot '{info.id}' taken\n" + _list_snapshots(root)
+
+
+def restore_workspace(operation: FSOperation, root: Path = Path(".")) -> str:
+    """Restore the workspace to a snapshot."""
+    root = resolve_root(root)
+    snapshot_id = operation.args.snapshot_id
+    try:
+        backup = get_store(root).restore(snapshot_id)
+    except SnapshotError as e:
+        return f"Error: {str(e)}\n" + _list_snapshots(root)
+    except Exception as e:
+        return f"Error restoring snapshot '{snapshot_id}': {str(e)}"
+    get_snapshot(root).clear()
+    content_cache.invalidate(root)
+    if (index := _trigram_index(root)) is not None:
+        index.rebuild()
+    get_ledger(root).reconcile()
+    return (
+        f"Workspace restored to snapshot '{snapshot_id}'. "
+        f"The previous state was saved as snapshot '{backup.id}'"
+    )
@@ -0,0 +1 @@
+"""Building blocks for the filesystem tool."""
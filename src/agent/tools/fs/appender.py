@@ -0,0 +1,198 @@
+"""Coalescing of small appends into fewer, larger writes.
+
+Agents that stream notes append to the same file many times in a row. When
+`FS_APPEND_BUFFER_BYTES` is set, appends made through the tools are kept in a
+per-path buffer in the calling process and written in one go when the buffer
+reaches that size, when its oldest append is `FS_APPEND_FLUSH_SECONDS` old,
+before any other operation touches the path, when a graph run that uses the
+tools ends, and at interpreter exit. A buffered append costs no worker
+dispatch and no system call.
+
+A flush takes the buffer out under the lock and writes it without holding
+it, so appends to other paths never wait for the disk; flushes of the same
+path are written one after the other, in order.
+
+Buffers live in the process that receives the tool calls, not in the
+workers, so they stay coherent with both pool backends.
+
+Configuration is read from the environment:
+
+- `FS_APPEND_BUFFER_BYTES`: buffer size per path, 0 disables buffering
+  (default 0).
+- `FS_APPEND_FLUSH_SECONDS`: maximum age of a buffered append (default 1).
+- `FS_APPEND_FSYNC`: `flush` to fsync a file after every flush, `never`
+  (default) to leave it to the operating system.
+"""
+
+import atexit
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable
+
+DEFAULT_FLUSH_SECONDS = 1.0
+
+# 实际写入的回调：(工作区, 相对路径, 内容) -> 结果文本
+WriteFunc = Callable[[Path, str, str], str]
+
+
+@dataclass
+class _Pending:
+    root: Path
+    rel: str
+    chunks: list[str] = field(default_factory=list)
+    size: int = 0
+    since: float = 0.0
+
+
+class Appender:
+    """Per-path append buffers flushed on size, age or demand."""
+
+    def __init__(
+        self,
+        write: WriteFunc,
+        max_bytes: int,
+        max_delay: float = DEFAULT_FLUSH_SECONDS,
+        fsync: bool = False,
+    ) -> None:
+        """Initialize empty buffers written through `write`."""
+        self.write = write
+        self.max_bytes = max_bytes
+        self.max_delay = max_delay
+        self.fsync = fsync
+        self.flushes = 0
+        self._pending: dict[Path, _Pending] = {}
+        # 正在写入的路径；同一路径的下一次刷新要等它写完
+        self._flushing: set[Path] = set()
+        self._errors: dict[Path, list[str]] = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._flushed = threading.Condition(self._lock)
+        self._timer_running = False
+
+    def pending_bytes(self, path: Path) -> int:
+        """Return the size of the appends buffered for `path`."""
+        with self._lock:
+            pending = self._pending.get(path)
+            return 0 if pending is None else pending.size
+
+    def append(self, root: Path, rel: str, path: Path, content: str) -> None:
+        """Buffer `content` to be appended to `path`, `rel` in workspace `root`."""
+        with self._lock:
+            pending = self._pending.get(path)
+            if pending is None:
+                pending = self._pending[path] = _Pending(
+                    root, rel, since=time.monotonic()
+                )
+                self._start_timer()
+            pending.chunks.append(content)
+            pending.size += len(content.encode("utf-8"))
+            full = pending.size >= self.max_bytes
+        if full:
+            self._flush_one(path)
+
+    def flush(self, under: Path | None = None) -> None:
+        """Write the buffers of `under` and the paths below it, or of all paths.
+
+        Also waits for the flushes of those paths that are already running.
+        """
+        with self._lock:
+            paths = [
+                path
+                for path in {*self._pending, *self._flushing}
+                if under is None or path == under or path.is_relative_to(under)
+            ]
+        for path in paths:
+            self._flush_one(path)
+
+    def take_errors(self, root: Path) -> list[str]:
+        """Return and forget the failed flushes in the workspace `root`."""
+        with self._lock:
+            return self._errors.pop(root, [])
+
+    def _flush_one(self, path: Path) -> None:
+        with self._lock:
+            while path in self._flushing:
+                self._flushed.wait()
+            pending = self._pending.pop(path, None)
+            if pending is None:
+                return
+            self._flushing.add(path)
+        try:
+            result = self.write(pending.root, pending.rel, "".join(pending.chunks))
+            if self.fsync and not result.startswith("Error"):
+                fd = os.open(path, os.O_RDONLY)
+                try:
+                    os.fsync(fd)
+                finally:
+                    os.close(fd)
+        except Exception as e:
+            result = f"Error: {str(e)}"
+        with self._lock:
+            self.flushes += 1
+            if result.startswith("Error"):
+                self._errors.setdefault(pending.root, []).append(
+                    f"Error: buffered append to '{pending.rel}' failed: {result}"
+                )
+            self._flushing.discard(path)
+            self._flushed.notify_all()
+
+    def _start_timer(self) -> None:
+        if self._timer_running:
+            self._wakeup.notify()
+            return
+        self._timer_running = True
+        threading.Thread(
+            target=self._run_timer, name="fs-appender", daemon=True
+        ).start()
+
+    def _run_timer(self) -> None:
+        while True:
+            with self._lock:
+                if not self._pending:
+                    # 持锁退出，之后的 append 会重新启动线程
+                    self._timer_running = False
+                    return
+                now = time.monotonic()
+                due = [
+                    path
+                    for path, pending in self._pending.items()
+                    if now - pending.since >= self.max_delay
+                ]
+                if not due:
+                    oldest = min(p.since for p in self._pending.values())
+                    self._wakeup.wait(oldest + self.max_delay - now)
+            for path in due:
+                self._flush_one(path)
+
+
+_appender: Appender | None = None
+_appender_lock = threading.Lock()
+
+
+def get_appender(write: WriteFunc) -> Appender | None:
+    """Return the process-wide appender, or None if buffering is disabled."""
+    global _appender
+    max_bytes = int(os.getenv("FS_APPEND_BUFFER_BYTES", "0"))
+    if max_bytes <= 0:
+        return None
+    with _appender_lock:
+        if _appender is None:
+            _appender = Appender(
+                write,
+                max_bytes,
+                float(os.getenv("FS_APPEND_FLUSH_SECONDS", str(DEFAULT_FLUSH_SECONDS))),
+                os.getenv("FS_APPEND_FSYNC", "never") == "flush",
+            )
+        return _appender
+
+
+def flush_all() -> None:
+    """Write every buffered append, e.g. at the end of a graph run."""
+    if _appender is not None:
+        _appender.flush()
+
+
+atexit.register(flush_all)
@@ -0,0 +1,136 @@
+"""Atomic file replacement.
+
+Content is written to a temporary file in the target's directory, flushed to
+disk and then renamed over the target, so readers see either the old or the
+new file and a crash never leaves a truncated one behind. Because the
+target gets a new inode, other hard links to the old file are left intact.
+A replaced file keeps its permissions; a new one gets the usual `0o666`
+less the umask, not the private mode of the temporary file.
+
+Renames and appends take `path_lock` on the target's directory, so that code
+which inspects a file before replacing it, like deduplication, can hold the
+same lock and know the file does not change in between.
+"""
+
+import fcntl
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+from typing import IO, Any, Iterator
+
+
+def _umask() -> int:
+    # 只能通过设置来读取 umask，在导入时读一次，避免运行中与其他线程竞争
+    mask = os.umask(0o022)
+    os.umask(mask)
+    return mask
+
+
+DEFAULT_MODE = 0o666 & ~_umask()
+
+
+def temp_path(path: Path) -> Path:
+    """Create an empty temporary file next to `path` and return its path."""
+    fd, name = tempfile.mkstemp(prefix=f".{path.name}.", suffix=".tmp", dir=path.parent)
+    os.close(fd)
+    return Path(name)
+
+
+@contextmanager
+def path_lock(path: Path) -> Iterator[None]:
+    """Lock the directory of `path` against changes by other threads or processes.
+
+    The lock is not reentrant: do not commit or append within it.
+    """
+    fd = os.open(path.parent, os.O_RDONLY)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        yield
+    finally:
+        # 关闭描述符即释放锁
+        os.close(fd)
+
+
+def _commit(tmp: Path, path: Path) -> None:
+    try:
+        mode = os.stat(path).st_mode & 0o7777
+    except FileNotFoundError:
+        mode = DEFAULT_MODE
+    os.chmod(tmp, mode)
+    os.replace(tmp, path)
+
+
+def commit(tmp: Path, path: Path) -> None:
+    """Rename the finished temporary file `tmp` over `path`.
+
+    `tmp` takes the permissions of `path`, or the default ones if `path`
+    does not exist yet.
+    """
+    with path_lock(path):
+        _commit(tmp, path)
+
+
+@contextmanager
+def atomic_writer(
+    path: Path,
+    mode: str = "w",
+    encoding: str | None = "utf-8",
+    newline: str | None = None,
+) -> Iterator[IO[Any]]:
+    """Open a temporary file that replaces `path` when the block succeeds.
+
+    The temporary file is removed if the block raises.
+    """
+    tmp = temp_path(path)
+    try:
+        if "b" in mode:
+            encoding = None
+        with tmp.open(mode, encoding=encoding, newline=newline) as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        commit(tmp, path)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+
+
+def atomic_write(path: Path, data: str | bytes, encoding: str = "utf-8") -> None:
+    """Replace the content of `path` with `data` atomically."""
+    if isinstance(data, bytes):
+        mode, newline = "wb", None
+    else:
+        mode, newline = "w", ""
+    with atomic_writer(path, mode, encoding=encoding, newline=newline) as f:
+        f.write(data)
+
+
+def append_bytes(path: Path, data: bytes) -> None:
+    """Append `data` to `path`.
+
+    A file that shares its inode with other hard links, such as a workspace
+    snapshot, is copied first and the copy renamed over `path`, so the other
+    links keep the old content.
+    """
+    with path_lock(path):
+        try:
+            shared = os.stat(path).st_nlink > 1
+        except FileNotFoundError:
+            shared = False
+        if not shared:
+            with path.open("ab") as f:
+                f.write(data)
+            return
+        tmp = temp_path(path)
+        try:
+            with tmp.open("wb") as out, path.open("rb") as src:
+                shutil.copyfileobj(src, out)
+                out.write(data)
+                out.flush()
+                os.fsync(out.fileno())
+            _commit(tmp, path)
+        except BaseException:
+            tmp.unlink(missing_ok=True)
+            raise
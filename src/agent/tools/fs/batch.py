@@ -0,0 +1,56 @@
+"""Ordered execution of a batch of operations.
+
+Runs of consecutive read-only operations are executed concurrently on a
+dedicated thread pool; every other operation runs alone, after everything
+before it has finished and before anything after it starts. Results are
+returned in the order of the operations.
+
+The pool is separate from the search pool because batched searches submit
+their own work to that one. Its size is read from `FS_BATCH_WORKERS`
+(default 4).
+"""
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Sequence
+
+DEFAULT_WORKERS = 4
+
+_executor: ThreadPoolExecutor | None = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=int(os.getenv("FS_BATCH_WORKERS", str(DEFAULT_WORKERS))),
+                thread_name_prefix="fs-batch",
+            )
+        return _executor
+
+
+def run_batch[T, R](
+    items: Sequence[T],
+    run: Callable[[T], R],
+    read_only: Callable[[T], bool],
+    executor: ThreadPoolExecutor | None = None,
+) -> list[R]:
+    """Run `run` on every item, concurrently within runs of read-only items."""
+    results: list[R] = []
+    i = 0
+    while i < len(items):
+        j = i + 1
+        if read_only(items[i]):
+            while j < len(items) and read_only(items[j]):
+                j += 1
+        if j - i == 1:
+            results.append(run(items[i]))
+        else:
+            pool = executor or _get_executor()
+            futures = [pool.submit(run, item) for item in items[i:j]]
+            results.extend(f.result() for f in futures)
+        i = j
+    return results
@@ -0,0 +1,224 @@
+"""Transparent compression of large workspace files.
+
+When `FS_COMPRESS` names a codec, files the tool writes that are at least
+`FS_COMPRESS_MIN_SIZE` bytes are stored compressed: a 7-byte header
+(`MAGIC` followed by the codec letter and a newline) and one or more
+compressed streams. Appending to a compressed file adds another stream, so
+it never has to be decompressed and compressed again.
+
+Every reader in the tool opens files through `open_decoded`, which returns
+the decoded content as a buffered stream decompressed chunk by chunk, so
+reading and searching a compressed file never materialise it. Because the
+header starts with a null byte, tools outside of this one see compressed
+files as binary rather than garbage text.
+
+Configuration is read from the environment:
+
+- `FS_COMPRESS`: `zlib` or `lzma` enables compression (default off).
+  Files already compressed are read whatever the setting.
+- `FS_COMPRESS_MIN_SIZE`: smallest file that is compressed (default 64 KiB).
+- `FS_COMPRESS_LEVEL`: compression level or lzma preset (default 6).
+"""
+
+import io
+import lzma
+import os
+import zlib
+from collections.abc import Buffer
+from pathlib import Path
+from typing import IO, BinaryIO, Protocol
+
+MAGIC = b"\x00fsz1"
+HEADER_SIZE = len(MAGIC) + 2
+CODECS = {"zlib": b"z", "lzma": b"x"}
+DEFAULT_MIN_SIZE = 64 * 1024
+DEFAULT_LEVEL = 6
+CHUNK_SIZE = 256 * 1024
+
+
+class _Compressor(Protocol):
+    def compress(self, data: bytes, /) -> bytes: ...
+
+    def flush(self) -> bytes: ...
+
+
+class _ZlibDecompressor(Protocol):
+    @property
+    def eof(self) -> bool: ...
+
+    @property
+    def unused_data(self) -> bytes: ...
+
+    @property
+    def unconsumed_tail(self) -> bytes: ...
+
+    def decompress(self, data: bytes, /, max_length: int = 0) -> bytes: ...
+
+    def flush(self) -> bytes: ...
+
+
+def codec() -> str | None:
+    """Return the codec new files are compressed with, or None if disabled."""
+    name = os.getenv("FS_COMPRESS", "").lower()
+    return name if name in CODECS else None
+
+
+def min_size() -> int:
+    """Return the size below which files are stored uncompressed."""
+    return int(os.getenv("FS_COMPRESS_MIN_SIZE", str(DEFAULT_MIN_SIZE)))
+
+
+def header(name: str) -> bytes:
+    """Return the header of a file compressed with the codec `name`."""
+    return MAGIC + CODECS[name] + b"\n"
+
+
+def parse_header(head: bytes) -> str | None:
+    """Return the codec of a file starting with `head`, or None if plain."""
+    if len(head) < HEADER_SIZE or not head.startswith(MAGIC) or head[6:7] != b"\n":
+        return None
+    for name, letter in CODECS.items():
+        if head[5:6] == letter:
+            return name
+    return None
+
+
+def file_codec(path: Path) -> str | None:
+    """Return the codec `path` is compressed with, or None if it is plain."""
+    with path.open("rb") as f:
+        return parse_header(f.read(HEADER_SIZE))
+
+
+def _compressor(name: str) -> _Compressor:
+    level = int(os.getenv("FS_COMPRESS_LEVEL", str(DEFAULT_LEVEL)))
+    if name == "lzma":
+        return lzma.LZMACompressor(preset=level)
+    return zlib.compressobj(level)
+
+
+def _decompressor(name: str) -> lzma.LZMADecompressor | _ZlibDecompressor:
+    return lzma.LZMADecompressor() if name == "lzma" else zlib.decompressobj()
+
+
+def compress_stream(name: str, data: bytes) -> bytes:
+    """Compress `data` into one stream, without header, to append to a file."""
+    compressor = _compressor(name)
+    return compressor.compress(data) + compressor.flush()
+
+
+def pack(data: bytes) -> bytes:
+    """Return what to store for the content `data`.
+
+    The content is compressed if compression is enabled and it is large
+    enough; otherwise it is returned as it is.
+    """
+    name = codec()
+    if name is None or len(data) < min_size():
+        return data
+    return header(name) + compress_stream(name, data)
+
+
+class _DecodedReader(io.RawIOBase):
+    """Raw stream of the decompressed content of a compressed file."""
+
+    def __init__(self, f: BinaryIO, name: str) -> None:
+        self._f = f
+        self._name = name
+        self._decompressor = _decompressor(name)
+        self._input = b""
+        self._pending = b""
+
+    def readable(self) -> bool:
+        return True
+
+    def _needs_input(self) -> bool:
+        if self._input:
+            return False
+        d = self._decompressor
+        return not isinstance(d, lzma.LZMADecompressor) or d.needs_input
+
+    def _decode(self) -> bytes:
+        """Return the next chunk of content, or b"" at the end."""
+        while True:
+            if self._needs_input():
+                self._input = self._f.read(CHUNK_SIZE)
+                if not self._input:
+                    # zlib 可能还缓存着没有输出的数据
+                    d = self._decompressor
+                    if isinstance(d, lzma.LZMADecompressor) or d.eof:
+                        return b""
+                    return d.flush()
+            d = self._decompressor
+            # 限制单次输出大小，高压缩比的数据也不会一次性解压到内存
+            out = d.decompress(self._input, CHUNK_SIZE)
+            if isinstance(d, lzma.LZMADecompressor):
+                self._input = b""
+            else:
+                self._input = d.unconsumed_tail
+            if d.eof:
+                # 追加写入的每段都是独立的压缩流
+                self._input = d.unused_data
+                self._decompressor = _decompressor(self._name)
+            if out:
+                return out
+
+    def readinto(self, buffer: Buffer) -> int:
+        if not self._pending:
+            self._pending = self._decode()
+        view = memoryview(buffer).cast("B")
+        n = min(len(view), len(self._pending))
+        view[:n] = self._pending[:n]
+        self._pending = self._pending[n:]
+        return n
+
+    def close(self) -> None:
+        self._f.close()
+        super().close()
+
+
+def open_decoded(path: Path) -> BinaryIO:
+    """Open `path` for reading its content, decompressing it if needed."""
+    f = path.open("rb")
+    try:
+        name = parse_header(f.read(HEADER_SIZE))
+    except BaseException:
+        f.close()
+        raise
+    if name is None:
+        f.seek(0)
+        return f
+    return io.BufferedReader(_DecodedReader(f, name), CHUNK_SIZE)
+
+
+def is_decoded(f: BinaryIO) -> bool:
+    """Whether `f`, opened by `open_decoded`, decompresses its file."""
+    return isinstance(getattr(f, "raw", None), _DecodedReader)
+
+
+class StreamEncoder:
+    """Writes content to a file, compressed with the codec `name` if given."""
+
+    def __init__(self, f: IO[bytes], name: str | None) -> None:
+        """Start writing to `f`, including the header if compressing."""
+        self._f = f
+        self._compressor = None if name is None else _compressor(name)
+        self.size = 0
+        if name is not None:
+            self._write(header(name))
+
+    def _write(self, data: bytes) -> None:
+        if data:
+            self._f.write(data)
+            self.size += len(data)
+
+    def write(self, data: bytes) -> None:
+        """Write `data`."""
+        if self._compressor is None:
+            self._write(data)
+        else:
+            self._write(self._compressor.compress(data))
+
+    def finish(self) -> None:
+        """Write what the compressor still buffers."""
+        if self._compressor is not None:
+            self._write(self._compressor.flush())
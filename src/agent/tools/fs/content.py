@@ -0,0 +1,227 @@
+"""Bounded LRU cache of file content shared by read, search and replace.
+
+Within one agent run the same workspace files are read and searched over and
+over. `ContentCache` keeps the raw bytes of recently used files together with
+what is derived from them on demand: the decoded text and the line index.
+Entries are validated against the file's inode, mtime and size on every
+lookup, so a changed file is always re-read.
+
+Memory is bounded by the total size of the cached bytes and decoded text.
+Files larger than the per-file limit are never cached, and binary and
+compressed files are remembered as such without keeping their content;
+compressed files are streamed by their readers instead.
+
+Configuration is read from the environment:
+
+- `FS_CONTENT_CACHE_BYTES`: total size of the cache (default 64 MiB, 0
+  disables it).
+- `FS_CONTENT_CACHE_MAX_FILE`: largest file that is cached (default 8 MiB).
+"""
+
+import os
+import sys
+import threading
+from array import array
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable
+
+from agent.tools.fs.compress import parse_header
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+DEFAULT_MAX_FILE_SIZE = 8 * 1024 * 1024
+SNIFF_SIZE = 8192
+
+
+def is_binary(block: bytes) -> bool:
+    """Sniff whether a leading block of a file looks binary."""
+    return b"\0" in block
+
+
+class FileContent:
+    """The content of one version of a file."""
+
+    def __init__(
+        self,
+        ino: int,
+        mtime_ns: int,
+        size: int,
+        data: bytes | None,
+        compressed: bool = False,
+    ) -> None:
+        """Initialize from the raw bytes, or None for a binary or compressed file."""
+        self.ino = ino
+        self.mtime_ns = mtime_ns
+        self.size = size
+        self.data = data
+        self.compressed = compressed
+        self._texts: dict[str, str] = {}
+        self._starts: array[int] | None = None
+        self._cache: ContentCache | None = None
+
+    @property
+    def binary(self) -> bool:
+        """Whether the file looked binary and its content was not kept."""
+        return self.data is None and not self.compressed
+
+    @property
+    def cost(self) -> int:
+        """Approximate memory held by this entry, in bytes."""
+        cost = len(self.data or b"")
+        cost += sum(sys.getsizeof(t) for t in self._texts.values())
+        if self._starts is not None:
+            cost += self._starts.itemsize * len(self._starts)
+        return cost
+
+    def matches(self, st: os.stat_result) -> bool:
+        """Whether the entry still describes a file with stat `st`."""
+        # 原子写入会换新 inode，可以识别同一时钟粒度内的改写
+        return (
+            st.st_ino == self.ino
+            and st.st_mtime_ns == self.mtime_ns
+            and st.st_size == self.size
+        )
+
+    def text(self, errors: str = "strict") -> str:
+        """Return the content decoded as UTF-8 with the given error handler."""
+        text = self._texts.get(errors)
+        if text is None:
+            text = (self.data or b"").decode("utf-8", errors)
+            self._remember(lambda: self._texts.setdefault(errors, text))
+        return text
+
+    @property
+    def line_starts(self) -> array[int]:
+        """Byte offsets of the line starts, as in `lines.LineIndex`."""
+        if self._starts is not None:
+            return self._starts
+        starts = array("Q")
+        data = self.data or b""
+        pos = 0
+        while pos < len(data):
+            starts.append(pos)
+            newline = data.find(b"\n", pos)
+            if newline == -1:
+                break
+            pos = newline + 1
+        self._remember(lambda: setattr(self, "_starts", starts))
+        return starts
+
+    def _remember(self, store: Callable[[], object]) -> None:
+        """Store derived data and charge its memory to the owning cache."""
+        cache = self._cache
+        if cache is None:
+            store()
+            return
+        with cache._lock:
+            before = self.cost
+            store()
+            if self._cache is cache:
+                cache._bytes += self.cost - before
+                cache._evict()
+
+
+class ContentCache:
+    """A byte-bounded LRU of file contents validated by stat signature."""
+
+    def __init__(
+        self,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        max_file_size: int = DEFAULT_MAX_FILE_SIZE,
+    ) -> None:
+        """Initialize an empty cache."""
+        self.max_bytes = max_bytes
+        self.max_file_size = max_file_size
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._bytes = 0
+        self._entries: OrderedDict[str, FileContent] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, path: Path) -> FileContent | None:
+        """Return the current content of `path`.
+
+        Returns None, without touching the cache, if the file is too large to
+        be cached or caching is disabled.
+        """
+        key = str(path)
+        st = path.stat()
+        if st.st_size > self.max_file_size or self.max_bytes <= 0:
+            return None
+        with self._lock:
+            content = self._entries.get(key)
+            if content is not None and content.matches(st):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return content
+            self.misses += 1
+        content = self._load(path)
+        if content.size > self.max_file_size:
+            return None
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                old._cache = None
+                self._bytes -= old.cost
+            self._entries[key] = content
+            content._cache = self
+            self._bytes += content.cost
+            self._evict()
+        return content
+
+    @staticmethod
+    def _load(path: Path) -> FileContent:
+        with path.open("rb") as f:
+            st = os.fstat(f.fileno())
+            head = f.read(SNIFF_SIZE)
+            if parse_header(head) is not None:
+                return FileContent(st.st_ino, st.st_mtime_ns, st.st_size, None, True)
+            if is_binary(head):
+                return FileContent(st.st_ino, st.st_mtime_ns, st.st_size, None)
+            data = head + f.read()
+        return FileContent(st.st_ino, st.st_mtime_ns, st.st_size, data)
+
+    def _evict(self) -> None:
+        # 最近使用的条目即使超过上限也保留，避免刚放入就被淘汰
+        while self._bytes > self.max_bytes and len(self._entries) > 1:
+            _, content = self._entries.popitem(last=False)
+            content._cache = None
+            self._bytes -= content.cost
+            self.evictions += 1
+
+    def invalidate(self, path: Path) -> None:
+        """Drop `path`, or every file below it if it is a directory."""
+        key = str(path)
+        prefix = key + os.sep
+        with self._lock:
+            for k in [k for k in self._entries if k == key or k.startswith(prefix)]:
+                content = self._entries.pop(k)
+                content._cache = None
+                self._bytes -= content.cost
+
+    def clear(self) -> None:
+        """Drop every entry and reset the counters."""
+        with self._lock:
+            for content in self._entries.values():
+                content._cache = None
+            self._entries.clear()
+            self._bytes = 0
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self) -> dict[str, int]:
+        """Return the hit, miss and eviction counters and the current size."""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+            }
+
+
+content_cache = ContentCache(
+    int(os.getenv("FS_CONTENT_CACHE_BYTES", str(DEFAULT_MAX_BYTES))),
+    int(os.getenv("FS_CONTENT_CACHE_MAX_FILE", str(DEFAULT_MAX_FILE_SIZE))),
+)
@@ -0,0 +1,220 @@
+"""Content-addressed, deduplicated storage of workspace files.
+
+When `FS_DEDUP` is enabled, every file the tool writes is hashed and stored
+once in a blob store shared by all workspaces, named by its SHA-256. The
+workspace file becomes a hard link to the blob, so each directory still maps
+paths to content, now by way of the blob's inode, and the blob's link count
+is its reference count: a blob with a single link is referenced by no
+workspace and is reclaimed by `gc`.
+
+This is transparent to the tool because it never modifies a file in place:
+writes, patches and replacements rename a new file over the path, which
+drops one reference, and appends copy a linked file first. Identical files
+also share one inode in the page cache, so reading content that another
+workspace has read recently is cheap.
+
+Appended files are not deduplicated again: hashing and relinking a log after
+every append would copy it on the next one, which is quadratic in its
+length. They stay private until they are next rewritten, or until `--scan`.
+
+Quotas and the usage ledger keep counting the logical size of each
+workspace. The blob store must be on the same filesystem as the workspaces;
+otherwise deduplication silently does nothing.
+
+Configuration is read from the environment:
+
+- `FS_DEDUP`: enables deduplication (`1`, `true` or `yes`).
+- `FS_DEDUP_MIN_SIZE`: smallest file that is deduplicated (default 1024).
+- `FS_BLOB_DIR`: the blob store (default `<workspace parent>/.fs_blobs`).
+
+Operators can deduplicate existing workspaces, reclaim unreferenced blobs
+and print the savings with::
+
+    python -m agent.tools.fs.dedup user_data [--scan] [--gc]
+"""
+
+import argparse
+import hashlib
+import os
+import sys
+from dataclasses import dataclass
+from pathlib import Path
+from typing import BinaryIO, Iterator
+
+from agent.tools.fs.atomic import path_lock, temp_path
+
+DEFAULT_MIN_SIZE = 1024
+HASH_BLOCK = 1024 * 1024
+
+
+def dedup_enabled() -> bool:
+    """Whether deduplication is enabled through `FS_DEDUP`."""
+    return os.getenv("FS_DEDUP", "").lower() in ("1", "true", "yes")
+
+
+def min_size() -> int:
+    """Return the size below which files are stored as they are."""
+    return int(os.getenv("FS_DEDUP_MIN_SIZE", str(DEFAULT_MIN_SIZE)))
+
+
+def blob_dir(root: Path) -> Path:
+    """Return the blob store shared by the workspace `root` and its siblings."""
+    base = os.getenv("FS_BLOB_DIR")
+    return Path(base).resolve() if base else root.parent / ".fs_blobs"
+
+
+def blob_path(blobs: Path, digest: str) -> Path:
+    """Return where the blob `digest` is stored."""
+    return blobs / digest[:2] / digest
+
+
+def _hash(f: BinaryIO) -> str:
+    digest = hashlib.sha256()
+    while block := f.read(HASH_BLOCK):
+        digest.update(block)
+    return digest.hexdigest()
+
+
+def _version(st: os.stat_result) -> tuple[int, int, int]:
+    return st.st_ino, st.st_mtime_ns, st.st_size
+
+
+def dedup_file(path: Path, blobs: Path) -> bool:
+    """Replace the regular file `path` by a link to the blob of its content.
+
+    Deduplication is best effort: a file that changes while it is hashed, or
+    that cannot be linked, is left as it is. The file is checked and replaced
+    under `path_lock`, so a concurrent write is never overwritten.
+
+    Returns:
+        Whether `path` now references a blob.
+    """
+    try:
+        with path.open("rb") as f:
+            st = os.fstat(f.fileno())
+            if st.st_size < min_size():
+                return False
+            digest = _hash(f)
+    except OSError:
+        return False
+    blob = blob_path(blobs, digest)
+    try:
+        try:
+            blob_st = blob.stat()
+        except FileNotFoundError:
+            blob_st = None
+        if blob_st is not None and blob_st.st_ino == st.st_ino:
+            return True
+        blob.parent.mkdir(parents=True, exist_ok=True)
+        with path_lock(path):
+            # 文件在计算哈希期间被改写时放弃，下次写入时会再处理
+            current = path.lstat()
+            if _version(current) != _version(st):
+                return False
+            if blob_st is None:
+                try:
+                    os.link(path, blob)
+                    return True
+                except FileExistsError:
+                    # 其他进程刚写入了同样的内容
+                    pass
+            tmp = temp_path(path)
+            tmp.unlink()
+            os.link(blob, tmp)
+            os.replace(tmp, path)
+        return True
+    except OSError:
+        return False
+
+
+def dedup_tree(root: Path, blobs: Path) -> int:
+    """Deduplicate every regular file below `root`.
+
+    Returns:
+        The number of files that reference a blob.
+    """
+    linked = 0
+    for directory, _, files in os.walk(root):
+        for name in files:
+            path = Path(directory) / name
+            if not path.is_symlink() and dedup_file(path, blobs):
+                linked += 1
+    return linked
+
+
+@dataclass
+class BlobStats:
+    """The size and savings of a blob store."""
+
+    blobs: int = 0
+    references: int = 0
+    stored_bytes: int = 0
+    logical_bytes: int = 0
+
+    @property
+    def saved_bytes(self) -> int:
+        """Bytes that would be stored again without deduplication."""
+        return self.logical_bytes - self.stored_bytes
+
+
+def _iter_blobs(blobs: Path) -> Iterator[Path]:
+    if not blobs.is_dir():
+        return
+    for shard in blobs.iterdir():
+        if shard.is_dir():
+            yield from shard.iterdir()
+
+
+def blob_stats(blobs: Path) -> BlobStats:
+    """Return the number, references and sizes of the blobs in `blobs`."""
+    stats = BlobStats()
+    for blob in _iter_blobs(blobs):
+        st = blob.stat()
+        stats.blobs += 1
+        stats.references += st.st_nlink - 1
+        stats.stored_bytes += st.st_size
+        stats.logical_bytes += st.st_size * (st.st_nlink - 1)
+    return stats
+
+
+def gc(blobs: Path) -> int:
+    """Delete the blobs that no workspace or snapshot references any more.
+
+    Returns:
+        The number of blobs deleted.
+    """
+    removed = 0
+    for blob in _iter_blobs(blobs):
+        if blob.stat().st_nlink == 1:
+            blob.unlink(missing_ok=True)
+            removed += 1
+    return removed
+
+
+def main() -> None:
+    """Deduplicate workspaces, collect garbage and print the blob store size."""
+    parser = argparse.ArgumentParser(description="Manage the workspace blob store.")
+    parser.add_argument("user_data", type=Path, nargs="?", default=Path("user_data"))
+    parser.add_argument("--scan", action="store_true", help="deduplicate all files")
+    parser.add_argument("--gc", action="store_true", help="delete unused blobs")
+    options = parser.parse_args()
+    user_data = options.user_data.resolve()
+    blobs = blob_dir(user_data / "_")
+    lines = []
+    if options.scan:
+        for workspace in sorted(user_data.iterdir()):
+            if workspace.is_dir() and not workspace.name.startswith("."):
+                linked = dedup_tree(workspace, blobs)
+                lines.append(f"{workspace.name}: {linked} files deduplicated")
+    if options.gc:
+        lines.append(f"{gc(blobs)} unused blobs deleted")
+    stats = blob_stats(blobs)
+    lines.append(
+        f"{stats.blobs:,} blobs, {stats.references:,} references, "
+        f"{stats.stored_bytes:,} bytes stored, {stats.saved_bytes:,} bytes saved"
+    )
+    sys.stdout.write("\n".join(lines) + "\n")
+
+
+if __name__ == "__main__":
+    main()
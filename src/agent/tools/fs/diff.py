@@ -0,0 +1,282 @@
+"""Pure-Python parser and applier for unified diffs.
+
+`parse_patch` turns the text of a unified diff into `FilePatch` objects and
+`apply_hunks` applies the hunks of one file to its lines the way GNU `patch`
+does: a hunk that does not match at its stated line is searched for at
+increasing offsets, and then with up to `MAX_FUZZ` lines of leading and
+trailing context ignored. Every hunk reports whether it was applied, and at
+which offset and fuzz, or rejected.
+"""
+
+import re
+from dataclasses import dataclass, field
+from typing import Literal
+
+MAX_FUZZ = 2
+DEV_NULL = "/dev/null"
+
+_HUNK_HEADER = re.compile(r"^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@")
+# diff 输出的文件名后可能跟着时间戳，用制表符或空格分隔
+_TIMESTAMP = re.compile(
+    r"\s+\d{4}-\d{2}-\d{2}[ T]\d{2}:\d{2}:\d{2}(?:\.\d+)?(?: ?[+-]\d{4})?$"
+)
+_NO_NEWLINE = "\\ No newline at end of file"
+
+
+class PatchError(ValueError):
+    """Raised when a patch cannot be parsed."""
+
+
+@dataclass
+class Hunk:
+    """One `@@` section of a file patch."""
+
+    old_start: int
+    old_len: int
+    new_start: int
+    new_len: int
+    header: str
+    # 每行保留 " "、"-"、"+" 前缀和行尾换行符
+    lines: list[str] = field(default_factory=list)
+
+    @property
+    def old_lines(self) -> list[str]:
+        """Lines the hunk expects to find."""
+        return [line[1:] for line in self.lines if line[0] in " -"]
+
+    @property
+    def new_lines(self) -> list[str]:
+        """Lines the hunk leaves in their place."""
+        return [line[1:] for line in self.lines if line[0] in " +"]
+
+    def trimmed(self, fuzz: int) -> tuple[list[str], list[str], int] | None:
+        """Drop up to `fuzz` context lines at both ends of the hunk.
+
+        Returns:
+            The trimmed old and new lines and the number of lines dropped at
+            the start, or None if the hunk has no context to drop.
+        """
+        lines = self.lines
+        head = 0
+        while head < fuzz and head < len(lines) and lines[head][0] == " ":
+            head += 1
+        tail = 0
+        while (
+            tail < fuzz
+            and tail < len(lines) - head
+            and lines[len(lines) - 1 - tail][0] == " "
+        ):
+            tail += 1
+        if fuzz and not (head or tail):
+            return None
+        kept = lines[head : len(lines) - tail]
+        return (
+            [line[1:] for line in kept if line[0] in " -"],
+            [line[1:] for line in kept if line[0] in " +"],
+            head,
+        )
+
+
+@dataclass
+class FilePatch:
+    """The hunks of one file."""
+
+    old_path: str
+    new_path: str
+    hunks: list[Hunk] = field(default_factory=list)
+
+    @property
+    def path(self) -> str:
+        """The file the patch applies to."""
+        return self.old_path if self.new_path == DEV_NULL else self.new_path
+
+    @property
+    def creates(self) -> bool:
+        """Whether the patch creates the file."""
+        return self.old_path == DEV_NULL
+
+    @property
+    def deletes(self) -> bool:
+        """Whether the patch deletes the file."""
+        return self.new_path == DEV_NULL
+
+
+@dataclass
+class HunkResult:
+    """The outcome of applying one hunk."""
+
+    hunk: Hunk
+    status: Literal["applied", "rejected"]
+    line: int = 0
+    offset: int = 0
+    fuzz: int = 0
+
+    def describe(self, number: int) -> str:
+        """Return a one-line, human readable description."""
+        if self.status == "rejected":
+            return f"Hunk #{number} {self.hunk.header}: rejected"
+        detail = []
+        if self.offset:
+            detail.append(f"offset {self.offset:+d}")
+        if self.fuzz:
+            detail.append(f"fuzz {self.fuzz}")
+        suffix = f" ({', '.join(detail)})" if detail else ""
+        return f"Hunk #{number} {self.hunk.header}: applied at line {self.line}{suffix}"
+
+
+def _file_name(line: str, strip_git: bool) -> str:
+    name = line[4:].rstrip("\r\n")
+    if "\t" in name:
+        name = name.split("\t", 1)[0]
+    else:
+        name = _TIMESTAMP.sub("", name)
+    name = name.strip()
+    if len(name) > 1 and name[0] == name[-1] == '"':
+        name = name[1:-1]
+    if strip_git and name != DEV_NULL and name[:2] in ("a/", "b/"):
+        name = name[2:]
+    return name
+
+
+def parse_patch(text: str) -> list[FilePatch]:
+    """Parse the unified diff `text`.
+
+    Git-style `a/` and `b/` prefixes are stripped when the patch contains
+    `diff --git` lines; other file names are used as they are (`-p0`).
+
+    Raises:
+        PatchError: If the text holds no hunk or a hunk is malformed.
+    """
+    lines = text.splitlines(keepends=True)
+    strip_git = any(line.startswith("diff --git ") for line in lines)
+    patches: list[FilePatch] = []
+    i = 0
+    while i < len(lines):
+        line = lines[i]
+        if not (line.startswith("--- ") and lines[i + 1 : i + 2]):
+            i += 1
+            continue
+        if not lines[i + 1].startswith("+++ "):
+            i += 1
+            continue
+        patch = FilePatch(
+            _file_name(line, strip_git), _file_name(lines[i + 1], strip_git)
+        )
+        patches.append(patch)
+        i += 2
+        while i < len(lines) and (match := _HUNK_HEADER.match(lines[i])):
+            old_start, old_len, new_start, new_len = match.groups()
+            hunk = Hunk(
+                int(old_start),
+                1 if old_len is None else int(old_len),
+                int(new_start),
+                1 if new_len is None else int(new_len),
+                match.group(0),
+            )
+            i = _parse_hunk_body(lines, i + 1, hunk)
+            patch.hunks.append(hunk)
+        if not patch.hunks:
+            raise PatchError(f"No hunks found for '{patch.path}'")
+    if not patches:
+        raise PatchError("No unified diff found in the patch content")
+    return patches
+
+
+def _parse_hunk_body(lines: list[str], i: int, hunk: Hunk) -> int:
+    old_left, new_left = hunk.old_len, hunk.new_len
+    while i < len(lines) and (old_left > 0 or new_left > 0):
+        line = lines[i]
+        if line.startswith("\\"):
+            i += 1
+            continue
+        # 一些编辑器会把空的上下文行的前导空格去掉
+        tag = line[0] if line not in ("\n", "\r\n") else " "
+        body = line[1:] if line not in ("\n", "\r\n") else line
+        if tag == " ":
+            old_left -= 1
+            new_left -= 1
+        elif tag == "-":
+            old_left -= 1
+        elif tag == "+":
+            new_left -= 1
+        else:
+            raise PatchError(f"Malformed line in hunk {hunk.header}: {line!r}")
+        if not body.endswith("\n"):
+            body += "\n"
+        hunk.lines.append(tag + body)
+        i += 1
+        if i < len(lines) and lines[i].startswith(_NO_NEWLINE):
+            hunk.lines[-1] = hunk.lines[-1].rstrip("\r\n")
+            i += 1
+    if old_left > 0 or new_left > 0:
+        raise PatchError(f"Truncated hunk {hunk.header}")
+    return i
+
+
+def _eol_insensitive(line: str) -> str:
+    return line.rstrip("\r\n")
+
+
+def _matches(lines: list[str], old: list[str], at: int) -> bool:
+    if at < 0 or at + len(old) > len(lines):
+        return False
+    return all(
+        _eol_insensitive(lines[at + k]) == _eol_insensitive(old[k])
+        for k in range(len(old))
+    )
+
+
+def _locate(lines: list[str], old: list[str], expected: int, lower: int) -> int | None:
+    """Find `old` in `lines` at or nearest to `expected`, not before `lower`."""
+    expected = max(expected, lower)
+    limit = max(expected - lower, len(lines) - expected) + 1
+    for distance in range(limit):
+        for at in (expected - distance, expected + distance):
+            if at >= lower and _matches(lines, old, at):
+                return at
+            if distance == 0:
+                break
+    return None
+
+
+def apply_hunks(
+    lines: list[str], hunks: list[Hunk]
+) -> tuple[list[str], list[HunkResult]]:
+    """Apply `hunks` in order to `lines`, skipping the ones that do not match.
+
+    Returns:
+        The patched lines and the result of every hunk.
+    """
+    crlf = bool(lines) and lines[0].endswith("\r\n")
+    out = list(lines)
+    results = []
+    # 已应用的 hunk 造成的行数偏移，以及下一个 hunk 最早可以开始的位置
+    delta = 0
+    lower = 0
+    for hunk in hunks:
+        start = hunk.old_start if hunk.old_len == 0 else hunk.old_start - 1
+        result = HunkResult(hunk, "rejected")
+        for fuzz in range(MAX_FUZZ + 1):
+            trimmed = hunk.trimmed(fuzz)
+            if trimmed is None:
+                break
+            old, new, head = trimmed
+            at = _locate(out, old, start + delta + head, lower)
+            if at is None:
+                continue
+            if crlf:
+                new = [
+                    n[:-1] + "\r\n"
+                    if n.endswith("\n") and not n.endswith("\r\n")
+                    else n
+                    for n in new
+                ]
+            out[at : at + len(old)] = new
+            result = HunkResult(
+                hunk, "applied", at - head + 1, at - head - start - delta, fuzz
+            )
+            delta += len(new) - len(old)
+            lower = at + len(new)
+            break
+        results.append(result)
+    return out, results
@@ -0,0 +1,60 @@
+"""Lazy, sorted glob matching inside a workspace.
+
+`glob.glob` materialises and then sorts every match. `iter_glob` walks the
+workspace's cached tree snapshot in sorted order instead and yields matches
+as it finds them. The walk starts at the pattern's literal leading
+directories, stops descending below the pattern's depth unless it contains
+`**`, and skips paths excluded by the workspace ignore rules.
+"""
+
+import glob as glob_module
+import re
+from pathlib import Path
+from typing import Iterator
+
+from agent.tools.fs.paths import is_inside
+from agent.tools.fs.tree import TreeSnapshot
+from agent.tools.fs.walk import IgnoreRules, load_rules, walk
+
+_MAGIC = re.compile(r"[*?\[]")
+
+
+def compile_glob(pattern: str) -> re.Pattern[str]:
+    """Compile a glob pattern with the semantics of `glob.glob(recursive=True)`."""
+    return re.compile(glob_module.translate(pattern, recursive=True))
+
+
+def _split(pattern: str) -> tuple[list[str], int | None]:
+    """Return the literal leading directories and the depth limit below them."""
+    parts = [p for p in pattern.split("/") if p not in ("", ".")]
+    base: list[str] = []
+    while len(parts) > 1 and not _MAGIC.search(parts[0]):
+        base.append(parts.pop(0))
+    if "**" in parts:
+        return base, None
+    return base, len(parts)
+
+
+def iter_glob(
+    root: Path,
+    pattern: str,
+    snapshot: TreeSnapshot | None = None,
+    rules: IgnoreRules | None = None,
+) -> Iterator[str]:
+    """Yield workspace-relative paths matching `pattern` in sorted order."""
+    rules = load_rules(root) if rules is None else rules
+    regex = compile_glob(pattern)
+    base, max_depth = _split(pattern)
+    prefix = "/".join(base)
+    start = root.joinpath(*base)
+    if not start.is_dir() or not is_inside(root, start):
+        return
+    if prefix and regex.fullmatch(prefix + "/"):
+        yield prefix + "/"
+    nodes = walk(root, prefix, max_depth=max_depth, rules=rules, snapshot=snapshot)
+    for node in nodes:
+        if regex.fullmatch(node.rel):
+            yield node.rel
+        # 目录同时尝试带 / 的形式，以兼容 "dir/" 这类模式
+        elif node.entry.is_dir and regex.fullmatch(node.rel + "/"):
+            yield node.rel + "/"
@@ -0,0 +1,184 @@
+"""Line-offset index and memory-mapped ranged reads.
+
+Reading lines `[offset, offset + length)` used to skip `offset` lines with
+`readline()`, so paging through a large file cost O(offset) per page. A
+`LineIndex` records the byte offset of every line start once, is cached per
+path and rebuilt only when the file's mtime or size changes. Pages are then
+sliced straight out of a memory map in O(page). Files small enough for the
+shared content cache are sliced from their cached bytes instead.
+
+Compressed files have no byte offsets to index; they are decoded as a
+stream and only the requested lines are kept.
+"""
+
+import mmap
+import os
+import threading
+from array import array
+from collections import OrderedDict, deque
+from itertools import islice
+from pathlib import Path
+
+from agent.tools.fs.compress import file_codec, open_decoded
+from agent.tools.fs.content import content_cache
+
+DEFAULT_CACHE_SIZE = 128
+
+
+class LineIndex:
+    """Byte offsets of the line starts of one file version."""
+
+    def __init__(self, mtime_ns: int, size: int, starts: array[int]) -> None:
+        """Initialize the index from precomputed line starts."""
+        self.mtime_ns = mtime_ns
+        self.size = size
+        self.starts = starts
+
+    @classmethod
+    def build(cls, path: Path) -> "LineIndex":
+        """Scan `path` once and record where each line starts."""
+        starts = array("Q")
+        with path.open("rb") as f:
+            st = os.fstat(f.fileno())
+            if st.st_size > 0:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    pos = 0
+                    find = mm.find
+                    while pos < st.st_size:
+                        starts.append(pos)
+                        newline = find(b"\n", pos)
+                        if newline == -1:
+                            break
+                        pos = newline + 1
+        return cls(st.st_mtime_ns, st.st_size, starts)
+
+    @property
+    def line_count(self) -> int:
+        """Number of lines, counting a trailing line without newline."""
+        return len(self.starts)
+
+    def matches(self, st: os.stat_result) -> bool:
+        """Whether the index still describes a file with stat `st`."""
+        return st.st_mtime_ns == self.mtime_ns and st.st_size == self.size
+
+    def span(self, start: int, stop: int) -> tuple[int, int]:
+        """Return the byte range covering lines `[start, stop)`."""
+        start = max(0, min(start, self.line_count))
+        stop = max(start, min(stop, self.line_count))
+        if start == stop:
+            return 0, 0
+        end = self.starts[stop] if stop < self.line_count else self.size
+        return self.starts[start], end
+
+
+class LineIndexCache:
+    """A bounded LRU of line indexes, validated against the file's stat."""
+
+    def __init__(self, max_entries: int = DEFAULT_CACHE_SIZE) -> None:
+        """Initialize an empty cache."""
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, LineIndex] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, path: Path) -> LineIndex:
+        """Return an up-to-date index for `path`, building it if needed."""
+        key = str(path)
+        st = path.stat()
+        with self._lock:
+            index = self._entries.get(key)
+            if index is not None and index.matches(st):
+                self._entries.move_to_end(key)
+                return index
+        index = LineIndex.build(path)
+        with self._lock:
+            self._entries[key] = index
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return index
+
+    def clear(self) -> None:
+        """Drop every cached index."""
+        with self._lock:
+            self._entries.clear()
+
+
+line_index_cache = LineIndexCache(
+    int(os.getenv("FS_LINE_INDEX_CACHE", str(DEFAULT_CACHE_SIZE)))
+)
+
+
+def _read_range(path: Path, start: int, end: int) -> bytes:
+    if end <= start:
+        return b""
+    with path.open("rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return mm[start:end]
+
+
+def _line_index(path: Path) -> tuple[LineIndex, bytes | None] | None:
+    """Return the line index of `path` and its content, if that is cached.
+
+    Returns None if `path` is compressed.
+    """
+    content = content_cache.get(path)
+    if content is not None and content.data is not None:
+        index = LineIndex(content.mtime_ns, content.size, content.line_starts)
+        return index, content.data
+    if content is not None and content.compressed:
+        return None
+    if content is None and file_codec(path) is not None:
+        return None
+    return line_index_cache.get(path), None
+
+
+def _decoded_lines(path: Path, offset: int, length: int, tail: bool) -> str:
+    """Read lines of a compressed file by decoding it as a stream."""
+    with open_decoded(path) as f:
+        if not tail:
+            lines = list(islice(f, offset, offset + length))
+        else:
+            # 只保留末尾 offset + length 行
+            lines = list(deque(f, maxlen=offset + length))
+            lines = lines[: max(0, len(lines) - offset)]
+    return b"".join(lines).decode("utf-8")
+
+
+def read_lines(path: Path, offset: int, length: int) -> str:
+    """Return exactly `length` lines of `path` starting at line `offset`."""
+    indexed = _line_index(path)
+    if indexed is None:
+        return _decoded_lines(path, offset, length, tail=False)
+    index, data = indexed
+    start, end = index.span(offset, offset + length)
+    if data is not None:
+        return data[start:end].decode("utf-8")
+    return _read_range(path, start, end).decode("utf-8")
+
+
+def read_tail(path: Path, offset: int, length: int) -> str:
+    """Return `length` lines ending `offset` lines before the end of `path`."""
+    indexed = _line_index(path)
+    if indexed is None:
+        return _decoded_lines(path, offset, length, tail=True)
+    index, data = indexed
+    stop = index.line_count - offset
+    start, end = index.span(stop - length, stop)
+    if data is not None:
+        return data[start:end].decode("utf-8")
+    return _read_range(path, start, end).decode("utf-8")
+
+
+def read_bytes(path: Path, offset: int, length: int) -> str:
+    """Return `length` bytes of `path` from byte `offset`, decoded leniently."""
+    if file_codec(path) is not None:
+        with open_decoded(path) as f:
+            while offset > 0 and (skipped := len(f.read(min(offset, 1 << 20)))):
+                offset -= skipped
+            data = f.read(length) if offset <= 0 else b""
+        return data.decode("utf-8", errors="replace")
+    size = path.stat().st_size
+    start = max(0, min(offset, size))
+    end = max(start, min(offset + length, size))
+    # 字节区间可能切断多字节字符，用 replace 兜底
+    return _read_range(path, start, end).decode("utf-8", errors="replace")
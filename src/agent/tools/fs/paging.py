@@ -0,0 +1,75 @@
+"""Opaque continuation cursors for paginated tool output.
+
+Search, glob and list produce their results from generators. A call returns
+one bounded page and, if more results exist, a cursor the agent passes back
+to fetch the next page. The cursor records the position in the result stream
+and a fingerprint of the request, so it cannot be replayed against a
+different query.
+"""
+
+import base64
+import hashlib
+import json
+import os
+from itertools import islice
+from typing import Any, Iterator
+
+DEFAULT_PAGE_SIZE = 200
+
+
+class InvalidCursorError(ValueError):
+    """Raised when a cursor is malformed or belongs to another request."""
+
+
+def default_page_size() -> int:
+    """Return the page size configured through `FS_PAGE_SIZE`."""
+    return int(os.getenv("FS_PAGE_SIZE", str(DEFAULT_PAGE_SIZE)))
+
+
+def fingerprint(*parts: Any) -> str:
+    """Return a short, stable digest of the request parameters."""
+    raw = json.dumps(parts, sort_keys=True, default=str).encode("utf-8")
+    return hashlib.sha256(raw).hexdigest()[:16]
+
+
+def encode_cursor(key: str, offset: int) -> str:
+    """Encode the position `offset` of the request `key` as a cursor."""
+    raw = json.dumps({"k": key, "o": offset}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str | None, key: str) -> int:
+    """Return the offset stored in `cursor`, or 0 if there is none.
+
+    Raises:
+        InvalidCursorError: If the cursor is malformed or was issued for a
+            different request.
+    """
+    if not cursor:
+        return 0
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        offset = int(data["o"])
+        cursor_key = data["k"]
+    except (ValueError, KeyError, TypeError) as e:
+        raise InvalidCursorError(f"Invalid cursor '{cursor}'") from e
+    if cursor_key != key or offset < 0:
+        raise InvalidCursorError(f"Cursor '{cursor}' does not match this request")
+    return offset
+
+
+def paginate(
+    items: Iterator[str], offset: int, page_size: int
+) -> tuple[list[str], bool]:
+    """Return the page of `items` starting at `offset` and whether more follow."""
+    page = list(islice(items, offset, offset + page_size + 1))
+    return page[:page_size], len(page) > page_size
+
+
+def more_results_line(key: str, offset: int) -> str:
+    """Return the footer telling the agent how to fetch the next page."""
+    return (
+        f"... more results available, repeat the call with "
+        f"cursor='{encode_cursor(key, offset)}'"
+    )
@@ -0,0 +1,67 @@
+"""Confine filesystem paths to a user workspace.
+
+Operations used to `os.chdir` into the workspace, which is process-global and
+ruled out running them on threads. Every path is instead resolved against an
+explicit workspace root, with symlinks followed, and rejected if it ends up
+outside of that root.
+"""
+
+import os
+from pathlib import Path, PurePosixPath
+
+
+class PathEscapeError(ValueError):
+    """Raised when a path resolves outside of the workspace root."""
+
+
+def resolve_root(root: str | os.PathLike[str]) -> Path:
+    """Return the absolute, symlink-free form of a workspace root."""
+    return Path(root).resolve()
+
+
+def resolve_path(root: Path, path: str | os.PathLike[str]) -> Path:
+    """Resolve `path` relative to `root`, refusing anything outside of it.
+
+    Args:
+        root: Workspace root, as returned by `resolve_root`.
+        path: User supplied path, relative to the root.
+
+    Raises:
+        PathEscapeError: If the resolved path is not inside `root`.
+    """
+    resolved = (root / path).resolve()
+    if resolved != root and not resolved.is_relative_to(root):
+        raise PathEscapeError(f"Path '{path}' is outside of the workspace")
+    return resolved
+
+
+def is_inside(root: Path, path: Path) -> bool:
+    """Return whether `path`, with symlinks followed, stays inside `root`."""
+    resolved = path.resolve()
+    return resolved == root or resolved.is_relative_to(root)
+
+
+def check_pattern(pattern: str) -> None:
+    """Reject glob patterns that could match outside of the workspace."""
+    pure = PurePosixPath(pattern)
+    if pure.is_absolute() or os.path.isabs(pattern) or ".." in pure.parts:
+        raise PathEscapeError(f"Pattern '{pattern}' is outside of the workspace")
+
+
+def state_dir(root: Path) -> Path:
+    """Return the directory holding the tool's private state for a workspace.
+
+    It lives outside of the workspace so that it never shows up in listings
+    or search results: `$FS_STATE_DIR/<user>` if set, otherwise
+    `<workspace parent>/.fs_state/<user>`.
+    """
+    base = os.getenv("FS_STATE_DIR")
+    state_root = Path(base).resolve() if base else root.parent / ".fs_state"
+    return state_root / root.name
+
+
+def display_path(root: Path, path: Path) -> str:
+    """Return `path` as a POSIX path relative to `root` for tool output."""
+    if path == root:
+        return "."
+    return path.relative_to(root).as_posix()
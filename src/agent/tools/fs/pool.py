@@ -0,0 +1,293 @@
+"""Long-lived worker pools for filesystem operations.
+
+`fs_opt` used to create a fresh `mp.Pool` for every call. Calls now go to a
+pool created once per process. Since the operations no longer change the
+working directory, they run on an in-process thread pool by default. The
+process backend is kept for isolation: it is pre-warmed through a forkserver
+that has `agent.tools.filesystem` already imported, and recycles its workers
+after a bounded number of tasks.
+
+Both pools offer a blocking `apply` and an awaitable `run`, which lets the
+async tool implementations wait for a worker without tying up the event loop
+or one of its executor threads.
+
+Configuration is read from the environment:
+
+- `FS_BACKEND`: `thread` (default) or `process`.
+- `FS_POOL_SIZE`: number of workers (default 8 threads or 2 processes).
+- `FS_POOL_MAX_TASKS`: tasks a worker process runs before it is replaced
+  (default 200).
+- `FS_POOL_START_METHOD`: multiprocessing start method (default forkserver
+  where available, otherwise spawn).
+- `FS_OP_TIMEOUT`: seconds the tool wrappers wait for an operation other than
+  search and replace (default 300, 0 disables it).
+"""
+
+import asyncio
+import atexit
+import multiprocessing as mp
+import os
+import threading
+from concurrent.futures import BrokenExecutor, Future, ThreadPoolExecutor
+from multiprocessing.pool import Pool
+from typing import Any, Callable, Sequence
+
+DEFAULT_POOL_SIZE = 2
+DEFAULT_THREAD_POOL_SIZE = 8
+DEFAULT_MAX_TASKS_PER_CHILD = 200
+DEFAULT_OPERATION_TIMEOUT = 300.0
+PRELOAD_MODULES = ["agent.tools.filesystem"]
+
+
+def _noop(_: object) -> None:
+    return None
+
+
+def operation_timeout() -> float:
+    """Return how long the tools wait for an operation, 0 meaning no limit."""
+    return float(os.getenv("FS_OP_TIMEOUT", str(DEFAULT_OPERATION_TIMEOUT)))
+
+
+def _settle(
+    future: "Future[Any]", result: Any = None, error: BaseException | None = None
+) -> None:
+    """Resolve `future` unless it was already failed by `terminate`."""
+    if future.done():
+        return
+    if error is None:
+        future.set_result(result)
+    else:
+        future.set_exception(error)
+
+
+def _default_start_method() -> str:
+    methods = mp.get_all_start_methods()
+    return "forkserver" if "forkserver" in methods else "spawn"
+
+
+class FSWorkerPool:
+    """A bounded, lazily started pool of filesystem worker processes."""
+
+    def __init__(
+        self,
+        processes: int = DEFAULT_POOL_SIZE,
+        max_tasks_per_child: int | None = DEFAULT_MAX_TASKS_PER_CHILD,
+        start_method: str | None = None,
+        preload: Sequence[str] = PRELOAD_MODULES,
+    ) -> None:
+        """Initialize the pool without starting any process."""
+        if processes < 1:
+            raise ValueError("processes must be at least 1")
+        self.processes = processes
+        self.max_tasks_per_child = max_tasks_per_child
+        self.start_method = start_method or _default_start_method()
+        self.preload = list(preload)
+        self._pool: Pool | None = None
+        self._pid: int | None = None
+        self._lock = threading.Lock()
+        self._pending: set[Future[Any]] = set()
+
+    def _ensure_started(self) -> Pool:
+        with self._lock:
+            # 进程 fork 之后继承来的 pool 不可用，需要重新创建
+            if self._pool is None or self._pid != os.getpid():
+                ctx = mp.get_context(self.start_method)
+                if self.start_method == "forkserver":
+                    ctx.set_forkserver_preload(self.preload)
+                self._pool = ctx.Pool(
+                    processes=self.processes,
+                    maxtasksperchild=self.max_tasks_per_child,
+                )
+                self._pid = os.getpid()
+            return self._pool
+
+    @property
+    def started(self) -> bool:
+        """Whether the worker processes have been started."""
+        return self._pool is not None and self._pid == os.getpid()
+
+    def warmup(self) -> None:
+        """Start the worker processes ahead of the first call."""
+        pool = self._ensure_started()
+        pool.map(_noop, range(self.processes), chunksize=1)
+
+    def apply(self, func: Callable[..., Any], args: tuple[Any, ...] = ()) -> Any:
+        """Run `func(*args)` on a worker and return its result."""
+        return self._ensure_started().apply(func, args)
+
+    def submit(
+        self, func: Callable[..., Any], args: tuple[Any, ...] = ()
+    ) -> Future[Any]:
+        """Schedule `func(*args)` on a worker and return a future of its result.
+
+        A task handed to a worker process cannot be withdrawn, so the future
+        is already running and cannot be cancelled. If the pool is terminated
+        first, the future fails with `BrokenExecutor`.
+        """
+        future: Future[Any] = Future()
+        future.set_running_or_notify_cancel()
+        pool = self._ensure_started()
+        with self._lock:
+            self._pending.add(future)
+        future.add_done_callback(self._discard)
+        pool.apply_async(
+            func,
+            args,
+            callback=lambda result: _settle(future, result),
+            error_callback=lambda error: _settle(future, error=error),
+        )
+        return future
+
+    def _discard(self, future: "Future[Any]") -> None:
+        with self._lock:
+            self._pending.discard(future)
+
+    async def run(self, func: Callable[..., Any], args: tuple[Any, ...] = ()) -> Any:
+        """Await `func(*args)` on a worker without blocking the event loop."""
+        return await asyncio.wrap_future(self.submit(func, args))
+
+    def close(self) -> None:
+        """Stop accepting work and wait for the workers to exit."""
+        with self._lock:
+            pool, self._pool = self._pool, None
+            owned = self._pid == os.getpid()
+            self._pid = None
+        if pool is not None and owned:
+            pool.close()
+            pool.join()
+
+    def terminate(self) -> None:
+        """Stop the workers immediately, failing in-flight work."""
+        with self._lock:
+            pool, self._pool = self._pool, None
+            owned = self._pid == os.getpid()
+            self._pid = None
+            pending, self._pending = self._pending, set()
+        if pool is not None and owned:
+            pool.terminate()
+            pool.join()
+        # 被终止的任务不会再回调，否则等待它们的调用会一直挂起
+        for future in pending:
+            _settle(future, error=BrokenExecutor("the worker pool was terminated"))
+
+    def __enter__(self) -> "FSWorkerPool":
+        """Start the pool when entering a context."""
+        self._ensure_started()
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        """Close the pool when leaving a context."""
+        self.close()
+
+
+class FSThreadPool:
+    """A bounded pool of in-process filesystem worker threads."""
+
+    def __init__(self, threads: int = DEFAULT_THREAD_POOL_SIZE) -> None:
+        """Initialize the pool without starting any thread."""
+        if threads < 1:
+            raise ValueError("threads must be at least 1")
+        self.threads = threads
+        self._executor: ThreadPoolExecutor | None = None
+        self._lock = threading.Lock()
+
+    def _ensure_started(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.threads, thread_name_prefix="fs-worker"
+                )
+            return self._executor
+
+    @property
+    def started(self) -> bool:
+        """Whether the executor has been created."""
+        return self._executor is not None
+
+    def warmup(self) -> None:
+        """Create the executor ahead of the first call."""
+        self._ensure_started()
+
+    def apply(self, func: Callable[..., Any], args: tuple[Any, ...] = ()) -> Any:
+        """Run `func(*args)` on a worker thread and return its result."""
+        return self.submit(func, args).result()
+
+    def submit(
+        self, func: Callable[..., Any], args: tuple[Any, ...] = ()
+    ) -> Future[Any]:
+        """Schedule `func(*args)` on a worker thread and return a future."""
+        return self._ensure_started().submit(func, *args)
+
+    async def run(self, func: Callable[..., Any], args: tuple[Any, ...] = ()) -> Any:
+        """Await `func(*args)` on a worker thread without blocking the event loop.
+
+        Cancelling the awaiting task cancels the operation if it has not
+        started yet; a running operation completes and its result is dropped.
+        """
+        return await asyncio.wrap_future(self.submit(func, args))
+
+    def close(self) -> None:
+        """Stop accepting work and wait for running operations."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+    def terminate(self) -> None:
+        """Stop accepting work and drop queued operations."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def __enter__(self) -> "FSThreadPool":
+        """Start the pool when entering a context."""
+        self._ensure_started()
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        """Close the pool when leaving a context."""
+        self.close()
+
+
+_pool: FSWorkerPool | FSThreadPool | None = None
+_pool_lock = threading.Lock()
+
+
+def create_pool() -> FSWorkerPool | FSThreadPool:
+    """Create a pool configured from the environment."""
+    backend = os.getenv("FS_BACKEND", "thread")
+    size = os.getenv("FS_POOL_SIZE")
+    if backend == "thread":
+        return FSThreadPool(threads=int(size or DEFAULT_THREAD_POOL_SIZE))
+    if backend == "process":
+        max_tasks = int(
+            os.getenv("FS_POOL_MAX_TASKS", str(DEFAULT_MAX_TASKS_PER_CHILD))
+        )
+        return FSWorkerPool(
+            processes=int(size or DEFAULT_POOL_SIZE),
+            max_tasks_per_child=max_tasks if max_tasks > 0 else None,
+            start_method=os.getenv("FS_POOL_START_METHOD") or None,
+        )
+    raise ValueError(f"Unknown FS_BACKEND '{backend}'")
+
+
+def get_pool() -> FSWorkerPool | FSThreadPool:
+    """Return the process-wide filesystem worker pool."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = create_pool()
+        return _pool
+
+
+def shutdown_pool() -> None:
+    """Close the process-wide pool, if it was created."""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.close()
+
+
+atexit.register(shutdown_pool)
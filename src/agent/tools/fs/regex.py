@@ -0,0 +1,308 @@
+r"""Safe handling of the regexes passed to search and replace.
+
+Patterns come from the model and run over whole workspaces, so a single
+catastrophically backtracking pattern could pin a worker. Three measures
+bound that risk:
+
+- `compile_pattern` rejects the constructs that cause exponential
+  backtracking before compiling. Inside a group repeated more than once,
+  boundedly or not, it rejects a quantifier that can repeat a variable
+  number of times, such as `(a+)+`, `(a+){2,60}` or `(\w+\s?)*`, a body
+  that can match the empty string, such as `(a?)*`, and an alternation
+  that is ambiguous: one whose branches can start with the same character
+  (ignoring case), such as `(a|b|ab)*`, whose first characters cannot be
+  determined, or that has a branch which can be empty. The parser factors
+  common prefixes out of alternations, so `(a|aa)+` becomes `(a(|a))+` and is
+  caught by the last rule. The check is conservative: it may reject some
+  safe patterns, which can be rewritten with an atomic group `(?>...)`.
+  Compiled patterns are kept in an LRU cache.
+- Scans and rewrites check a `Deadline` between files and every
+  `CHECK_INTERVAL` lines, stop when it has passed and report what they found
+  until then. A single `re.search` holds the GIL and cannot be interrupted,
+  so the deadline only helps between lines.
+- The tool wrappers stop waiting for a search or replace after a hard
+  timeout; with the process backend the worker is killed.
+
+Configuration is read from the environment:
+
+- `FS_REGEX_TIMEOUT`: seconds a search or replace may scan (default 10,
+  0 disables the deadline).
+- `FS_REGEX_HARD_TIMEOUT`: seconds after which the tool stops waiting for
+  the worker (default 30, 0 disables it).
+- `FS_REGEX_CACHE_SIZE`: compiled patterns kept (default 256).
+"""
+
+import os
+import re
+import time
+from functools import lru_cache
+from re import _constants as sre_constants  # type: ignore[attr-defined]
+from re import _parser as sre_parse  # type: ignore[attr-defined]
+from typing import Any, Iterable, Iterator
+
+DEFAULT_TIMEOUT = 10.0
+DEFAULT_HARD_TIMEOUT = 30.0
+DEFAULT_CACHE_SIZE = 256
+CHECK_INTERVAL = 256
+
+_REPEATS = (sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT)
+# 原子组与占有量词不会回溯
+_ATOMIC_GROUP = sre_constants.ATOMIC_GROUP
+# 字符集中展开的最大范围，更大的范围按未知处理
+_MAX_RANGE = 1024
+
+# 解析树的节点是 (opcode, argument)，argument 的类型随 opcode 而变
+_Item = tuple[Any, Any]
+
+# 不会匹配换行符的字符类别，其余类别按可能匹配处理
+_NO_NEWLINE_CATEGORIES = {
+    sre_constants.CATEGORY_DIGIT,
+    sre_constants.CATEGORY_NOT_SPACE,
+    sre_constants.CATEGORY_WORD,
+    sre_constants.CATEGORY_NOT_LINEBREAK,
+    sre_constants.CATEGORY_LOC_WORD,
+    sre_constants.CATEGORY_UNI_DIGIT,
+    sre_constants.CATEGORY_UNI_NOT_SPACE,
+    sre_constants.CATEGORY_UNI_WORD,
+    sre_constants.CATEGORY_UNI_NOT_LINEBREAK,
+}
+
+
+class UnsafePatternError(ValueError):
+    """Raised for a regex that can backtrack catastrophically."""
+
+
+class Deadline:
+    """A point in time after which long scans should stop."""
+
+    def __init__(self, seconds: float | None) -> None:
+        """Start a deadline `seconds` from now; None or 0 never expires."""
+        self.seconds = seconds or None
+        self._end = None if self.seconds is None else time.monotonic() + self.seconds
+
+    def expired(self) -> bool:
+        """Whether the deadline has passed."""
+        return self._end is not None and time.monotonic() >= self._end
+
+    def describe(self) -> str:
+        """Return a short description for messages."""
+        return f"deadline of {self.seconds:g}s exceeded"
+
+
+def regex_timeout() -> float:
+    """Return the scan deadline of search and replace, 0 meaning none."""
+    return float(os.getenv("FS_REGEX_TIMEOUT", str(DEFAULT_TIMEOUT)))
+
+
+def hard_timeout() -> float:
+    """Return the hard timeout of search and replace, 0 meaning none."""
+    return float(os.getenv("FS_REGEX_HARD_TIMEOUT", str(DEFAULT_HARD_TIMEOUT)))
+
+
+def _fold(code: int) -> str:
+    """Return the case-folded first character of `code`, so `ſ` meets `s`."""
+    return chr(code).casefold()[0]
+
+
+def _first_chars(items: Iterable[_Item]) -> set[str] | None:
+    """Return the characters a subpattern can start with, None if unknown.
+
+    Characters are case-folded, so overlaps are found under IGNORECASE too.
+    """
+    for op, av in items:
+        if op == sre_constants.LITERAL:
+            return {_fold(av)}
+        if op == sre_constants.IN:
+            return _charset(av)
+        if op == sre_constants.SUBPATTERN:
+            return _first_chars(av[-1])
+        if op == sre_constants.BRANCH:
+            chars: set[str] = set()
+            for branch in av[1]:
+                first = _first_chars(branch)
+                if first is None:
+                    return None
+                chars |= first
+            return chars
+        if op in _REPEATS and av[0] > 0:
+            return _first_chars(av[2])
+        if op in (sre_constants.AT, sre_constants.ASSERT, sre_constants.ASSERT_NOT):
+            continue
+        return None
+    return None
+
+
+def _charset(items: Iterable[_Item]) -> set[str] | None:
+    chars: set[str] = set()
+    for op, av in items:
+        if op == sre_constants.LITERAL:
+            chars.add(_fold(av))
+        elif op == sre_constants.RANGE and av[1] - av[0] < _MAX_RANGE:
+            chars.update(_fold(c) for c in range(av[0], av[1] + 1))
+        else:
+            return None
+    return chars
+
+
+def _is_repeated(op: Any, av: Any) -> bool:
+    """Whether `op` repeats its body more than once, a bounded number or not."""
+    return op in _REPEATS and av[1] > 1
+
+
+def _contains_variable(items: Iterable[_Item]) -> bool:
+    return any(
+        _is_repeated(op, av) and av[0] != av[1] for op, av in _descendants(items)
+    )
+
+
+def _children(op: Any, av: Any) -> list[Any]:
+    if op in _REPEATS:
+        return [av[2]]
+    if op == sre_constants.SUBPATTERN:
+        return [av[-1]]
+    if op == sre_constants.BRANCH:
+        return list(av[1])
+    if op in (sre_constants.ASSERT, sre_constants.ASSERT_NOT):
+        return [av[1]]
+    if op == _ATOMIC_GROUP:
+        return [av]
+    return []
+
+
+def _descendants(items: Iterable[_Item]) -> Iterator[_Item]:
+    """Yield every node below `items`, except the inside of atomic groups."""
+    for op, av in items:
+        yield op, av
+        if op == _ATOMIC_GROUP:
+            continue
+        for sub in _children(op, av):
+            yield from _descendants(sub)
+
+
+def _check(items: Iterable[_Item], pattern: str) -> None:
+    for op, av in items:
+        if _is_repeated(op, av):
+            _check_repeated(av[2], pattern)
+        if op == _ATOMIC_GROUP:
+            continue
+        for sub in _children(op, av):
+            _check(sub, pattern)
+
+
+def _check_repeated(body: sre_parse.SubPattern, pattern: str) -> None:
+    """Reject the body of a repeat if it can match ambiguously.
+
+    Bounded repeats such as `{2,60}` count too: their backtracking is
+    exponential in the bound.
+    """
+    if _contains_variable(body):
+        raise UnsafePatternError(
+            f"Pattern '{pattern}' nests a variable quantifier inside "
+            "a repeated group, which can backtrack catastrophically; "
+            "use an atomic group (?>...) or a possessive quantifier "
+            "such as ++ for the inner repetition"
+        )
+    if body.getwidth()[0] == 0:
+        raise UnsafePatternError(
+            f"Pattern '{pattern}' repeats a group that can match the empty "
+            "string, which can backtrack catastrophically"
+        )
+    for op, av in _descendants(body):
+        if op == sre_constants.BRANCH:
+            _check_branches(av[1], pattern)
+
+
+def _check_branches(branches: list[sre_parse.SubPattern], pattern: str) -> None:
+    seen: set[str] = set()
+    for branch in branches:
+        first = _first_chars(branch) if branch.getwidth()[0] > 0 else None
+        if first is None or first & seen:
+            raise UnsafePatternError(
+                f"Pattern '{pattern}' repeats an alternation whose branches "
+                "can match the same text, which can backtrack catastrophically; "
+                "make the branches start with different characters or wrap "
+                "the alternation in an atomic group (?>...)"
+            )
+        seen |= first
+
+
+def _set_has_newline(items: Iterable[_Item]) -> bool:
+    """Whether the character set `items` of an IN node contains a newline."""
+    negated = False
+    found = False
+    for op, av in items:
+        if op == sre_constants.NEGATE:
+            negated = True
+        elif op == sre_constants.LITERAL:
+            found |= av == 10
+        elif op == sre_constants.RANGE:
+            found |= av[0] <= 10 <= av[1]
+        elif op == sre_constants.CATEGORY:
+            found |= av not in _NO_NEWLINE_CATEGORIES
+        else:
+            return True
+    return found != negated
+
+
+def _has_newline(items: Iterable[_Item], flags: int) -> bool:
+    for op, av in items:
+        if op == sre_constants.LITERAL:
+            found = av == 10
+        elif op == sre_constants.NOT_LITERAL:
+            found = av != 10
+        elif op == sre_constants.ANY:
+            found = bool(flags & sre_constants.SRE_FLAG_DOTALL)
+        elif op == sre_constants.IN:
+            found = _set_has_newline(av)
+        elif op == sre_constants.SUBPATTERN:
+            _, add_flags, del_flags, body = av
+            found = _has_newline(body, (flags | add_flags) & ~del_flags)
+        elif op in (*_REPEATS, sre_constants.POSSESSIVE_REPEAT):
+            found = _has_newline(av[2], flags)
+        elif op == sre_constants.BRANCH:
+            found = any(_has_newline(branch, flags) for branch in av[1])
+        elif op in (sre_constants.ASSERT, sre_constants.ASSERT_NOT):
+            found = _has_newline(av[1], flags)
+        elif op == _ATOMIC_GROUP:
+            found = _has_newline(av, flags)
+        elif op == sre_constants.GROUPREF_EXISTS:
+            found = any(_has_newline(sub, flags) for sub in av[1:] if sub)
+        elif op in (sre_constants.AT, sre_constants.GROUPREF):
+            # 反向引用只能匹配所引用的组已经匹配的文本
+            found = False
+        else:
+            found = True
+        if found:
+            return True
+    return False
+
+
+def can_match_newline(pattern: re.Pattern[str]) -> bool:
+    """Whether `pattern` can match a newline, so its matches may span lines.
+
+    Decided from the parse tree; constructs it does not know count as yes.
+    """
+    parsed = sre_parse.parse(pattern.pattern, pattern.flags)
+    return _has_newline(parsed, parsed.state.flags)
+
+
+def check_regex(pattern: str, flags: int = 0) -> None:
+    """Reject `pattern` if it is known to backtrack catastrophically.
+
+    Raises:
+        re.error: If the pattern is invalid.
+        UnsafePatternError: If the pattern is unsafe.
+    """
+    _check(sre_parse.parse(pattern, flags), pattern)
+
+
+@lru_cache(maxsize=int(os.getenv("FS_REGEX_CACHE_SIZE", str(DEFAULT_CACHE_SIZE))))
+def compile_pattern(pattern: str, flags: int = 0) -> re.Pattern[str]:
+    """Check and compile `pattern`, caching the result.
+
+    Raises:
+        re.error: If the pattern is invalid.
+        UnsafePatternError: If the pattern is unsafe.
+    """
+    check_regex(pattern, flags)
+    return re.compile(pattern, flags)
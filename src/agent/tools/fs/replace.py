@@ -0,0 +1,287 @@
+"""Concurrent, atomic regex replacement across workspace files.
+
+Each matched file is rewritten into a temporary file on the shared scan
+thread pool. The results are then committed in path order by renaming the
+temporary files over the originals, until the per-call limits on files
+touched and bytes rewritten are reached, or an optional `regex.Deadline`
+has passed; files past a limit are left untouched. A dry run only counts
+the replacements.
+
+Files larger than `STREAM_THRESHOLD`, and compressed files, are rewritten
+line by line when the pattern can only match within a single line, instead
+of being read into memory at once. Rewritten files are stored compressed
+according to `compress.pack`; a compressed file stays compressed when it is
+streamed.
+
+Configuration is read from the environment:
+
+- `FS_REPLACE_MAX_FILES`: default cap on files rewritten per call (1000).
+- `FS_REPLACE_MAX_BYTES`: default cap on bytes rewritten per call (64 MiB).
+"""
+
+import io
+import os
+import re
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from itertools import islice
+from pathlib import Path
+from typing import Callable, Iterable
+
+from agent.tools.fs.atomic import commit, temp_path
+from agent.tools.fs.compress import StreamEncoder, file_codec, open_decoded, pack
+from agent.tools.fs.content import content_cache
+from agent.tools.fs.regex import CHECK_INTERVAL, Deadline, can_match_newline
+from agent.tools.fs.search import STREAM_THRESHOLD, default_window, get_executor
+
+DEFAULT_MAX_FILES = 1000
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+# 逐行匹配时结果可能不同的结构：锚点与前后查找
+_LINE_SENSITIVE = re.compile(r"\\[AZ]|\(\?<?[=!]|[\^$]")
+
+
+def is_line_local(pattern: re.Pattern[str]) -> bool:
+    """Whether every match of `pattern` lies within a single line.
+
+    A pattern that can match a newline, as told by its parse tree, or that
+    uses anchors or lookarounds, is not.
+    """
+    if pattern.flags & (re.DOTALL | re.MULTILINE) or _LINE_SENSITIVE.search(
+        pattern.pattern
+    ):
+        return False
+    return not can_match_newline(pattern)
+
+
+@dataclass
+class FileReplacement:
+    """The outcome of rewriting one file."""
+
+    path: Path
+    count: int = 0
+    size: int = 0
+    old_size: int = 0
+    tmp: Path | None = None
+    error: str | None = None
+    timed_out: bool = False
+
+    def discard(self) -> None:
+        """Remove the uncommitted temporary file."""
+        if self.tmp is not None:
+            self.tmp.unlink(missing_ok=True)
+            self.tmp = None
+
+
+@dataclass
+class ReplaceResult:
+    """The per-file outcomes of one replace call, in path order."""
+
+    files: list[FileReplacement] = field(default_factory=list)
+    skipped: list[Path] = field(default_factory=list)
+    limit: str | None = None
+
+    @property
+    def total(self) -> int:
+        """Total number of replacements made, or counted in a dry run."""
+        return sum(f.count for f in self.files if f.error is None)
+
+
+def _rewrite(
+    path: Path,
+    pattern: re.Pattern[str],
+    repl: str,
+    dry_run: bool,
+    deadline: Deadline | None = None,
+) -> FileReplacement:
+    result = FileReplacement(path)
+    try:
+        cached = content_cache.get(path)
+        result.old_size = path.stat().st_size if cached is None else cached.size
+        if cached is not None and cached.data is not None:
+            content = cached.text()
+        else:
+            codec = file_codec(path)
+            large = codec is not None or result.old_size > STREAM_THRESHOLD
+            if large and is_line_local(pattern):
+                return _rewrite_lines(result, pattern, repl, dry_run, codec, deadline)
+            with open_decoded(path) as f:
+                content = f.read().decode("utf-8")
+        new_content, result.count = pattern.subn(repl, content)
+        if not result.count:
+            return result
+        data = pack(new_content.encode("utf-8"))
+        result.size = len(data)
+        if not dry_run:
+            result.tmp = temp_path(path)
+            with result.tmp.open("wb") as f:
+                f.write(data)
+                os.fsync(f.fileno())
+    except Exception as e:
+        result.discard()
+        result.error = str(e)
+    return result
+
+
+def _rewrite_lines(
+    result: FileReplacement,
+    pattern: re.Pattern[str],
+    repl: str,
+    dry_run: bool,
+    codec: str | None,
+    deadline: Deadline | None = None,
+) -> FileReplacement:
+    path = result.path
+    if not dry_run:
+        result.tmp = temp_path(path)
+    out = None if result.tmp is None else result.tmp.open("wb")
+    encoder = None if out is None else StreamEncoder(out, codec)
+    try:
+        with io.TextIOWrapper(open_decoded(path), "utf-8", newline="") as f:
+            for line_num, line in enumerate(f, 1):
+                if (
+                    deadline is not None
+                    and line_num % CHECK_INTERVAL == 0
+                    and deadline.expired()
+                ):
+                    result.timed_out = True
+                    break
+                new_line, count = pattern.subn(repl, line)
+                result.count += count
+                data = new_line.encode("utf-8")
+                if encoder is None:
+                    result.size += len(data)
+                else:
+                    encoder.write(data)
+        if out is not None and encoder is not None:
+            encoder.finish()
+            result.size = encoder.size
+            out.flush()
+            os.fsync(out.fileno())
+    finally:
+        if out is not None:
+            out.close()
+    if not result.count or result.timed_out:
+        result.discard()
+    return result
+
+
+def replace(
+    files: Iterable[Path],
+    pattern: re.Pattern[str],
+    repl: str,
+    *,
+    dry_run: bool = False,
+    max_files: int | None = None,
+    max_bytes: int | None = None,
+    reserve: Callable[[FileReplacement], str | None] | None = None,
+    release: Callable[[FileReplacement], None] | None = None,
+    executor: ThreadPoolExecutor | None = None,
+    window: int | None = None,
+    deadline: Deadline | None = None,
+) -> ReplaceResult:
+    """Replace `pattern` by `repl` in `files`, committing in input order.
+
+    Args:
+        files: Files to rewrite.
+        pattern: Compiled regex to replace.
+        repl: Replacement template, as accepted by `re.sub`.
+        dry_run: Only count the replacements, write nothing.
+        max_files: Stop after this many files were rewritten.
+        max_bytes: Stop before the rewritten bytes would exceed this.
+        reserve: Called before a file is committed; returning a reason stops
+            the call like a limit does. Not called in a dry run.
+        release: Called with a reserved file whose commit failed.
+        executor: Thread pool to rewrite on, the shared scan pool by default.
+        window: Files rewritten ahead of the commits, `default_window()` by
+            default.
+        deadline: Stop like a limit does once it has passed; files committed
+            before that stay committed.
+
+    Returns:
+        The per-file outcomes, the files skipped because a limit was reached
+        and a description of that limit.
+    """
+    if max_files is None:
+        max_files = int(os.getenv("FS_REPLACE_MAX_FILES", str(DEFAULT_MAX_FILES)))
+    if max_bytes is None:
+        max_bytes = int(os.getenv("FS_REPLACE_MAX_BYTES", str(DEFAULT_MAX_BYTES)))
+    executor = executor or get_executor()
+    window = window or default_window()
+    files = iter(files)
+    pending: deque[tuple[Path, Future[FileReplacement]]] = deque()
+    lock = threading.Lock()
+    stopped = False
+
+    def task(path: Path) -> FileReplacement:
+        with lock:
+            if stopped:
+                return FileReplacement(path)
+        if deadline is not None and deadline.expired():
+            return FileReplacement(path, timed_out=True)
+        return _rewrite(path, pattern, repl, dry_run, deadline)
+
+    def submit() -> None:
+        for path in islice(files, 1):
+            pending.append((path, executor.submit(task, path)))
+
+    result = ReplaceResult()
+    touched = 0
+    rewritten = 0
+    try:
+        for _ in range(window):
+            submit()
+        while pending:
+            path, future = pending.popleft()
+            if result.limit is not None:
+                if not future.cancel():
+                    future.result().discard()
+                result.skipped.append(path)
+                continue
+            file_result = future.result()
+            submit()
+            if file_result.timed_out and deadline is not None:
+                result.limit = deadline.describe()
+                with lock:
+                    stopped = True
+                result.skipped.append(path)
+                continue
+            if not file_result.count or file_result.error is not None:
+                result.files.append(file_result)
+                continue
+            if touched >= max_files:
+                result.limit = f"limit of {max_files} files reached"
+            elif rewritten + file_result.size > max_bytes:
+                result.limit = f"limit of {max_bytes} bytes reached"
+            elif reserve is not None and not dry_run:
+                result.limit = reserve(file_result)
+            if result.limit is not None:
+                with lock:
+                    stopped = True
+                file_result.discard()
+                result.skipped.append(path)
+                continue
+            if file_result.tmp is not None:
+                try:
+                    commit(file_result.tmp, path)
+                except OSError as e:
+                    file_result.discard()
+                    file_result.error = str(e)
+                    if release is not None:
+                        release(file_result)
+                    result.files.append(file_result)
+                    continue
+                file_result.tmp = None
+            touched += 1
+            rewritten += file_result.size
+            result.files.append(file_result)
+        if result.limit is not None:
+            result.skipped.extend(files)
+    finally:
+        # 出错时清理尚未提交的临时文件
+        for _, future in pending:
+            if not future.cancel():
+                future.result().discard()
+    return result
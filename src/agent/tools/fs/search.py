@@ -0,0 +1,377 @@
+"""Parallel regex search over workspace files.
+
+Files are fanned out in chunks to a dedicated thread pool and scanned
+concurrently, while matches are still yielded in path order. Binary files are
+skipped after sniffing their first block for a null byte, files without any
+match are rejected by searching whole blocks of lines at once if the pattern
+cannot match a newline, content is served
+from the shared content cache where possible, large and compressed files
+are streamed line by line, and the scan stops early once enough matches
+have been collected or the optional `regex.Deadline` has passed.
+
+Configuration is read from the environment:
+
+- `FS_SEARCH_WORKERS`: scan threads (default 4).
+- `FS_SEARCH_MAX_RESULTS`: default cap on returned matches (default 1000).
+"""
+
+import os
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from functools import lru_cache
+from itertools import chain, islice
+from pathlib import Path
+from typing import BinaryIO, Generator, Iterable, Iterator
+
+from agent.tools.fs.compress import is_decoded, open_decoded
+from agent.tools.fs.content import SNIFF_SIZE, content_cache, is_binary
+from agent.tools.fs.paths import is_inside
+from agent.tools.fs.regex import CHECK_INTERVAL, Deadline, can_match_newline
+from agent.tools.fs.walk import IgnoreRules, load_rules, walk
+
+DEFAULT_WORKERS = 4
+DEFAULT_MAX_RESULTS = 1000
+DEFAULT_CHUNK_SIZE = 32
+# 超过该大小的文件逐行流式扫描，避免一次性读入内存
+STREAM_THRESHOLD = 8 * 1024 * 1024
+
+# 含有这些结构的正则在整段文本上的结果可能比逐行更少，不能用来预筛
+_LINE_SENSITIVE = re.compile(r"\\[AZ]|\(\?<?[=!]")
+# 预筛每次搜索的文本大小，块之间检查截止时间
+PREFILTER_BLOCK = 64 * 1024
+
+
+@dataclass
+class SearchStats:
+    """Counters describing one search."""
+
+    files_scanned: int = 0
+    binary_skipped: int = 0
+    bytes_read: int = 0
+    elapsed: float = 0.0
+    truncated: bool = False
+    timed_out: bool = False
+
+    def summary(self) -> str:
+        """Return a one-line, human readable summary.
+
+        The tools only show it with truncated or timed out results, to keep
+        complete results to the matches themselves.
+        """
+        return (
+            f"scanned {self.files_scanned} file(s), {self.bytes_read} bytes "
+            f"in {self.elapsed * 1000:.0f} ms"
+        )
+
+
+@dataclass
+class FileMatches:
+    """Matches found in one file."""
+
+    path: Path
+    matches: list[tuple[int, str]] = field(default_factory=list)
+    bytes_read: int = 0
+    binary: bool = False
+    timed_out: bool = False
+
+
+@lru_cache(maxsize=64)
+def _whole_text_pattern(pattern: re.Pattern[str]) -> re.Pattern[str] | None:
+    """Return a pattern usable to reject many lines in one call.
+
+    Only patterns that cannot match a newline qualify: the others could
+    match across lines, and backtrack over the whole text instead of one line.
+    """
+    if _LINE_SENSITIVE.search(pattern.pattern) or can_match_newline(pattern):
+        return None
+    return re.compile(pattern.pattern, pattern.flags | re.MULTILINE)
+
+
+def _may_match(
+    whole: re.Pattern[str], text: str, deadline: Deadline | None = None
+) -> bool:
+    """Whether `whole` matches `text`, searched in blocks of whole lines.
+
+    Once `deadline` has passed the answer is yes, so that the line scan
+    reports the timeout.
+    """
+    start = 0
+    while start < len(text):
+        if deadline is not None and deadline.expired():
+            return True
+        end = text.find("\n", start + PREFILTER_BLOCK)
+        end = len(text) if end < 0 else end + 1
+        if whole.search(text, start, end):
+            return True
+        start = end
+    return False
+
+
+def _match_lines(
+    lines: Iterable[str],
+    pattern: re.Pattern[str],
+    max_matches: int | None,
+    result: FileMatches,
+    deadline: Deadline | None = None,
+) -> None:
+    for line_num, line in enumerate(lines, 1):
+        if (
+            deadline is not None
+            and line_num % CHECK_INTERVAL == 0
+            and deadline.expired()
+        ):
+            result.timed_out = True
+            return
+        if pattern.search(line):
+            result.matches.append((line_num, line.strip()))
+            if max_matches is not None and len(result.matches) >= max_matches:
+                return
+
+
+def _split_lines(text: str) -> list[str]:
+    """Split `text` after each newline, like `read` counts lines.
+
+    `str.splitlines` also breaks at carriage returns, form feeds and other
+    separators, which would shift line numbers and let `^` match mid-line.
+    """
+    *lines, last = text.split("\n")
+    lines = [line + "\n" for line in lines]
+    if last:
+        lines.append(last)
+    return lines
+
+
+def _iter_lines(head: bytes, f: BinaryIO, result: FileMatches) -> Iterator[str]:
+    """Yield the decoded lines of `f`, of which `head` was already read."""
+    *head_lines, tail = head.split(b"\n")
+    lines = [line + b"\n" for line in head_lines]
+    # head 的最后一段没有换行，由文件剩余部分补全
+    tail += f.readline()
+    if tail:
+        lines.append(tail)
+    for line in chain(lines, f):
+        result.bytes_read += len(line)
+        yield line.decode("utf-8", errors="ignore")
+
+
+def scan_file(
+    path: Path,
+    pattern: re.Pattern[str],
+    max_matches: int | None = None,
+    deadline: Deadline | None = None,
+) -> FileMatches:
+    """Return the lines of `path` matching `pattern`.
+
+    If `deadline` passes during the scan, the matches found until then are
+    returned with `timed_out` set.
+    """
+    result = FileMatches(path)
+    content = content_cache.get(path)
+    if content is not None and not content.compressed:
+        result.bytes_read = content.size
+        if content.binary:
+            result.binary = True
+            return result
+        return _match_text(
+            content.text("ignore"), pattern, max_matches, result, deadline
+        )
+    with open_decoded(path) as f:
+        head = f.read(SNIFF_SIZE)
+        result.bytes_read = len(head)
+        if is_binary(head):
+            result.binary = True
+            return result
+        if is_decoded(f) or os.path.getsize(path) > STREAM_THRESHOLD:
+            result.bytes_read = 0
+            lines = _iter_lines(head, f, result)
+            _match_lines(lines, pattern, max_matches, result, deadline)
+            return result
+        data = head + f.read()
+    result.bytes_read = len(data)
+    return _match_text(
+        data.decode("utf-8", errors="ignore"), pattern, max_matches, result, deadline
+    )
+
+
+def _match_text(
+    text: str,
+    pattern: re.Pattern[str],
+    max_matches: int | None,
+    result: FileMatches,
+    deadline: Deadline | None = None,
+) -> FileMatches:
+    whole = _whole_text_pattern(pattern)
+    if whole is not None and not _may_match(whole, text, deadline):
+        return result
+    lines = _split_lines(text)
+    _match_lines(lines, pattern, max_matches, result, deadline)
+    return result
+
+
+def iter_files(root: Path, rules: IgnoreRules | None = None) -> Iterator[Path]:
+    """Yield the regular files below `root` in sorted path order.
+
+    Paths excluded by `rules` (the workspace ignore rules by default) are
+    skipped, directory symlinks are not followed and file symlinks pointing
+    outside of `root` are skipped.
+    """
+    rules = load_rules(root) if rules is None else rules
+    for node in walk(root, rules=rules):
+        if not node.entry.is_file:
+            continue
+        path = root / node.rel
+        if node.entry.is_symlink and not is_inside(root, path):
+            continue
+        yield path
+
+
+def _scan_chunk(
+    chunk: list[Path],
+    pattern: re.Pattern[str],
+    max_matches: int | None,
+    cancelled: threading.Event,
+    deadline: Deadline | None = None,
+) -> list[FileMatches]:
+    results = []
+    for path in chunk:
+        if cancelled.is_set():
+            break
+        if deadline is not None and deadline.expired():
+            results.append(FileMatches(path, timed_out=True))
+            break
+        try:
+            file_matches = scan_file(path, pattern, max_matches, deadline)
+        except OSError:
+            continue
+        results.append(file_matches)
+        if file_matches.timed_out:
+            break
+    return results
+
+
+_executor: ThreadPoolExecutor | None = None
+_executor_lock = threading.Lock()
+
+
+def search_workers() -> int:
+    """Return the number of scan threads configured by `FS_SEARCH_WORKERS`."""
+    return int(os.getenv("FS_SEARCH_WORKERS", str(DEFAULT_WORKERS)))
+
+
+def default_window() -> int:
+    """Return how many tasks to keep in flight on the shared scan pool."""
+    return max(2, search_workers() * 2)
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """Return the shared thread pool used to scan files."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=search_workers(), thread_name_prefix="fs-search"
+            )
+        return _executor
+
+
+def iter_matches(
+    files: Iterable[Path],
+    pattern: re.Pattern[str],
+    *,
+    max_matches_per_file: int | None = None,
+    stats: SearchStats | None = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    executor: ThreadPoolExecutor | None = None,
+    window: int | None = None,
+    deadline: Deadline | None = None,
+) -> Generator[FileMatches]:
+    """Scan `files` concurrently, yielding per-file matches in input order.
+
+    Only `window` chunks are in flight at any time, `default_window()` unless
+    given; closing the generator cancels the chunks that have not been
+    scanned yet. When
+    `deadline` passes, the matches found in files before the first one left
+    unfinished are yielded and `stats.timed_out` is set.
+    """
+    stats = stats if stats is not None else SearchStats()
+    executor = executor or get_executor()
+    window = window or default_window()
+    cancelled = threading.Event()
+    pending: deque[Future[list[FileMatches]]] = deque()
+    files = iter(files)
+
+    def submit() -> bool:
+        chunk = list(islice(files, chunk_size))
+        if not chunk:
+            return False
+        pending.append(
+            executor.submit(
+                _scan_chunk, chunk, pattern, max_matches_per_file, cancelled, deadline
+            )
+        )
+        return True
+
+    start = time.perf_counter()
+    try:
+        while len(pending) < window and submit():
+            pass
+        while pending:
+            chunk_results = pending.popleft().result()
+            submit()
+            for file_matches in chunk_results:
+                stats.bytes_read += file_matches.bytes_read
+                if file_matches.binary:
+                    stats.binary_skipped += 1
+                    continue
+                stats.files_scanned += 1
+                if file_matches.matches:
+                    yield file_matches
+                if file_matches.timed_out:
+                    stats.timed_out = True
+                    return
+    finally:
+        cancelled.set()
+        for future in pending:
+            future.cancel()
+        stats.elapsed += time.perf_counter() - start
+
+
+def search(
+    files: Iterable[Path],
+    pattern: re.Pattern[str],
+    *,
+    max_results: int | None = None,
+    max_matches_per_file: int | None = None,
+    executor: ThreadPoolExecutor | None = None,
+    deadline: Deadline | None = None,
+) -> tuple[list[tuple[Path, int, str]], SearchStats]:
+    """Collect up to `max_results` matching lines from `files`.
+
+    Returns:
+        The `(path, line number, line)` matches in path order and the search
+        statistics.
+    """
+    stats = SearchStats()
+    results: list[tuple[Path, int, str]] = []
+    matches = iter_matches(
+        files,
+        pattern,
+        max_matches_per_file=max_matches_per_file,
+        stats=stats,
+        executor=executor,
+        deadline=deadline,
+    )
+    try:
+        for file_matches in matches:
+            for line_num, line in file_matches.matches:
+                if max_results is not None and len(results) >= max_results:
+                    stats.truncated = True
+                    return results, stats
+                results.append((file_matches.path, line_num, line))
+    finally:
+        matches.close()
+    return results, stats
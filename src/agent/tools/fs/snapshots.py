@@ -0,0 +1,332 @@
+"""Copy-on-write snapshots of a workspace.
+
+A snapshot is a copy of the workspace tree in its state directory in which
+every file is a reflink (on filesystems that support `FICLONE`, such as
+Btrfs and XFS) or else a hard link to the workspace file. Taking one costs a
+metadata operation per file and no file data; storage grows only with the
+files changed afterwards.
+
+Hard links are safe because the tool never modifies a file in place: writes,
+patches and replacements rename a new file over the old one, and appends to
+a file with other links copy it first (`atomic.append_bytes`). Files that can
+be neither cloned nor linked, e.g. when `FS_STATE_DIR` is on another
+filesystem, are copied.
+
+Restoring builds the snapshot's tree next to the workspace the same way and
+swaps it in with two renames, after taking a snapshot of the current state
+so that the restore itself can be undone.
+
+Storage held only by snapshots counts against the workspace quotas; when a
+change does not fit, automatic snapshots are deleted, oldest first, to make
+room before it is refused.
+`storage` measures it: files the workspace still links cost nothing, and
+every other file is counted once however many snapshots hold it. Reflinked
+files are counted in full since their shared extents cannot be seen.
+`held` tells which files of the workspace a snapshot links, whose storage
+moves to the snapshots when the workspace replaces or deletes them.
+
+Configuration is read from the environment:
+
+- `FS_SNAPSHOT_MODE`: `auto` (default: reflink, then hard link, then copy),
+  `reflink`, `link` or `copy`.
+- `FS_SNAPSHOT_KEEP`: how many automatic and how many manual snapshots are
+  kept (default 10); older ones are deleted when a new one is taken.
+- `FS_AUTO_SNAPSHOT`: the operations that take an automatic snapshot before
+  they run, comma separated, e.g. `delete,replace` (default `off`). Each
+  one clones the whole workspace.
+"""
+
+import errno
+import fcntl
+import json
+import os
+import secrets
+import shutil
+import stat
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Iterator
+
+from agent.tools.fs.paths import state_dir
+
+DEFAULT_KEEP = 10
+DEFAULT_AUTO_OPERATIONS = "off"
+META_NAME = "meta.json"
+TREE_NAME = "tree"
+
+# linux/fs.h: _IOW(0x94, 9, int)
+FICLONE = 0x40049409
+
+
+class SnapshotError(Exception):
+    """Raised when a snapshot does not exist or cannot be restored."""
+
+
+@dataclass
+class SnapshotInfo:
+    """The metadata of one snapshot."""
+
+    id: str
+    created: float
+    label: str
+    automatic: bool
+    files: int = 0
+    bytes: int = 0
+
+    def describe(self) -> str:
+        """Return a one-line, human readable description."""
+        created = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(self.created))
+        kind = "auto" if self.automatic else "manual"
+        label = f" {self.label}" if self.label else ""
+        return f"{self.id} ({created}, {kind}, {self.files} files, {self.bytes} bytes){label}"
+
+
+def snapshot_mode() -> str:
+    """Return how files are copied into snapshots."""
+    return os.getenv("FS_SNAPSHOT_MODE", "auto")
+
+
+def keep_count() -> int:
+    """Return how many snapshots of each kind are kept."""
+    return int(os.getenv("FS_SNAPSHOT_KEEP", str(DEFAULT_KEEP)))
+
+
+def auto_snapshot_enabled(operation: str) -> bool:
+    """Whether `operation` takes a snapshot before it runs."""
+    value = os.getenv("FS_AUTO_SNAPSHOT", DEFAULT_AUTO_OPERATIONS)
+    if value.strip().lower() in ("", "0", "off", "false", "no"):
+        return False
+    return operation in {name.strip() for name in value.split(",")}
+
+
+class _Cloner:
+    """Copies files with the cheapest method that works."""
+
+    def __init__(self, mode: str) -> None:
+        self.reflink = mode in ("auto", "reflink")
+        self.link = mode in ("auto", "link")
+
+    def clone(self, src: str, dst: str) -> None:
+        if self.reflink and self._reflink(src, dst):
+            return
+        if self.link:
+            try:
+                os.link(src, dst, follow_symlinks=False)
+                return
+            except OSError as e:
+                if e.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK):
+                    raise
+                # 跨文件系统或不支持硬链接时后续文件都改为复制
+                self.link = False
+        shutil.copy2(src, dst, follow_symlinks=False)
+
+    def _reflink(self, src: str, dst: str) -> bool:
+        with open(src, "rb") as s, open(dst, "wb") as d:
+            try:
+                fcntl.ioctl(d.fileno(), FICLONE, s.fileno())
+            except OSError:
+                # 文件系统不支持 reflink，之后不再尝试
+                self.reflink = False
+        if self.reflink:
+            shutil.copystat(src, dst)
+            return True
+        os.unlink(dst)
+        return False
+
+
+def clone_tree(src: Path, dst: Path, mode: str | None = None) -> tuple[int, int]:
+    """Recreate the tree `src` at `dst`, cloning every file.
+
+    Symlinks are recreated, not followed.
+
+    Returns:
+        The number of files and their total size.
+    """
+    cloner = _Cloner(mode or snapshot_mode())
+    files = size = 0
+    dst.mkdir(parents=True)
+    stack = [(src, dst)]
+    while stack:
+        src_dir, dst_dir = stack.pop()
+        with os.scandir(src_dir) as it:
+            for entry in it:
+                target = dst_dir / entry.name
+                if entry.is_symlink():
+                    os.symlink(os.readlink(entry.path), target)
+                elif entry.is_dir():
+                    target.mkdir()
+                    stack.append((Path(entry.path), target))
+                elif entry.is_file():
+                    cloner.clone(entry.path, str(target))
+                    files += 1
+                    size += entry.stat(follow_symlinks=False).st_size
+    return files, size
+
+
+def _inodes(path: Path) -> Iterator[tuple[tuple[int, int], int]]:
+    """Yield the device, inode and size of the regular files at or below `path`."""
+    try:
+        st = path.lstat()
+    except OSError:
+        return
+    if stat.S_ISREG(st.st_mode):
+        yield (st.st_dev, st.st_ino), st.st_size
+    if not stat.S_ISDIR(st.st_mode):
+        return
+    stack = [path]
+    while stack:
+        try:
+            with os.scandir(stack.pop()) as it:
+                for entry in it:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(Path(entry.path))
+                    elif entry.is_file(follow_symlinks=False):
+                        st = entry.stat(follow_symlinks=False)
+                        yield (st.st_dev, st.st_ino), st.st_size
+        except OSError:
+            continue
+
+
+class SnapshotStore:
+    """The snapshots of one workspace."""
+
+    def __init__(self, root: Path, path: Path) -> None:
+        """Initialize the store of `root`, kept in the directory `path`."""
+        self.root = root
+        self.path = path
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        """Serialise snapshot changes across worker processes."""
+        self.path.mkdir(parents=True, exist_ok=True)
+        with (self.path / ".lock").open("a") as f:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+    def list(self) -> list[SnapshotInfo]:
+        """Return the snapshots, oldest first."""
+        if not self.path.is_dir():
+            return []
+        snapshots = []
+        for directory in self.path.iterdir():
+            try:
+                meta = json.loads((directory / META_NAME).read_text(encoding="utf-8"))
+                snapshots.append(SnapshotInfo(**meta))
+            except (OSError, ValueError, TypeError):
+                continue
+        return sorted(snapshots, key=lambda s: s.created)
+
+    def _trees(self) -> tuple[Path, ...]:
+        # 类里的 list 方法遮蔽了内置类型，这里返回元组
+        if not self.path.is_dir():
+            return ()
+        return tuple(
+            tree for d in self.path.iterdir() if (tree := d / TREE_NAME).is_dir()
+        )
+
+    def storage(self) -> tuple[int, int]:
+        """Return the number and size of the files only the snapshots hold."""
+        trees = self._trees()
+        if not trees:
+            return 0, 0
+        live = {inode for inode, _ in _inodes(self.root)}
+        held: dict[tuple[int, int], int] = {}
+        for tree in trees:
+            held.update(_inodes(tree))
+        sizes = [size for inode, size in held.items() if inode not in live]
+        return len(sizes), sum(sizes)
+
+    def held(self, path: Path) -> tuple[int, int]:
+        """Return the number and size of the files at `path` a snapshot links.
+
+        Snapshots mirror the workspace tree, so a file is held if a snapshot
+        has the same inode at the same relative path.
+        """
+        trees = self._trees()
+        if not trees:
+            return 0, 0
+        live = dict(_inodes(path))
+        rel = path.relative_to(self.root)
+        held = {
+            inode: live[inode]
+            for tree in trees
+            for inode, _ in _inodes(tree / rel)
+            if inode in live
+        }
+        return len(held), sum(held.values())
+
+    def get(self, snapshot_id: str) -> SnapshotInfo:
+        """Return the snapshot `snapshot_id`.
+
+        Raises:
+            SnapshotError: If there is no such snapshot.
+        """
+        for snapshot in self.list():
+            if snapshot.id == snapshot_id:
+                return snapshot
+        raise SnapshotError(f"Snapshot '{snapshot_id}' does not exist")
+
+    def take(self, label: str = "", automatic: bool = False) -> SnapshotInfo:
+        """Snapshot the current state of the workspace."""
+        with self._locked():
+            return self._take(label, automatic)
+
+    def _take(self, label: str, automatic: bool) -> SnapshotInfo:
+        snapshot_id = time.strftime("%Y%m%d-%H%M%S-") + secrets.token_hex(3)
+        directory = self.path / snapshot_id
+        try:
+            files, size = clone_tree(self.root, directory / TREE_NAME)
+            info = SnapshotInfo(snapshot_id, time.time(), label, automatic, files, size)
+            (directory / META_NAME).write_text(
+                json.dumps(asdict(info), ensure_ascii=False), encoding="utf-8"
+            )
+        except BaseException:
+            shutil.rmtree(directory, ignore_errors=True)
+            raise
+        self._prune(automatic)
+        return info
+
+    def _prune(self, automatic: bool) -> None:
+        same_kind = [s for s in self.list() if s.automatic == automatic]
+        for snapshot in same_kind[: max(0, len(same_kind) - keep_count())]:
+            shutil.rmtree(self.path / snapshot.id, ignore_errors=True)
+
+    def delete(self, snapshot_id: str) -> None:
+        """Delete the snapshot `snapshot_id`."""
+        with self._locked():
+            self.get(snapshot_id)
+            shutil.rmtree(self.path / snapshot_id)
+
+    def restore(self, snapshot_id: str) -> SnapshotInfo:
+        """Replace the workspace by the snapshot `snapshot_id`.
+
+        The current state is snapshotted first.
+
+        Returns:
+            The snapshot of the state that was replaced.
+        """
+        with self._locked():
+            self.get(snapshot_id)
+            backup = self._take(f"before restore of {snapshot_id}", automatic=True)
+            suffix = f"{snapshot_id}-{secrets.token_hex(3)}"
+            staging = self.root.parent / f".{self.root.name}.restore-{suffix}"
+            trash = self.root.parent / f".{self.root.name}.trash-{suffix}"
+            try:
+                clone_tree(self.path / snapshot_id / TREE_NAME, staging)
+            except BaseException:
+                shutil.rmtree(staging, ignore_errors=True)
+                raise
+            os.rename(self.root, trash)
+            os.rename(staging, self.root)
+            shutil.rmtree(trash, ignore_errors=True)
+            return backup
+
+
+def get_store(root: Path) -> SnapshotStore:
+    """Return the snapshot store of the workspace `root`."""
+    return SnapshotStore(root, state_dir(root) / "snapshots")
@@ -0,0 +1,142 @@
+"""Cached in-memory snapshot of a workspace directory tree.
+
+`glob` and `list` used to walk the filesystem and stat every entry on every
+call. A `TreeSnapshot` keeps one `os.scandir` listing per directory, with the
+entry types scandir reports without a stat call. A listing is validated against its directory's
+mtime on every use, is rescanned only when that mtime changed, and is dropped
+right away when the tool itself mutates the directory. Repeated glob and list
+calls then skip the directory scans.
+
+Directory mtimes change when entries are added, removed or renamed, not when
+an existing file is rewritten in place, so file sizes are not cached. Only
+`list` shows them; it asks for `sizes=True` and the files are stat'ed then.
+Globbing and searching never stat the files they walk past.
+"""
+
+import os
+import threading
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import NamedTuple
+
+
+class Entry(NamedTuple):
+    """One directory entry, with the stat data the tools need."""
+
+    name: str
+    is_dir: bool
+    is_file: bool
+    is_symlink: bool
+    # 仅在 listing(sizes=True) 时填充，否则为 0
+    size: int = 0
+
+
+@dataclass
+class Listing:
+    """The sorted entries of one directory and the mtime they reflect."""
+
+    mtime_ns: int
+    entries: dict[str, Entry] = field(default_factory=dict)
+
+
+def _scan(directory: Path) -> Listing | None:
+    try:
+        mtime_ns = directory.stat().st_mtime_ns
+        with os.scandir(directory) as it:
+            raw = sorted(it, key=lambda e: e.name)
+    except OSError:
+        return None
+    listing = Listing(mtime_ns)
+    for e in raw:
+        listing.entries[e.name] = Entry(e.name, e.is_dir(), e.is_file(), e.is_symlink())
+    return listing
+
+
+def _sizes(directory: Path, entries: list[Entry]) -> list[Entry]:
+    """Return `entries` with the current sizes of the files filled in."""
+    sized = []
+    for entry in entries:
+        if entry.is_file:
+            try:
+                entry = entry._replace(size=os.stat(directory / entry.name).st_size)
+            except OSError:
+                pass
+        sized.append(entry)
+    return sized
+
+
+class TreeSnapshot:
+    """Lazily built, mtime-validated listings of one workspace."""
+
+    def __init__(self, root: Path) -> None:
+        """Initialize an empty snapshot of `root`."""
+        self.root = root
+        self._listings: dict[str, Listing] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, path: Path) -> str:
+        rel = path.relative_to(self.root).as_posix()
+        return "" if rel == "." else rel
+
+    def listing(self, rel_dir: str = "", *, sizes: bool = False) -> list[Entry]:
+        """Return the sorted entries of the directory `rel_dir`.
+
+        File sizes are only read, fresh, when `sizes` is set.
+        """
+        directory = self.root / rel_dir if rel_dir else self.root
+        entries = self._entries(rel_dir, directory)
+        return _sizes(directory, entries) if sizes else entries
+
+    def _entries(self, rel_dir: str, directory: Path) -> list[Entry]:
+        with self._lock:
+            cached = self._listings.get(rel_dir)
+        if cached is not None:
+            try:
+                unchanged = directory.stat().st_mtime_ns == cached.mtime_ns
+            except OSError:
+                unchanged = False
+            if unchanged:
+                return list(cached.entries.values())
+        listing = _scan(directory)
+        with self._lock:
+            if listing is None:
+                self._listings.pop(rel_dir, None)
+                return []
+            self._listings[rel_dir] = listing
+        return list(listing.entries.values())
+
+    def invalidate(self, path: Path) -> None:
+        """Forget what is cached about `path` after the tool changed it."""
+        key = self._key(path)
+        with self._lock:
+            prefix = key + "/" if key else ""
+            for cached in [
+                k for k in self._listings if k == key or k.startswith(prefix)
+            ]:
+                del self._listings[cached]
+            parts = key.split("/") if key else []
+            # 父目录的条目已变化；更上层目录只在新建了子目录时才需要失效
+            if parts:
+                self._listings.pop("/".join(parts[:-1]), None)
+            for depth in range(len(parts) - 2, -1, -1):
+                ancestor = self._listings.get("/".join(parts[:depth]))
+                if ancestor is not None and parts[depth] not in ancestor.entries:
+                    del self._listings["/".join(parts[:depth])]
+
+    def clear(self) -> None:
+        """Drop every cached listing."""
+        with self._lock:
+            self._listings.clear()
+
+
+_snapshots: dict[Path, TreeSnapshot] = {}
+_snapshots_lock = threading.Lock()
+
+
+def get_snapshot(root: Path) -> TreeSnapshot:
+    """Return the shared snapshot of the workspace `root`."""
+    with _snapshots_lock:
+        snapshot = _snapshots.get(root)
+        if snapshot is None:
+            snapshot = _snapshots[root] = TreeSnapshot(root)
+        return snapshot
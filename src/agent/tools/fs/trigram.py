@@ -0,0 +1,436 @@
+"""Per-workspace trigram index used to narrow regex search candidates.
+
+For every text file the index keeps the set of case-folded character
+trigrams it contains. A regex is reduced to the literal runs that every match
+must contain; only files holding all of their trigrams can match, so only
+those files are scanned. Case folding follows the regex engine, where under
+IGNORECASE `ſ` matches `s` and `İ` matches `i`, so one index serves both
+case-sensitive and case-insensitive patterns.
+
+The index is kept in memory per workspace and persisted under the
+workspace's state directory as a snapshot plus an append-only journal of
+incremental updates, which is compacted into a new snapshot once it grows
+long. Both are guarded by an exclusive `flock` on a lock file, so worker
+processes sharing a workspace do not interleave writes. Each process replays
+the journal entries written by the others before it answers a query, so
+writes made through the tool by any worker are seen at once. To pick up
+edits made outside of the tool, `refresh` re-checks the stat signature of
+every file and re-reads only the changed ones; searches run it at most once
+every `FS_TRIGRAM_REFRESH_SECONDS` (default 5). `rebuild` discards everything
+and re-indexes from scratch.
+"""
+
+import fcntl
+import json
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from re import _casefix  # type: ignore[attr-defined]
+from re import _parser as sre_parse  # type: ignore[attr-defined]
+from typing import Any, Iterator
+
+from agent.tools.fs.compress import open_decoded
+from agent.tools.fs.content import SNIFF_SIZE, is_binary
+from agent.tools.fs.paths import is_inside
+from agent.tools.fs.search import iter_files
+from agent.tools.fs.walk import load_rules
+
+INDEX_VERSION = 2
+SNAPSHOT_NAME = "trigrams.json"
+JOURNAL_NAME = "trigrams.journal"
+LOCK_NAME = "trigrams.lock"
+MAX_JOURNAL_ENTRIES = 1000
+# 超大文件不建索引，始终作为候选
+MAX_INDEXED_SIZE = 32 * 1024 * 1024
+
+_LITERAL = sre_parse.LITERAL
+_SUBPATTERN = sre_parse.SUBPATTERN
+_REPEATS = (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT)
+
+
+# 正则引擎在 IGNORECASE 下还把 ſ/s、ı/i、K/k 等视为相同，统一映射到最小码位；
+# "İ".lower() 是 "i" 加组合点，去掉组合点使其与 i 对齐
+_FOLD: dict[int, str | None] = {
+    0x307: None,
+    **{c: chr(min(c, *same)) for c, same in _casefix._EXTRA_CASES.items()},
+}
+
+
+def fold(text: str) -> str:
+    """Case-fold `text` character by character, as IGNORECASE compares."""
+    return text.lower().translate(_FOLD)
+
+
+def trigrams(text: str) -> set[str]:
+    """Return the case-folded trigrams of `text`."""
+    text = fold(text)
+    return {text[i : i + 3] for i in range(len(text) - 2)}
+
+
+def _literal_runs(items: Any, runs: list[str]) -> None:
+    """Collect the literal runs every match of a parsed sequence contains."""
+    run: list[str] = []
+    for op, value in items:
+        if op == _LITERAL:
+            run.append(chr(value))
+            continue
+        if run:
+            runs.append("".join(run))
+            run = []
+        if op == _SUBPATTERN:
+            _literal_runs(value[-1], runs)
+        elif op in _REPEATS and value[0] >= 1:
+            _literal_runs(value[2], runs)
+    if run:
+        runs.append("".join(run))
+
+
+def required_trigrams(pattern: re.Pattern[str]) -> set[str]:
+    """Return trigrams that any line matching `pattern` must contain."""
+    try:
+        parsed = sre_parse.parse(pattern.pattern, pattern.flags)
+    except Exception:
+        return set()
+    runs: list[str] = []
+    _literal_runs(parsed, runs)
+    grams: set[str] = set()
+    for run in runs:
+        grams |= trigrams(run)
+    return grams
+
+
+@dataclass
+class _Entry:
+    mtime_ns: int
+    size: int
+    grams: frozenset[str] | None  # None: not indexed, always a candidate
+
+
+class TrigramIndex:
+    """Trigram index of the text files in one workspace."""
+
+    def __init__(self, root: Path, index_dir: Path) -> None:
+        """Initialize the index of `root`, persisted in `index_dir`."""
+        self.root = root
+        self.index_dir = index_dir
+        self._files: dict[str, _Entry] = {}
+        self._postings: dict[str, set[str]] = {}
+        self._journal_entries = 0
+        # 已读取的快照签名与日志位置，用来发现其他进程的写入
+        self._snapshot_sig: tuple[int, int, int] | None = None
+        self._journal_ino: int | None = None
+        self._journal_offset = 0
+        self._refreshed_at: float | None = None
+        self._lock = threading.RLock()
+        with self._lock, self._locked(fcntl.LOCK_SH):
+            self._load()
+
+    @property
+    def snapshot_path(self) -> Path:
+        """Path of the persisted snapshot."""
+        return self.index_dir / SNAPSHOT_NAME
+
+    @property
+    def journal_path(self) -> Path:
+        """Path of the journal of incremental updates."""
+        return self.index_dir / JOURNAL_NAME
+
+    @contextmanager
+    def _locked(self, operation: int = fcntl.LOCK_EX) -> Iterator[None]:
+        """Hold the index lock file, shared with the other worker processes."""
+        self.index_dir.mkdir(parents=True, exist_ok=True)
+        with (self.index_dir / LOCK_NAME).open("a") as f:
+            fcntl.flock(f.fileno(), operation)
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+    def __len__(self) -> int:
+        """Return the number of tracked files."""
+        return len(self._files)
+
+    # -- in-memory updates -------------------------------------------------
+
+    def _set(self, rel: str, entry: _Entry) -> None:
+        self._drop(rel)
+        self._files[rel] = entry
+        for gram in entry.grams or ():
+            self._postings.setdefault(gram, set()).add(rel)
+
+    def _drop(self, rel: str) -> None:
+        old = self._files.pop(rel, None)
+        if old is None or not old.grams:
+            return
+        for gram in old.grams:
+            files = self._postings.get(gram)
+            if files is not None:
+                files.discard(rel)
+                if not files:
+                    del self._postings[gram]
+
+    def _scan(self, path: Path) -> _Entry | None:
+        try:
+            with open_decoded(path) as f:
+                st = path.stat()
+                if st.st_size > MAX_INDEXED_SIZE:
+                    return _Entry(st.st_mtime_ns, st.st_size, None)
+                data = f.read(MAX_INDEXED_SIZE + 1)
+                # 压缩文件解压后也可能超限
+                if len(data) > MAX_INDEXED_SIZE:
+                    return _Entry(st.st_mtime_ns, st.st_size, None)
+        except OSError:
+            return None
+        if is_binary(data[:SNIFF_SIZE]):
+            grams: frozenset[str] = frozenset()
+        else:
+            grams = frozenset(trigrams(data.decode("utf-8", errors="ignore")))
+        return _Entry(st.st_mtime_ns, st.st_size, grams)
+
+    def _rel(self, path: Path) -> str:
+        return path.relative_to(self.root).as_posix()
+
+    def _indexable(self, path: Path) -> bool:
+        """Whether `iter_files` would yield `path`."""
+        if load_rules(self.root).excludes(self._rel(path)):
+            return False
+        return not path.is_symlink() or is_inside(self.root, path)
+
+    # -- persistence -------------------------------------------------------
+
+    @staticmethod
+    def _encode(rel: str, entry: _Entry | None) -> dict[str, Any]:
+        if entry is None:
+            return {"path": rel, "deleted": True}
+        grams = None if entry.grams is None else sorted(entry.grams)
+        return {
+            "path": rel,
+            "mtime_ns": entry.mtime_ns,
+            "size": entry.size,
+            "grams": grams,
+        }
+
+    def _apply(self, record: dict[str, Any]) -> None:
+        if record.get("deleted"):
+            self._drop(record["path"])
+            return
+        grams = record["grams"]
+        self._set(
+            record["path"],
+            _Entry(
+                record["mtime_ns"],
+                record["size"],
+                None if grams is None else frozenset(grams),
+            ),
+        )
+
+    @staticmethod
+    def _signature(path: Path) -> tuple[int, int, int] | None:
+        try:
+            st = path.stat()
+        except OSError:
+            return None
+        return st.st_ino, st.st_mtime_ns, st.st_size
+
+    def _load(self) -> None:
+        """Read the snapshot and the whole journal; needs the index lock."""
+        self._files.clear()
+        self._postings.clear()
+        self._journal_entries = 0
+        self._journal_ino = None
+        self._journal_offset = 0
+        self._snapshot_sig = self._signature(self.snapshot_path)
+        try:
+            snapshot = json.loads(self.snapshot_path.read_text(encoding="utf-8"))
+            if snapshot.get("version") == INDEX_VERSION:
+                for record in snapshot["files"]:
+                    self._apply(record)
+        except (OSError, ValueError, KeyError):
+            self._files.clear()
+            self._postings.clear()
+        self._replay()
+
+    def _replay(self) -> None:
+        """Apply the journal entries added since the last read."""
+        try:
+            with self.journal_path.open("rb") as f:
+                ino = os.fstat(f.fileno()).st_ino
+                if ino != self._journal_ino:
+                    self._journal_ino = ino
+                    self._journal_offset = 0
+                f.seek(self._journal_offset)
+                data = f.read()
+        except OSError:
+            self._journal_ino = None
+            self._journal_offset = 0
+            return
+        # 只处理完整的行，写了一半的记录留到下次
+        data = data[: data.rfind(b"\n") + 1]
+        self._journal_offset += len(data)
+        for line in data.splitlines():
+            try:
+                self._apply(json.loads(line))
+            except (ValueError, KeyError):
+                continue
+            self._journal_entries += 1
+
+    def _sync(self) -> None:
+        """Catch up with the writes of other processes; needs the index lock."""
+        if self._signature(self.snapshot_path) != self._snapshot_sig:
+            # 其他进程压缩过日志，重新读取
+            self._load()
+        else:
+            self._replay()
+
+    def _commit(self, records: list[dict[str, Any]]) -> None:
+        """Apply `records` after the journal of others and append them to it."""
+        with self._lock, self._locked():
+            self._sync()
+            for record in records:
+                self._apply(record)
+            if not records:
+                return
+            lines = "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in records)
+            with self.journal_path.open("ab") as f:
+                f.write(lines.encode("utf-8"))
+                self._journal_ino = os.fstat(f.fileno()).st_ino
+                self._journal_offset = f.tell()
+            self._journal_entries += len(records)
+            if self._journal_entries > MAX_JOURNAL_ENTRIES:
+                self._save()
+
+    def _save(self) -> None:
+        """Write a full snapshot and remove the journal; needs the index lock."""
+        snapshot = {
+            "version": INDEX_VERSION,
+            "files": [self._encode(rel, e) for rel, e in self._files.items()],
+        }
+        tmp = self.snapshot_path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(snapshot, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp, self.snapshot_path)
+        self.journal_path.unlink(missing_ok=True)
+        self._snapshot_sig = self._signature(self.snapshot_path)
+        self._journal_ino = None
+        self._journal_offset = 0
+        self._journal_entries = 0
+
+    def save(self) -> None:
+        """Write a full snapshot, including the updates of other processes."""
+        with self._lock, self._locked():
+            self._sync()
+            self._save()
+
+    # -- public API --------------------------------------------------------
+
+    def update(self, path: Path) -> None:
+        """Re-index the file at `path` after it was written.
+
+        Files the workspace ignore rules exclude are dropped, as `refresh`
+        would never see them.
+        """
+        entry = self._scan(path) if self._indexable(path) else None
+        self._commit([self._encode(self._rel(path), entry)])
+
+    def remove(self, path: Path) -> None:
+        """Forget `path`, or every file below it if it was a directory."""
+        with self._lock:
+            rel = self._rel(path)
+            prefix = rel + "/"
+            gone = [r for r in self._files if r == rel or r.startswith(prefix)]
+            self._commit([self._encode(r, None) for r in gone])
+
+    def refresh(self, max_age: float = 0.0) -> None:
+        """Re-index files whose stat signature changed since they were indexed.
+
+        Args:
+            max_age: Skip the check if the last one is more recent than this
+                many seconds.
+        """
+        with self._lock:
+            now = time.monotonic()
+            if self._refreshed_at is not None and now - self._refreshed_at < max_age:
+                return
+            self._refreshed_at = now
+            with self._locked(fcntl.LOCK_SH):
+                self._sync()
+            seen = set()
+            records = []
+            for path in iter_files(self.root):
+                rel = self._rel(path)
+                seen.add(rel)
+                entry = self._files.get(rel)
+                try:
+                    st = path.stat()
+                except OSError:
+                    continue
+                if (
+                    entry is not None
+                    and entry.mtime_ns == st.st_mtime_ns
+                    and entry.size == st.st_size
+                ):
+                    continue
+                new = self._scan(path)
+                if new is not None:
+                    records.append(self._encode(rel, new))
+            records.extend(self._encode(r, None) for r in self._files if r not in seen)
+            self._commit(records)
+
+    def rebuild(self) -> None:
+        """Discard the index and rebuild it from the workspace contents."""
+        with self._lock:
+            entries = {}
+            for path in iter_files(self.root):
+                entry = self._scan(path)
+                if entry is not None:
+                    entries[self._rel(path)] = entry
+            with self._locked():
+                self._files.clear()
+                self._postings.clear()
+                for rel, entry in entries.items():
+                    self._set(rel, entry)
+                self._refreshed_at = time.monotonic()
+                self._save()
+
+    def candidates(self, pattern: re.Pattern[str]) -> list[Path] | None:
+        """Return the files that may contain a match, or None if unknown.
+
+        The result is sorted like `iter_files`, so search output keeps its
+        order whether or not the index is used.
+        """
+        grams = required_trigrams(pattern)
+        if not grams:
+            return None
+        with self._lock:
+            with self._locked(fcntl.LOCK_SH):
+                self._sync()
+            postings = sorted((self._postings.get(g, set()) for g in grams), key=len)
+            matched = set(postings[0]).intersection(*postings[1:])
+            matched.update(r for r, e in self._files.items() if e.grams is None)
+        return sorted(self.root / rel for rel in matched)
+
+
+_indexes: dict[Path, TrigramIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_index(root: Path, index_dir: Path) -> TrigramIndex:
+    """Return the shared index of the workspace `root`."""
+    with _indexes_lock:
+        index = _indexes.get(root)
+        if index is None:
+            index = _indexes[root] = TrigramIndex(root, index_dir)
+        return index
+
+
+def refresh_interval() -> float:
+    """Seconds between out-of-band change checks during searches."""
+    return float(os.getenv("FS_TRIGRAM_REFRESH_SECONDS", "5"))
+
+
+def index_enabled() -> bool:
+    """Whether the trigram index is enabled through `FS_TRIGRAM_INDEX`."""
+    return os.getenv("FS_TRIGRAM_INDEX", "").lower() in ("1", "true", "yes")
@@ -0,0 +1,356 @@
+"""Per-user workspace usage ledger and quotas.
+
+Every mutating operation applies the change in stored bytes and file count
+to a small JSON ledger in the workspace's state directory, so the current
+usage is known without walking the workspace. The ledger is updated under an
+exclusive file lock, which keeps it consistent across worker processes.
+Operations that grow the workspace `reserve` their change before making it:
+the quota check and the update happen under the same lock, so concurrent
+writers cannot both pass the check, and a change that then fails is
+released again.
+
+Drift from changes made outside of the tool is corrected by `reconcile`,
+which walks the workspace and rewrites the totals. It runs when a ledger is
+first created and then at most every `FS_USAGE_RECONCILE_SECONDS` (default
+3600) as part of a mutating operation.
+
+Files held only by workspace snapshots count against the quotas as well.
+The ledger records them separately: `record_snapshots` stores the storage
+measured after a snapshot is taken, and an update moves the files a snapshot
+still links from the workspace to the snapshots when the tool replaces or
+deletes them.
+
+Quotas are read from the environment; unset or 0 means unlimited:
+
+- `FS_QUOTA_BYTES`: maximum total size of the files in a workspace.
+- `FS_QUOTA_FILES`: maximum number of files in a workspace.
+
+Operators can print the usage of every workspace with::
+
+    python -m agent.tools.fs.usage user_data [--reconcile]
+"""
+
+import argparse
+import fcntl
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Iterator
+
+from agent.tools.fs.paths import state_dir
+from agent.tools.fs.snapshots import get_store
+
+LEDGER_NAME = "usage.json"
+DEFAULT_RECONCILE_SECONDS = 3600.0
+
+
+@dataclass
+class Usage:
+    """Stored bytes and file count of one workspace.
+
+    `snapshot_bytes` and `snapshot_files` are held only by its snapshots. In
+    the usage of a single path they are the part its snapshots also link.
+    """
+
+    bytes: int = 0
+    files: int = 0
+    reconciled_at: float = 0.0
+    snapshot_bytes: int = 0
+    snapshot_files: int = 0
+
+    @property
+    def total_bytes(self) -> int:
+        """Bytes counted against the quota."""
+        return self.bytes + self.snapshot_bytes
+
+    @property
+    def total_files(self) -> int:
+        """Files counted against the quota."""
+        return self.files + self.snapshot_files
+
+
+def measure(path: Path) -> Usage:
+    """Return the bytes and regular files stored at `path`, recursively.
+
+    Symlinks are not followed and count as nothing.
+    """
+    usage = Usage()
+    try:
+        st = path.lstat()
+    except OSError:
+        return usage
+    if not path.is_dir() or path.is_symlink():
+        if path.is_file() and not path.is_symlink():
+            usage.bytes, usage.files = st.st_size, 1
+        return usage
+    stack = [path]
+    while stack:
+        try:
+            with os.scandir(stack.pop()) as it:
+                for entry in it:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(Path(entry.path))
+                    elif entry.is_file(follow_symlinks=False):
+                        usage.bytes += entry.stat(follow_symlinks=False).st_size
+                        usage.files += 1
+        except OSError:
+            continue
+    return usage
+
+
+def quota_bytes() -> int:
+    """Return the byte quota, 0 meaning unlimited."""
+    return int(os.getenv("FS_QUOTA_BYTES", "0"))
+
+
+def quota_files() -> int:
+    """Return the file count quota, 0 meaning unlimited."""
+    return int(os.getenv("FS_QUOTA_FILES", "0"))
+
+
+def exceeded(usage: Usage, bytes_delta: int = 0, files_delta: int = 0) -> str | None:
+    """Return why `usage` changed by the deltas exceeds a quota, or None."""
+    max_bytes, max_files = quota_bytes(), quota_files()
+    held = (
+        f" ({usage.snapshot_bytes} of them held only by snapshots)"
+        if usage.snapshot_bytes
+        else ""
+    )
+    if max_bytes and usage.total_bytes + bytes_delta > max_bytes:
+        return (
+            f"Quota exceeded: the workspace would use "
+            f"{usage.total_bytes + bytes_delta} of {max_bytes} bytes{held}"
+        )
+    if max_files and usage.total_files + files_delta > max_files:
+        return (
+            f"Quota exceeded: the workspace would hold "
+            f"{usage.total_files + files_delta} of {max_files} files"
+        )
+    return None
+
+
+def reconcile_interval() -> float:
+    """Seconds between reconciliations of a ledger."""
+    return float(
+        os.getenv("FS_USAGE_RECONCILE_SECONDS", str(DEFAULT_RECONCILE_SECONDS))
+    )
+
+
+class UsageLedger:
+    """The persisted usage totals of one workspace."""
+
+    def __init__(self, root: Path, path: Path) -> None:
+        """Initialize the ledger of `root`, stored at `path`."""
+        self.root = root
+        self.path = path
+
+    @contextmanager
+    def _locked(self) -> Iterator[tuple[Usage | None, list[Usage]]]:
+        """Lock the ledger file and yield its content and a slot for updates."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self.path.open("a+", encoding="utf-8") as f:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                f.seek(0)
+                try:
+                    current: Usage | None = Usage(**json.loads(f.read()))
+                except (ValueError, TypeError):
+                    current = None
+                updated: list[Usage] = []
+                yield current, updated
+                if updated:
+                    f.seek(0)
+                    f.truncate()
+                    f.write(json.dumps(asdict(updated[-1])))
+                    f.flush()
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+    def read(self) -> Usage | None:
+        """Return the recorded usage, or None if there is no ledger yet."""
+        if not self.path.exists():
+            return None
+        with self._locked() as (current, _):
+            return current
+
+    def _measure(self) -> Usage:
+        usage = measure(self.root)
+        usage.snapshot_files, usage.snapshot_bytes = get_store(self.root).storage()
+        usage.reconciled_at = time.time()
+        return usage
+
+    @staticmethod
+    def _stale(usage: Usage) -> bool:
+        return time.time() - usage.reconciled_at > reconcile_interval()
+
+    def reconcile(self) -> Usage:
+        """Walk the workspace and its snapshots and record their actual usage."""
+        with self._locked() as (_, updated):
+            usage = self._measure()
+            updated.append(usage)
+        return usage
+
+    def current(self) -> Usage:
+        """Return the usage, reconciling first if the ledger is missing or old."""
+        usage = self.read()
+        if usage is None or self._stale(usage):
+            usage = self.reconcile()
+        return usage
+
+    def update(
+        self,
+        bytes_delta: int,
+        files_delta: int,
+        snapshot_bytes_delta: int = 0,
+        snapshot_files_delta: int = 0,
+    ) -> None:
+        """Apply a change made by the tool to the recorded usage.
+
+        The snapshot deltas are files that the change moved from the
+        workspace to the snapshots, or that deleting snapshots released.
+        """
+        if not (
+            bytes_delta or files_delta or snapshot_bytes_delta or snapshot_files_delta
+        ):
+            return
+        with self._locked() as (current, updated):
+            if current is None or self._stale(current):
+                # 账本缺失或过期时直接重新统计，本次变更已经落盘
+                updated.append(self._measure())
+                return
+            updated.append(
+                Usage(
+                    max(0, current.bytes + bytes_delta),
+                    max(0, current.files + files_delta),
+                    current.reconciled_at,
+                    max(0, current.snapshot_bytes + snapshot_bytes_delta),
+                    max(0, current.snapshot_files + snapshot_files_delta),
+                )
+            )
+
+    def reserve(
+        self,
+        bytes_delta: int,
+        files_delta: int,
+        snapshot_bytes_delta: int = 0,
+        snapshot_files_delta: int = 0,
+    ) -> str | None:
+        """Record a change about to be made if it fits the quotas.
+
+        A change that does not grow the workspace always fits. Release a
+        reservation whose change fails with `update` and negated deltas.
+
+        Returns:
+            Why the change would exceed a quota, or None if it was recorded.
+        """
+        growth = (
+            bytes_delta + snapshot_bytes_delta,
+            files_delta + snapshot_files_delta,
+        )
+        with self._locked() as (current, updated):
+            usage = current
+            if usage is None or self._stale(usage):
+                usage = self._measure()
+                updated.append(usage)
+            if (quota_bytes() or quota_files()) and (growth[0] > 0 or growth[1] > 0):
+                if error := exceeded(usage, max(0, growth[0]), max(0, growth[1])):
+                    return error
+            updated.append(
+                Usage(
+                    max(0, usage.bytes + bytes_delta),
+                    max(0, usage.files + files_delta),
+                    usage.reconciled_at,
+                    max(0, usage.snapshot_bytes + snapshot_bytes_delta),
+                    max(0, usage.snapshot_files + snapshot_files_delta),
+                )
+            )
+        return None
+
+    def record_snapshots(self, files: int, size: int) -> str | None:
+        """Record the storage held only by snapshots, as measured by `storage`.
+
+        Returns:
+            Why the snapshots do not fit the quotas, or None if they do.
+        """
+        with self._locked() as (current, updated):
+            usage = current
+            if usage is None or self._stale(usage):
+                usage = self._measure()
+            usage.snapshot_files, usage.snapshot_bytes = files, size
+            updated.append(usage)
+        if not (files or size):
+            return None
+        return exceeded(usage)
+
+    def check(self, bytes_delta: int, files_delta: int) -> str | None:
+        """Return why a change would exceed a quota, or None if it fits."""
+        if not (quota_bytes() or quota_files()):
+            return None
+        if bytes_delta <= 0 and files_delta <= 0:
+            return None
+        return exceeded(self.current(), max(0, bytes_delta), max(0, files_delta))
+
+
+_ledgers: dict[Path, UsageLedger] = {}
+_ledgers_lock = threading.Lock()
+
+
+def get_ledger(root: Path) -> UsageLedger:
+    """Return the ledger of the workspace `root`."""
+    with _ledgers_lock:
+        ledger = _ledgers.get(root)
+        if ledger is None:
+            ledger = _ledgers[root] = UsageLedger(root, state_dir(root) / LEDGER_NAME)
+        return ledger
+
+
+def usage_report(user_data: Path, reconcile: bool = False) -> dict[str, Usage | None]:
+    """Return the recorded usage of every workspace in `user_data`.
+
+    Workspaces without a ledger are reported as None unless `reconcile` is
+    set, in which case every workspace is measured and its ledger rewritten.
+    """
+    report: dict[str, Usage | None] = {}
+    for workspace in sorted(user_data.resolve().iterdir()):
+        if not workspace.is_dir() or workspace.name.startswith("."):
+            continue
+        ledger = get_ledger(workspace)
+        report[workspace.name] = ledger.reconcile() if reconcile else ledger.read()
+    return report
+
+
+def main() -> None:
+    """Print the usage of every workspace."""
+    parser = argparse.ArgumentParser(description="Show per-user workspace usage.")
+    parser.add_argument("user_data", type=Path, nargs="?", default=Path("user_data"))
+    parser.add_argument("--reconcile", action="store_true")
+    options = parser.parse_args()
+    lines = [
+        f"{'user':<32} {'bytes':>14} {'files':>10} {'snapshot bytes':>14}  reconciled"
+    ]
+    for user, usage in usage_report(options.user_data, options.reconcile).items():
+        if usage is None:
+            lines.append(f"{user:<32} {'?':>14} {'?':>10} {'?':>14}  never")
+            continue
+        reconciled = time.strftime(
+            "%Y-%m-%d %H:%M", time.localtime(usage.reconciled_at)
+        )
+        lines.append(
+            f"{user:<32} {usage.bytes:>14,} {usage.files:>10,} "
+            f"{usage.snapshot_bytes:>14,}  {reconciled}"
+        )
+    max_bytes, max_files = quota_bytes(), quota_files()
+    if max_bytes or max_files:
+        lines.append(
+            f"quota: {max_bytes or 'unlimited'} bytes, {max_files or 'unlimited'} files"
+        )
+    sys.stdout.write("\n".join(lines) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+"""Iterative, ignore-aware traversal of a workspace.
+
+`walk` is the single traversal engine behind list, glob and search. It reads
+directory listings from the workspace's `TreeSnapshot`, keeps an explicit
+stack instead of recursing, can stop at a maximum depth, and prunes whole
+subtrees matched by gitignore-style rules before they are listed.
+
+The rules are, in order (the last matching rule wins):
+
+1. `DEFAULT_IGNORES` (`.git/`, `node_modules/`, `__pycache__/`).
+2. The workspace root's `.gitignore`.
+3. The workspace root's `.fsignore`, which can also re-include defaults,
+   e.g. with `!node_modules/`.
+
+Supported syntax: comments, `!` negation, trailing `/` for directories only,
+patterns anchored by a leading or inner `/`, and `*`, `?`, `[...]` and `**`
+wildcards. `.gitignore` files below the workspace root are not read.
+"""
+
+import glob as glob_module
+import re
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterator, NamedTuple
+
+from agent.tools.fs.tree import Entry, TreeSnapshot, get_snapshot
+
+DEFAULT_IGNORES = (".git/", "node_modules/", "__pycache__/")
+IGNORE_FILES = (".gitignore", ".fsignore")
+
+
+@dataclass(frozen=True)
+class IgnoreRule:
+    """One compiled gitignore-style pattern."""
+
+    regex: re.Pattern[str]
+    negated: bool
+    dir_only: bool
+
+
+def _compile_rule(line: str) -> IgnoreRule | None:
+    line = line.rstrip("\n").rstrip()
+    if not line or line.startswith("#"):
+        return None
+    negated = line.startswith("!")
+    if negated:
+        line = line[1:]
+    elif line.startswith("\\"):
+        line = line[1:]
+    dir_only = line.endswith("/")
+    line = line.rstrip("/")
+    if not line:
+        return None
+    # 不含中间斜杠的模式在任意层级匹配文件名，否则相对根目录锚定
+    if "/" not in line:
+        line = "**/" + line
+    line = line.lstrip("/")
+    regex = glob_module.translate(line, recursive=True, include_hidden=True)
+    return IgnoreRule(re.compile(regex), negated, dir_only)
+
+
+class IgnoreRules:
+    """An ordered list of gitignore-style rules."""
+
+    def __init__(self, lines: list[str] | tuple[str, ...] = ()) -> None:
+        """Compile `lines` into rules."""
+        self.rules = [r for r in map(_compile_rule, lines) if r is not None]
+
+    def __bool__(self) -> bool:
+        """Whether there is any rule at all."""
+        return bool(self.rules)
+
+    def ignored(self, rel: str, is_dir: bool) -> bool:
+        """Whether the workspace-relative path `rel` is excluded."""
+        excluded = False
+        for rule in self.rules:
+            if rule.dir_only and not is_dir:
+                continue
+            if rule.regex.fullmatch(rel):
+                excluded = not rule.negated
+        return excluded
+
+    def excludes(self, rel: str) -> bool:
+        """Whether `walk` skips the file `rel`, itself or through a parent."""
+        parts = rel.split("/")
+        for i in range(1, len(parts)):
+            if self.ignored("/".join(parts[:i]), True):
+                return True
+        return self.ignored(rel, False)
+
+
+_rules_cache: dict[Path, tuple[tuple[int, ...], IgnoreRules]] = {}
+_rules_lock = threading.Lock()
+
+
+def load_rules(root: Path) -> IgnoreRules:
+    """Return the default rules plus those of the root ignore files."""
+    stamps = []
+    for name in IGNORE_FILES:
+        try:
+            stamps.append((root / name).stat().st_mtime_ns)
+        except OSError:
+            stamps.append(-1)
+    key = tuple(stamps)
+    with _rules_lock:
+        cached = _rules_cache.get(root)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+    lines = list(DEFAULT_IGNORES)
+    for name, stamp in zip(IGNORE_FILES, stamps):
+        if stamp >= 0:
+            try:
+                lines += (root / name).read_text(encoding="utf-8").splitlines()
+            except (OSError, UnicodeDecodeError):
+                continue
+    rules = IgnoreRules(lines)
+    with _rules_lock:
+        _rules_cache[root] = (key, rules)
+    return rules
+
+
+class Node(NamedTuple):
+    """One entry produced by `walk`."""
+
+    rel: str
+    entry: Entry
+    depth: int
+    is_last: bool
+    # 目录未展开的原因：None 表示已展开或不是目录
+    pruned: str | None = None
+
+
+def walk(
+    root: Path,
+    rel_dir: str = "",
+    *,
+    max_depth: int | None = None,
+    rules: IgnoreRules | None = None,
+    include_ignored: bool = False,
+    sizes: bool = False,
+    snapshot: TreeSnapshot | None = None,
+) -> Iterator[Node]:
+    """Yield the entries below `rel_dir` in sorted, depth-first order.
+
+    Entries directly inside `rel_dir` have depth 1. Directories at
+    `max_depth` are yielded with `pruned="depth"` and not descended into.
+    Paths excluded by `rules` are skipped, except that ignored directories
+    are yielded with `pruned="ignored"` if `include_ignored` is set.
+    Directory symlinks are yielded but never followed. `rel_dir` itself is
+    not checked against the rules, so an ignored directory can still be
+    walked when asked for explicitly. File sizes are only filled in when
+    `sizes` is set.
+    """
+    snapshot = snapshot or get_snapshot(root)
+
+    def children(parent: str) -> Iterator[tuple[Entry, bool, bool]]:
+        kept = []
+        for entry in snapshot.listing(parent, sizes=sizes):
+            rel = f"{parent}/{entry.name}" if parent else entry.name
+            ignored = bool(rules and rules.ignored(rel, entry.is_dir))
+            if ignored and not (include_ignored and entry.is_dir):
+                continue
+            kept.append((entry, ignored))
+        last = len(kept) - 1
+        return ((e, ignored, i == last) for i, (e, ignored) in enumerate(kept))
+
+    stack = [(children(rel_dir), rel_dir, 1)]
+    while stack:
+        entries, parent, depth = stack[-1]
+        item = next(entries, None)
+        if item is None:
+            stack.pop()
+            continue
+        entry, ignored, is_last = item
+        rel = f"{parent}/{entry.name}" if parent else entry.name
+        pruned = None
+        if entry.is_dir and not entry.is_symlink:
+            if ignored:
+                pruned = "ignored"
+            elif max_depth is not None and depth >= max_depth:
+                pruned = "depth"
+        yield Node(rel, entry, depth, is_last, pruned)
+        if entry.is_dir and not entry.is_symlink and pruned is None:
+            stack.append((children(rel), rel, depth + 1))
+
+
+@dataclass
+class DirSummary:
+    """File count and total size of a directory subtree."""
+
+    files: int = 0
+    size: int = 0
+
+    def __str__(self) -> str:
+        """Format like `1,204 files, 3.2 MB`."""
+        return f"{self.files:,} files, {format_size(self.size)}"
+
+
+def summarize(
+    root: Path,
+    rel_dir: str,
+    *,
+    rules: IgnoreRules | None = None,
+    snapshot: TreeSnapshot | None = None,
+) -> DirSummary:
+    """Count the files below `rel_dir` that are not excluded by `rules`."""
+    summary = DirSummary()
+    for node in walk(root, rel_dir, rules=rules, sizes=True, snapshot=snapshot):
+        if node.entry.is_file:
+            summary.files += 1
+            summary.size += node.entry.size
+    return summary
+
+
+def format_size(size: int) -> str:
+    """Format a byte count with a binary unit, e.g. `3.2 MB`."""
+    value = float(size)
+    for unit in ("B", "KB", "MB", "GB"):
+        if value < 1024 or unit == "GB":
+            break
+        value /= 1024
+    if unit == "B":
+        return f"{size} B"
+    return f"{value:.1f} {unit}"
@@ -0,0 +1,94 @@
+"""Measure the disk and throughput trade-off of transparent compression.
+
+For every storage mode a workspace of generated chapters is written through
+the tool, then searched and paged through with the content cache cleared
+before each call, so every read decodes the files again.
+
+Run with::
+
+    python tests/benchmarks/bench_fs_compress.py --files 20 --lines 20000
+"""
+
+import argparse
+import os
+import random
+import time
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from agent.tools.filesystem import FSOperation, _fs_opt
+from agent.tools.fs.content import content_cache
+
+WORDS = (
+    "the night was cold and the road was long she said nothing he walked on "
+    "toward the river where lanterns burned low above the silent water"
+).split()
+
+
+def _chapter(lines: int, rng: random.Random) -> str:
+    return "".join(
+        f"{i}: {' '.join(rng.choices(WORDS, k=12))}\n" for i in range(1, lines + 1)
+    )
+
+
+def _timed(runs: int, call) -> float:
+    start = time.perf_counter()
+    for _ in range(runs):
+        content_cache.clear()
+        call()
+    return (time.perf_counter() - start) / runs
+
+
+def bench(mode: str, chapters: list[str], runs: int) -> None:
+    os.environ["FS_COMPRESS"] = mode
+    logical = sum(len(c.encode("utf-8")) for c in chapters)
+    with TemporaryDirectory() as temp_dir:
+        root = Path(temp_dir).absolute()
+        start = time.perf_counter()
+        for i, chapter in enumerate(chapters):
+            op = FSOperation(
+                operation="write",
+                path=f"chapter_{i:03d}.txt",
+                content=chapter,
+                write_append=False,
+            )
+            _fs_opt(op, root)
+        write = time.perf_counter() - start
+        stored = sum(p.stat().st_size for p in root.iterdir())
+
+        search = FSOperation(operation="search", query="lanterns burned river")
+        search_time = _timed(runs, lambda: _fs_opt(search, root))
+        read = FSOperation(
+            operation="read",
+            path="chapter_000.txt",
+            read_offset=len(chapters[0].splitlines()) // 2,
+            read_length=100,
+        )
+        read_time = _timed(runs, lambda: _fs_opt(read, root))
+
+    mb = logical / 1e6
+    print(
+        f"{mode or 'plain':<6} disk={stored / 1e6:8.2f}MB ratio={logical / stored:5.2f} "
+        f"write={mb / write:8.1f}MB/s search={mb / search_time:8.1f}MB/s "
+        f"read_page={read_time * 1000:8.2f}ms"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--files", type=int, default=20)
+    parser.add_argument("--lines", type=int, default=20000)
+    parser.add_argument("--runs", type=int, default=5)
+    options = parser.parse_args()
+
+    os.environ["FS_AUTO_SNAPSHOT"] = "off"
+    rng = random.Random(0)
+    chapters = [_chapter(options.lines, rng) for _ in range(options.files)]
+    with TemporaryDirectory() as state_dir:
+        os.environ["FS_STATE_DIR"] = state_dir
+        for mode in ("", "zlib", "lzma"):
+            bench(mode, chapters, options.runs)
+
+
+if __name__ == "__main__":
+    main()
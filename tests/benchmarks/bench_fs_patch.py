@@ -0,0 +1,93 @@
+"""Compare the in-process diff applier with the external `patch` binary.
+
+Each call applies a small hunk to a file and then reverts it, so every
+iteration patches the same content.
+
+Run with::
+
+    python tests/benchmarks/bench_fs_patch.py --calls 200 --lines 5000
+"""
+
+import argparse
+import shutil
+import statistics
+import subprocess as sp
+import time
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from agent.tools.filesystem import FSOperation, patch_file
+
+
+def _report(name: str, samples: list[float]) -> None:
+    samples_ms = sorted(s * 1000 for s in samples)
+    p95 = samples_ms[int(len(samples_ms) * 0.95) - 1]
+    print(
+        f"{name:<12} mean={statistics.mean(samples_ms):8.3f}ms "
+        f"p50={statistics.median(samples_ms):8.3f}ms p95={p95:8.3f}ms"
+    )
+
+
+def _patches(line: int) -> tuple[str, str]:
+    forward = (
+        f"--- bench.txt\n+++ bench.txt\n@@ -{line},3 +{line},3 @@\n"
+        f" line {line}\n-line {line + 1}\n+patched {line + 1}\n line {line + 2}\n"
+    )
+    backward = (
+        f"--- bench.txt\n+++ bench.txt\n@@ -{line},3 +{line},3 @@\n"
+        f" line {line}\n-patched {line + 1}\n+line {line + 1}\n line {line + 2}\n"
+    )
+    return forward, backward
+
+
+def bench_subprocess(root: Path, patches: tuple[str, str], calls: int) -> list[float]:
+    samples = []
+    for i in range(calls):
+        content = patches[i % 2].encode("utf-8")
+        start = time.perf_counter()
+        proc = sp.Popen(
+            ["patch", "-p", "0"],
+            stdin=sp.PIPE,
+            stdout=sp.PIPE,
+            stderr=sp.STDOUT,
+            cwd=root,
+        )
+        stdout, _ = proc.communicate(input=content, timeout=10)
+        samples.append(time.perf_counter() - start)
+        assert proc.returncode == 0, stdout
+    return samples
+
+
+def bench_in_process(root: Path, patches: tuple[str, str], calls: int) -> list[float]:
+    samples = []
+    for i in range(calls):
+        op = FSOperation(operation="patch", path="bench.txt", content=patches[i % 2])
+        start = time.perf_counter()
+        result = patch_file(op, root)
+        samples.append(time.perf_counter() - start)
+        assert result == "Content patched to file 'bench.txt'", result
+    return samples
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--lines", type=int, default=5000)
+    options = parser.parse_args()
+
+    with TemporaryDirectory() as temp_dir:
+        root = Path(temp_dir).absolute()
+        (root / "bench.txt").write_text(
+            "".join(f"line {i}\n" for i in range(1, options.lines + 1)),
+            encoding="utf-8",
+        )
+        patches = _patches(options.lines // 2)
+        if shutil.which("patch"):
+            _report("subprocess", bench_subprocess(root, patches, options.calls))
+        else:
+            print("subprocess   skipped, `patch` is not installed")
+        _report("in-process", bench_in_process(root, patches, options.calls))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""Compare per-call latency of a fresh mp.Pool against the shared worker pool.
+
+Run with::
+
+    python tests/benchmarks/bench_fs_pool.py --calls 50
+"""
+
+import argparse
+import multiprocessing as mp
+import statistics
+import time
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from agent.tools.filesystem import FSOperation, _fs_opt
+from agent.tools.fs.pool import FSWorkerPool
+
+
+def _report(name: str, samples: list[float]) -> None:
+    samples_ms = sorted(s * 1000 for s in samples)
+    p95 = samples_ms[int(len(samples_ms) * 0.95) - 1]
+    print(
+        f"{name:<12} mean={statistics.mean(samples_ms):8.2f}ms "
+        f"p50={statistics.median(samples_ms):8.2f}ms p95={p95:8.2f}ms"
+    )
+
+
+def bench_fresh_pool(op: FSOperation, root: Path, calls: int) -> list[float]:
+    samples = []
+    for _ in range(calls):
+        start = time.perf_counter()
+        pool = mp.Pool(processes=1)
+        pool.apply(_fs_opt, (op, root))
+        samples.append(time.perf_counter() - start)
+        # 旧实现不会关闭 pool，这里在计时之外回收，避免压测时耗尽进程
+        pool.terminate()
+    return samples
+
+
+def bench_shared_pool(
+    op: FSOperation, root: Path, calls: int, processes: int
+) -> list[float]:
+    samples = []
+    with FSWorkerPool(processes=processes) as pool:
+        pool.warmup()
+        for _ in range(calls):
+            start = time.perf_counter()
+            pool.apply(_fs_opt, (op, root))
+            samples.append(time.perf_counter() - start)
+    return samples
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--calls", type=int, default=50)
+    parser.add_argument("--processes", type=int, default=2)
+    options = parser.parse_args()
+
+    with TemporaryDirectory() as temp_dir:
+        root = Path(temp_dir).absolute()
+        (root / "bench.txt").write_text("line\n" * 100, encoding="utf-8")
+        op = FSOperation(
+            operation="read",
+            args={"path": "bench.txt", "read_offset": 0, "read_length": 10},
+        )
+        _report("fresh pool", bench_fresh_pool(op, root, options.calls))
+        _report(
+            "shared pool",
+            bench_shared_pool(op, root, options.calls, options.processes),
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""Compare the sequential rglob search with the parallel search engine.
+
+Run with::
+
+    python tests/benchmarks/bench_fs_search.py --files 10000
+"""
+
+import argparse
+import random
+import re
+import time
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from agent.tools.fs.search import iter_files, search
+from agent.tools.fs.trigram import TrigramIndex
+
+WORDS = ["alpha", "beta", "gamma", "delta", "chapter", "novel", "log", "error"]
+
+
+def make_workspace(root: Path, files: int, lines: int, seed: int = 0) -> None:
+    rng = random.Random(seed)
+    for i in range(files):
+        directory = root / f"d{i % 50:02d}" / f"s{i % 7}"
+        directory.mkdir(parents=True, exist_ok=True)
+        if i % 100 == 0:
+            (directory / f"f{i:05d}.bin").write_bytes(rng.randbytes(4096))
+            continue
+        body = "\n".join(
+            " ".join(rng.choice(WORDS) for _ in range(10)) for _ in range(lines)
+        )
+        if i % 97 == 0:
+            body += "\nneedle in a haystack"
+        (directory / f"f{i:05d}.txt").write_text(body, encoding="utf-8")
+
+
+def legacy_search(root: Path, pattern: re.Pattern[str]) -> list[str]:
+    results = []
+    for file_path in root.rglob("*"):
+        if file_path.is_file():
+            with file_path.open("r", encoding="utf-8", errors="ignore") as f:
+                for line_num, line in enumerate(f, 1):
+                    if pattern.search(line):
+                        results.append(f"{file_path}:{line_num}: {line.strip()}")
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--files", type=int, default=10000)
+    parser.add_argument("--lines", type=int, default=20)
+    options = parser.parse_args()
+
+    with TemporaryDirectory() as temp_dir:
+        root = Path(temp_dir).resolve()
+        make_workspace(root, options.files, options.lines)
+        pattern = re.compile(r"needle \w+")
+
+        start = time.perf_counter()
+        legacy = legacy_search(root, pattern)
+        print(f"legacy      {time.perf_counter() - start:8.3f}s {len(legacy)} matches")
+
+        start = time.perf_counter()
+        results, stats = search(iter_files(root), pattern)
+        print(
+            f"engine      {time.perf_counter() - start:8.3f}s {len(results)} matches "
+            f"({stats.summary()}, {stats.binary_skipped} binary skipped)"
+        )
+
+        start = time.perf_counter()
+        results, stats = search(iter_files(root), pattern, max_results=10)
+        print(
+            f"engine top10 {time.perf_counter() - start:7.3f}s {len(results)} matches "
+            f"({stats.summary()})"
+        )
+
+        index = TrigramIndex(root, Path(temp_dir + "-index"))
+        start = time.perf_counter()
+        index.rebuild()
+        print(f"index build {time.perf_counter() - start:8.3f}s {len(index)} files")
+        for _ in range(2):
+            start = time.perf_counter()
+            index.refresh(max_age=5)
+            files = index.candidates(pattern)
+            results, stats = search(files, pattern)
+            print(
+                f"indexed     {time.perf_counter() - start:8.3f}s {len(results)} matches "
+                f"({stats.summary()})"
+            )
+
+
+if __name__ == "__main__":
+    main()
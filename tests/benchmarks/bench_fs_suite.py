@@ -0,0 +1,272 @@
+"""Time every filesystem operation on synthetic workspaces.
+
+Each workspace shape is generated under a temporary `user_data` directory,
+then every operation is run `--runs` times through the `fs_opt` tool, which
+includes argument validation and the worker pool, and through `_fs_opt`
+directly. The report lists the p50 and p95 latency and the throughput of
+each operation.
+
+Shapes:
+
+- `wide`: `--files` files spread over directories of 100 files.
+- `deep`: `--files` files spread along a chain of `--depth` nested directories.
+- `large`: a single file of `--large-mb` megabytes and a few small ones.
+
+Results can be saved with `--save` and compared against a saved baseline
+with `--baseline`; the script exits with status 1 when the p50 of an
+operation is more than `--tolerance` slower than in the baseline.
+
+Run with::
+
+    python tests/benchmarks/bench_fs_suite.py --shapes wide,deep,large --files 1000
+    python tests/benchmarks/bench_fs_suite.py --save .benchmarks/fs.json
+    python tests/benchmarks/bench_fs_suite.py --baseline .benchmarks/fs.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from typing import Callable
+
+from agent.tools import filesystem as fs
+from agent.tools.filesystem import FSOperation, _fs_opt
+from agent.tools.fs.content import content_cache
+from agent.tools.fs.pool import shutdown_pool
+
+WORDS = (
+    "the night was cold and the road was long she said nothing he walked on "
+    "toward the river where lanterns burned low above the silent water"
+).split()
+USER = "bench"
+FILES_PER_DIR = 100
+
+
+class _Runtime:
+    def __init__(self, user_id: str) -> None:
+        self.context = {"user_id": user_id}
+
+
+def _text(lines: int, rng: random.Random, needle: bool = False) -> str:
+    body = [f"{i}: {' '.join(rng.choices(WORDS, k=10))}\n" for i in range(lines)]
+    if needle:
+        body[len(body) // 2] = "needle in a haystack\n"
+    return "".join(body)
+
+
+def make_workspace(root: Path, shape: str, options: argparse.Namespace) -> list[str]:
+    """Generate the workspace `shape` in `root` and return its text files."""
+    rng = random.Random(0)
+    files = []
+    if shape == "large":
+        lines = options.large_mb * 1024 * 1024 // 64
+        (root / "large.txt").write_text(_text(lines, rng, True), encoding="utf-8")
+        files.append("large.txt")
+        for i in range(3):
+            (root / f"small{i}.txt").write_text(_text(20, rng), encoding="utf-8")
+        return files
+    for i in range(options.files):
+        if shape == "wide":
+            directory = Path(f"d{i // FILES_PER_DIR:04d}")
+        else:
+            depth = i % options.depth
+            directory = Path(*(f"level{d}" for d in range(depth)))
+        (root / directory).mkdir(parents=True, exist_ok=True)
+        rel = (directory / f"f{i:06d}.txt").as_posix()
+        text = _text(options.lines, rng, needle=i % 97 == 0)
+        (root / rel).write_text(text, encoding="utf-8")
+        files.append(rel)
+    return files
+
+
+def operations(files: list[str]) -> dict[str, Callable[[int], FSOperation]]:
+    """Return a factory of the operation to run for each benchmark and run."""
+    target = files[len(files) // 2]
+    patch_target = "bench_patch.txt"
+    forward = (
+        f"--- {patch_target}\n+++ {patch_target}\n@@ -1,2 +1,2 @@\n"
+        " first\n-second\n+patched\n"
+    )
+    backward = (
+        f"--- {patch_target}\n+++ {patch_target}\n@@ -1,2 +1,2 @@\n"
+        " first\n-patched\n+second\n"
+    )
+    chunk = "x" * 4095 + "\n"
+    return {
+        "read": lambda i: FSOperation(
+            operation="read", path=target, read_offset=0, read_length=100
+        ),
+        "read_tail": lambda i: FSOperation(
+            operation="read",
+            path=target,
+            read_offset=0,
+            read_length=100,
+            read_mode="tail",
+        ),
+        "write": lambda i: FSOperation(
+            operation="write",
+            path=f"bench_out/{i % 10}.txt",
+            content=chunk,
+            write_append=False,
+        ),
+        "append": lambda i: FSOperation(
+            operation="write", path="bench_log.txt", content=chunk, write_append=True
+        ),
+        "patch": lambda i: FSOperation(
+            operation="patch",
+            path=patch_target,
+            content=forward if i % 2 == 0 else backward,
+        ),
+        "search": lambda i: FSOperation(operation="search", query=r"needle \w+"),
+        "glob": lambda i: FSOperation(operation="glob", glob_pattern="**/*.txt"),
+        "list": lambda i: FSOperation(operation="list", path="."),
+        "replace": lambda i: FSOperation(
+            operation="replace",
+            glob_pattern="**/*.txt",
+            replace_pattern="needle",
+            content="pin",
+            dry_run=True,
+        ),
+    }
+
+
+def _summary(samples: list[float], runs: int, total: float) -> dict[str, float]:
+    samples_ms = sorted(s * 1000 for s in samples)
+    p95 = statistics.quantiles(samples_ms, n=20)[18] if len(samples) > 1 else 0.0
+    return {
+        "p50_ms": statistics.median(samples_ms),
+        "p95_ms": p95 or samples_ms[-1],
+        "ops_per_s": runs / total,
+    }
+
+
+def bench_shape(shape: str, options: argparse.Namespace) -> dict[str, dict]:
+    """Run every operation on the workspace `shape` through both entry points."""
+    results = {}
+    with TemporaryDirectory() as temp_dir:
+        cwd = os.getcwd()
+        os.chdir(temp_dir)
+        try:
+            root = (Path("user_data") / USER).absolute()
+            root.mkdir(parents=True)
+            start = time.perf_counter()
+            files = make_workspace(root, shape, options)
+            print(f"{shape}: generated in {time.perf_counter() - start:.2f}s")
+            (root / "bench_patch.txt").write_text("first\nsecond\n", encoding="utf-8")
+            runtime = _Runtime(USER)
+            entries = {
+                "fs_opt": lambda op: fs.fs_opt.invoke(
+                    {
+                        "operation": op.operation,
+                        "args": op.args.model_dump(exclude_none=True),
+                        "runtime": runtime,
+                    }
+                ),
+                "_fs_opt": lambda op: _fs_opt(op, root),
+            }
+            for name, make in operations(files).items():
+                if name in options.skip:
+                    continue
+                for entry, call in entries.items():
+                    samples = []
+                    call(make(0))  # 预热
+                    for i in range(options.runs):
+                        op = make(i + 1)
+                        if options.cold:
+                            content_cache.clear()
+                        start = time.perf_counter()
+                        result = call(op)
+                        samples.append(time.perf_counter() - start)
+                        if result.startswith("Error"):
+                            raise RuntimeError(f"{shape}/{name}: {result}")
+                    key = f"{shape}/{entry}/{name}"
+                    results[key] = _summary(samples, options.runs, sum(samples))
+                    _print(key, results[key])
+        finally:
+            os.chdir(cwd)
+            shutdown_pool()
+    return results
+
+
+def _print(key: str, result: dict[str, float], note: str = "") -> None:
+    print(
+        f"  {key:<28} p50={result['p50_ms']:9.3f}ms p95={result['p95_ms']:9.3f}ms "
+        f"{result['ops_per_s']:10.1f} ops/s{note}"
+    )
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Return the benchmarks whose p50 regressed beyond `tolerance`."""
+    regressions = []
+    print(f"compared with baseline of {baseline['meta']['created']}:")
+    for key, result in results.items():
+        base = baseline["results"].get(key)
+        if base is None:
+            continue
+        ratio = result["p50_ms"] / base["p50_ms"] if base["p50_ms"] else 1.0
+        regressed = ratio > 1 + tolerance
+        if regressed:
+            regressions.append(key)
+        _print(key, result, f"  x{ratio:5.2f}{'  REGRESSION' if regressed else ''}")
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--shapes", default="wide,deep,large")
+    parser.add_argument("--files", type=int, default=1000)
+    parser.add_argument("--lines", type=int, default=50)
+    parser.add_argument("--depth", type=int, default=20)
+    parser.add_argument("--large-mb", type=int, default=20)
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--skip", default="", help="comma separated operations")
+    parser.add_argument("--cold", action="store_true", help="clear the cache per run")
+    parser.add_argument("--save", type=Path, help="write the results as a baseline")
+    parser.add_argument("--baseline", type=Path, help="compare with a baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    options = parser.parse_args()
+    options.skip = set(filter(None, options.skip.split(",")))
+
+    # 自动快照会复制整个工作区，单独测量
+    os.environ.setdefault("FS_AUTO_SNAPSHOT", "off")
+    results = {}
+    with TemporaryDirectory() as state_dir:
+        os.environ["FS_STATE_DIR"] = state_dir
+        for shape in options.shapes.split(","):
+            results.update(bench_shape(shape, options))
+
+    report = {
+        "meta": {
+            "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "options": {
+                k: v
+                for k, v in vars(options).items()
+                if k in ("files", "lines", "runs")
+            },
+        },
+        "results": results,
+    }
+    if options.save:
+        options.save.parent.mkdir(parents=True, exist_ok=True)
+        options.save.write_text(json.dumps(report, indent=2), encoding="utf-8")
+        print(f"results saved to {options.save}")
+    if options.baseline:
+        baseline = json.loads(options.baseline.read_text(encoding="utf-8"))
+        regressions = compare(results, baseline, options.tolerance)
+        if regressions:
+            print(f"{len(regressions)} regressions beyond {options.tolerance:.0%}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""Compare a fresh HTTP client per model with the shared connection pool.
+
+A local OpenAI-compatible stub answers every chat completion at once, so the
+measured latency is the client overhead: building the model, opening the
+connection and the HTTP round trip. The stub serves plain HTTP; with TLS the
+difference is larger because every new connection also needs a handshake.
+
+Run with::
+
+    python tests/benchmarks/bench_llm_http.py --calls 200
+"""
+
+import argparse
+import json
+import os
+import statistics
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from langchain_openai import ChatOpenAI
+
+from agent import http_pool
+from agent.agent import MODEL, clear_agent_cache, create_custom_agent
+
+COMPLETION = json.dumps(
+    {
+        "id": "chatcmpl-1",
+        "object": "chat.completion",
+        "created": 0,
+        "model": MODEL,
+        "choices": [
+            {
+                "index": 0,
+                "message": {"role": "assistant", "content": "pong"},
+                "finish_reason": "stop",
+            }
+        ],
+        "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+    }
+).encode()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # 头和正文一起发送，避免 Nagle 与延迟 ACK 叠加的 40ms 等待
+    wbufsize = 1 << 16
+
+    def do_POST(self) -> None:
+        self.rfile.read(int(self.headers["Content-Length"]))
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(COMPLETION)))
+        self.end_headers()
+        self.wfile.write(COMPLETION)
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+def _report(name: str, samples: list[float]) -> None:
+    samples_ms = sorted(s * 1000 for s in samples)
+    p95 = samples_ms[int(len(samples_ms) * 0.95) - 1]
+    print(
+        f"{name:<12} mean={statistics.mean(samples_ms):8.3f}ms "
+        f"p50={statistics.median(samples_ms):8.3f}ms p95={p95:8.3f}ms"
+    )
+
+
+def _timed(calls: int, make) -> list[float]:
+    samples = []
+    for _ in range(calls):
+        start = time.perf_counter()
+        make().invoke("ping")
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--calls", type=int, default=200)
+    options = parser.parse_args()
+
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    os.environ["OPENAI_API_KEY"] = "sk-bench"
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{httpd.server_port}/v1"
+    try:
+        # 旧实现：每个节点每一步都新建模型和 HTTP 客户端
+        _report(
+            "fresh client",
+            _timed(
+                options.calls,
+                lambda: ChatOpenAI(
+                    model=MODEL,
+                    api_key=os.environ["OPENAI_API_KEY"],
+                    base_url=os.environ["OPENAI_BASE_URL"],
+                ),
+            ),
+        )
+        clear_agent_cache()
+        http_pool.reset_pool()
+        _report(
+            "shared pool",
+            _timed(options.calls, lambda: create_custom_agent(use_tools=False)),
+        )
+        print(f"pool metrics {http_pool.pool_metrics()}")
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""Measure the near-duplicate lookup cost against an LLM round trip.
+
+A near lookup computes the MinHash signature of the conversation text, its
+LSH band keys and the similarity to each candidate sharing a band. The
+signature dominates; the benchmark compares it with the earlier version that
+applied 128 affine permutations to every shingle hash. The largest text is
+about the 128k-token context window of the default model.
+
+Run with::
+
+    python tests/benchmarks/bench_minhash.py --round-trip 0.5
+"""
+
+import argparse
+import hashlib
+import random
+import time
+from array import array
+
+from agent.minhash import NUM_PERM, band_keys, shingles, signature, similarity
+
+_PRIME = (1 << 61) - 1
+_rng = random.Random(20240601)
+_PERMUTATIONS = [
+    (_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(NUM_PERM)
+]
+
+
+def legacy_signature(text: str) -> array[int]:
+    hashes = [
+        int.from_bytes(hashlib.blake2b(s.encode(), digest_size=8).digest(), "little")
+        for s in shingles(text)
+    ]
+    return array(
+        "Q",
+        (min((a * h + b) % _PRIME for h in hashes) for a, b in _PERMUTATIONS),
+    )
+
+
+def make_text(size: int, seed: int = 0) -> str:
+    rng = random.Random(seed)
+    words = ["".join(rng.choices("abcdefghijklmnop", k=6)) for _ in range(5000)]
+    return " ".join(rng.choice(words) for _ in range(size // 7))
+
+
+def timed(fn, *args) -> float:
+    start = time.perf_counter()
+    fn(*args)
+    return time.perf_counter() - start
+
+
+def near_lookup(text: str, candidates: list[array[int]]) -> None:
+    sig = signature(text)
+    band_keys(sig)
+    max(similarity(sig, c) for c in candidates)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--round-trip", type=float, default=0.5)
+    parser.add_argument("--candidates", type=int, default=50)
+    options = parser.parse_args()
+
+    candidates = [
+        signature(make_text(4000, seed)) for seed in range(options.candidates)
+    ]
+    for size in (1_000, 10_000, 100_000, 500_000):
+        text = make_text(size)
+        # 旧实现在整个上下文窗口上要跑十几秒，跳过
+        legacy = f"{timed(legacy_signature, text):8.4f}s" if size <= 100_000 else "-"
+        current = timed(signature, text)
+        lookup = timed(near_lookup, text, candidates)
+        print(
+            f"{size:>9,} chars  legacy {legacy:>9}  signature {current:8.4f}s  "
+            f"lookup {lookup:8.4f}s ({lookup / options.round_trip:6.1%} of a round trip)"
+        )
+
+
+if __name__ == "__main__":
+    main()
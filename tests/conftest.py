@@ -4,3 +4,9 @@ import pytest
 @pytest.fixture(scope="session")
 def anyio_backend():
     return "asyncio"
+
+
+@pytest.fixture(autouse=True)
+def fs_state_dir(tmp_path_factory, monkeypatch):
+    """Keep the filesystem tool's private state out of the test workspaces."""
+    monkeypatch.setenv("FS_STATE_DIR", str(tmp_path_factory.mktemp("fs_state")))
@@ -0,0 +1,50 @@
+"""Test the cached agent factory."""
+
+import pytest
+from pydantic import BaseModel
+
+from agent import agent as agent_module
+from agent.agent import clear_agent_cache, create_custom_agent
+
+
+class _Answer(BaseModel):
+    text: str
+
+
+@pytest.fixture(autouse=True)
+def config(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+    monkeypatch.setenv("OPENAI_BASE_URL", "http://localhost:1/v1")
+    clear_agent_cache()
+    yield
+    clear_agent_cache()
+
+
+def test_agents_are_cached_by_output_model_and_tools() -> None:
+    plain = create_custom_agent(use_tools=False)
+    assert create_custom_agent(use_tools=False) is plain
+    assert create_custom_agent() is create_custom_agent()
+    assert create_custom_agent() is not plain
+    assert create_custom_agent(_Answer) is create_custom_agent(_Answer)
+    assert create_custom_agent(use_tools={"fs_opt"}) is create_custom_agent(
+        use_tools={"fs_opt"}
+    )
+    # 绑定工具或结构化输出的 runnable 共用同一个客户端
+    assert create_custom_agent(_Answer, use_tools=False).first.bound is plain
+
+
+def test_config_change_invalidates_cache(monkeypatch) -> None:
+    plain = create_custom_agent(use_tools=False)
+    monkeypatch.setenv("OPENAI_BASE_URL", "http://localhost:2/v1")
+    other = create_custom_agent(use_tools=False)
+    assert other is not plain
+    assert other.openai_api_base == "http://localhost:2/v1"
+
+
+def test_env_is_loaded_once(monkeypatch) -> None:
+    calls = []
+    monkeypatch.setattr(agent_module, "load_dotenv", lambda: calls.append(1))
+    clear_agent_cache(reload_env=True)
+    create_custom_agent(use_tools=False)
+    create_custom_agent(_Answer)
+    assert calls == [1]
@@ -0,0 +1,121 @@
+"""Test the buffered appender."""
+
+import threading
+import time
+from pathlib import Path
+
+import pytest
+from langgraph.graph import END, START, MessagesState, StateGraph
+
+from agent.tools import filesystem as fs
+from agent.tools.fs import appender as appender_module
+from agent.tools.fs.appender import Appender
+
+
+class _Runtime:
+    def __init__(self, user_id: str) -> None:
+        self.context = {"user_id": user_id}
+
+
+@pytest.fixture
+def runtime(tmp_path: Path, monkeypatch) -> _Runtime:
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("FS_APPEND_BUFFER_BYTES", "64")
+    monkeypatch.setenv("FS_APPEND_FLUSH_SECONDS", "60")
+    monkeypatch.setattr(appender_module, "_appender", None)
+    return _Runtime("alice")
+
+
+def _append(runtime: _Runtime, content: str) -> str:
+    args = {"path": "notes.txt", "content": content, "write_append": True}
+    return fs._fs_opt_tool("write", args, runtime)
+
+
+def test_appends_are_coalesced(runtime: _Runtime, tmp_path: Path) -> None:
+    path = tmp_path / "user_data" / "alice" / "notes.txt"
+    for i in range(5):
+        assert _append(runtime, f"n{i}\n") == "Content appended to file 'notes.txt'"
+    assert not path.exists()
+    assert fs._appender().flushes == 0
+
+    read = {"path": "notes.txt", "read_offset": 0, "read_length": 10}
+    assert fs._fs_opt_tool("read", read, runtime) == "n0\nn1\nn2\nn3\nn4\n"
+    assert fs._appender().flushes == 1
+
+    _append(runtime, "x" * 70)
+    assert path.read_text(encoding="utf-8").endswith("x" * 70)
+    assert fs._appender().flushes == 2
+
+
+def test_search_flushes_the_workspace(runtime: _Runtime) -> None:
+    _append(runtime, "needle\n")
+    assert fs._fs_opt_tool("search", {"query": "needle"}, runtime) == (
+        "notes.txt:1: needle"
+    )
+
+
+def test_flush_on_age(tmp_path: Path) -> None:
+    written = []
+
+    def write(root: Path, rel: str, content: str) -> str:
+        written.append((rel, content))
+        return "ok"
+
+    appender = Appender(write, max_bytes=1024, max_delay=0.05)
+    appender.append(tmp_path, "a.txt", tmp_path / "a.txt", "one ")
+    appender.append(tmp_path, "a.txt", tmp_path / "a.txt", "two")
+    deadline = time.monotonic() + 5
+    while not written and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert written == [("a.txt", "one two")]
+
+
+def test_failed_flush_is_reported(tmp_path: Path) -> None:
+    appender = Appender(lambda root, rel, content: "Error: disk full", max_bytes=1)
+    appender.append(tmp_path, "a.txt", tmp_path / "a.txt", "data")
+    assert appender.take_errors(tmp_path) == [
+        "Error: buffered append to 'a.txt' failed: Error: disk full"
+    ]
+    assert appender.take_errors(tmp_path) == []
+
+
+def test_appends_are_flushed_when_the_run_ends(
+    runtime: _Runtime, tmp_path: Path
+) -> None:
+    def node(state: MessagesState) -> dict:
+        _append(runtime, "note\n")
+        return {}
+
+    builder = StateGraph(MessagesState)
+    builder.add_node("notes", node)
+    builder.add_edge(START, "notes")
+    builder.add_edge("notes", END)
+    graph = builder.compile().with_config(callbacks=[fs.AppendFlusher()])
+    graph.invoke({"messages": []})
+    path = tmp_path / "user_data" / "alice" / "notes.txt"
+    assert path.read_text(encoding="utf-8") == "note\n"
+
+
+def test_flush_writes_outside_the_lock(tmp_path: Path) -> None:
+    started, release = threading.Event(), threading.Event()
+    written = []
+
+    def write(root: Path, rel: str, content: str) -> str:
+        if rel == "slow.txt":
+            started.set()
+            release.wait(5)
+        written.append((rel, content))
+        return "ok"
+
+    appender = Appender(write, max_bytes=4)
+    slow = threading.Thread(
+        target=appender.append, args=(tmp_path, "slow.txt", tmp_path / "s", "slow")
+    )
+    slow.start()
+    assert started.wait(5)
+    # 慢写入期间其他路径的追加不受影响
+    appender.append(tmp_path, "fast.txt", tmp_path / "f", "fast")
+    assert written == [("fast.txt", "fast")]
+    release.set()
+    slow.join()
+    assert written[-1] == ("slow.txt", "slow")
@@ -0,0 +1,110 @@
+"""Test the async filesystem tool implementations."""
+
+import asyncio
+import os
+import threading
+import time
+from pathlib import Path
+from unittest.mock import MagicMock
+
+import pytest
+from langchain.tools import ToolRuntime
+
+from agent.tools import filesystem as fs
+from agent.tools.fs import pool as pool_module
+from agent.tools.fs.pool import FSThreadPool, FSWorkerPool
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def runtime(tmp_path: Path, monkeypatch) -> ToolRuntime:
+    monkeypatch.chdir(tmp_path)
+    runtime = MagicMock(spec=ToolRuntime)
+    runtime.context = {"user_id": "async_user"}
+    return runtime
+
+
+async def test_ainvoke_runs_operation(runtime: ToolRuntime) -> None:
+    result = await fs.fs_opt.ainvoke(
+        {
+            "operation": "write",
+            "args": {"path": "a.txt", "content": "hi", "write_append": False},
+            "runtime": runtime,
+        }
+    )
+    assert result == "Content written to file 'a.txt'"
+    result = await fs.fs_batch.ainvoke(
+        {
+            "operations": [
+                {
+                    "operation": "read",
+                    "path": "a.txt",
+                    "read_offset": 0,
+                    "read_length": 1,
+                }
+            ],
+            "runtime": runtime,
+        }
+    )
+    assert '"result": "hi"' in result
+
+
+async def test_loop_stays_responsive(runtime: ToolRuntime, monkeypatch) -> None:
+    def slow_fs_opt(operation, cwd):
+        time.sleep(0.2)
+        return "done"
+
+    monkeypatch.setattr(fs, "_fs_opt", slow_fs_opt)
+    monkeypatch.setattr(pool_module, "_pool", FSThreadPool(threads=8))
+    gaps = []
+
+    async def heartbeat(stop: asyncio.Event) -> None:
+        last = time.perf_counter()
+        while not stop.is_set():
+            await asyncio.sleep(0.01)
+            now = time.perf_counter()
+            gaps.append(now - last)
+            last = now
+
+    stop = asyncio.Event()
+    beat = asyncio.create_task(heartbeat(stop))
+    start = time.perf_counter()
+    calls = [
+        fs.fs_opt.ainvoke(
+            {"operation": "glob", "args": {"glob_pattern": "*"}, "runtime": runtime}
+        )
+        for _ in range(8)
+    ]
+    assert await asyncio.gather(*calls) == ["done"] * 8
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await beat
+    pool_module.shutdown_pool()
+    assert elapsed < 0.2 * 4
+    assert max(gaps) < 0.15
+
+
+async def test_cancel_drops_queued_operation() -> None:
+    started = threading.Event()
+    release = threading.Event()
+    ran = []
+    with FSThreadPool(threads=1) as pool:
+        blocker = pool.submit(lambda: (started.set(), release.wait(5)))
+        started.wait(5)
+        task = asyncio.create_task(pool.run(ran.append, (1,)))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        release.set()
+        blocker.result()
+    assert ran == []
+
+
+async def test_process_pool_run() -> None:
+    with FSWorkerPool(processes=1) as pool:
+        pid = await pool.run(os.getpid)
+        with pytest.raises(ZeroDivisionError):
+            await pool.run(divmod, (1, 0))
+    assert pid != os.getpid()
@@ -0,0 +1,81 @@
+"""Test batched filesystem operations."""
+
+import json
+import threading
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest.mock import MagicMock
+
+from langchain.tools import ToolRuntime
+
+from agent.tools import filesystem as fs
+from agent.tools.filesystem import FSOperation
+from agent.tools.fs.batch import run_batch
+
+
+def test_run_batch_orders_and_parallelises() -> None:
+    barrier = threading.Barrier(3, timeout=5)
+    events: list[str] = []
+
+    def run(item: str) -> str:
+        if item.startswith("r"):
+            # 三个读操作必须同时在执行，否则 barrier 超时
+            barrier.wait()
+        events.append(item)
+        return item.upper()
+
+    items = ["w1", "r1", "r2", "r3", "w2"]
+    results = run_batch(items, run, lambda item: item.startswith("r"))
+    assert results == ["W1", "R1", "R2", "R3", "W2"]
+    assert events[0] == "w1" and events[-1] == "w2"
+
+
+def test_fs_batch_results() -> None:
+    with TemporaryDirectory() as temp_dir:
+        root = Path(temp_dir).resolve()
+        operations = [
+            FSOperation(
+                operation="write", path="a.txt", content="x", write_append=False
+            ),
+            FSOperation(operation="read", path="a.txt", read_offset=0, read_length=1),
+            FSOperation(operation="read", path="b.txt", read_offset=0, read_length=1),
+            FSOperation(operation="glob", glob_pattern="*.txt"),
+        ]
+        results = json.loads(fs._fs_batch(operations, root))
+        assert [r["result"] for r in results] == [
+            "Content written to file 'a.txt'",
+            "x",
+            "Error: File 'b.txt' does not exist",
+            "a.txt",
+        ]
+        assert [r["ok"] for r in results] == [True, True, False, True]
+        assert results[1] == {
+            "index": 1,
+            "operation": "read",
+            "path": "a.txt",
+            "ok": True,
+            "result": "x",
+        }
+
+
+def test_fs_batch_tool(tmp_path: Path, monkeypatch) -> None:
+    monkeypatch.chdir(tmp_path)
+    runtime = MagicMock(spec=ToolRuntime)
+    runtime.context = {"user_id": "test_user"}
+    result = fs.fs_batch.invoke(
+        {
+            "operations": [
+                {
+                    "operation": "write",
+                    "path": "a.txt",
+                    "content": "hi",
+                    "write_append": False,
+                },
+                {"operation": "list", "args": {"path": "."}},
+            ],
+            "runtime": runtime,
+        }
+    )
+    results = json.loads(result)
+    assert results[1]["result"] == "Directory: .\n└── a.txt (2 bytes)"
+    assert (tmp_path / "user_data" / "test_user" / "a.txt").read_text() == "hi"
@@ -0,0 +1,112 @@
+"""Test transparent compression of workspace files."""
+
+from pathlib import Path
+
+import pytest
+
+from agent.tools import filesystem as fs
+from agent.tools.filesystem import FSOperation
+from agent.tools.fs.compress import file_codec, open_decoded
+from agent.tools.fs.content import content_cache
+
+CHAPTER = "".join(f"line {i}: the quick brown fox\n" for i in range(1, 2001))
+
+
+@pytest.fixture(params=["zlib", "lzma"])
+def workspace(tmp_path: Path, monkeypatch, request) -> Path:
+    monkeypatch.setenv("FS_COMPRESS", request.param)
+    monkeypatch.setenv("FS_COMPRESS_MIN_SIZE", "4096")
+    root = (tmp_path / "alice").resolve()
+    root.mkdir()
+    op = FSOperation(
+        operation="write", path="chapter.txt", content=CHAPTER, write_append=False
+    )
+    assert fs._fs_opt(op, root) == "Content written to file 'chapter.txt'"
+    return root
+
+
+def _read(root: Path, offset: int, length: int, mode: str = "lines") -> str:
+    op = FSOperation(
+        operation="read",
+        path="chapter.txt",
+        read_offset=offset,
+        read_length=length,
+        read_mode=mode,
+    )
+    return fs._fs_opt(op, root)
+
+
+def test_large_files_are_stored_compressed(workspace: Path) -> None:
+    path = workspace / "chapter.txt"
+    assert file_codec(path) is not None
+    assert path.stat().st_size < len(CHAPTER) // 5
+    small = FSOperation(
+        operation="write", path="s.txt", content="hi", write_append=False
+    )
+    fs._fs_opt(small, workspace)
+    assert (workspace / "s.txt").read_bytes() == b"hi"
+
+
+def test_read_modes(workspace: Path) -> None:
+    assert _read(workspace, 9, 2) == (
+        "line 10: the quick brown fox\nline 11: the quick brown fox\n"
+    )
+    assert _read(workspace, 1, 1, "tail") == "line 1999: the quick brown fox\n"
+    assert _read(workspace, 5, 7, "bytes") == "1: the "
+
+
+def test_search_streams_compressed_files(workspace: Path) -> None:
+    content_cache.clear()
+    search = FSOperation(operation="search", query="line 1234:")
+    assert (
+        fs._fs_opt(search, workspace)
+        == "chapter.txt:1234: line 1234: the quick brown fox"
+    )
+    # 压缩文件只记录标记，不缓存内容
+    assert content_cache.stats()["bytes"] == 0
+
+
+def test_append_replace_and_patch_keep_compression(workspace: Path) -> None:
+    path = workspace / "chapter.txt"
+    append = FSOperation(
+        operation="write", path="chapter.txt", content="the end\n", write_append=True
+    )
+    fs._fs_opt(append, workspace)
+    assert _read(workspace, 0, 1, "tail") == "the end\n"
+
+    replace = FSOperation(
+        operation="replace",
+        glob_pattern="chapter.txt",
+        replace_pattern="brown",
+        content="red",
+    )
+    assert "2000 replacement(s)" in fs._fs_opt(replace, workspace)
+    patch = "--- a\n+++ a\n@@ -1,2 +1,2 @@\n-line 1: the quick red fox\n+first\n line 2: the quick red fox\n"
+    assert (
+        fs._fs_opt(
+            FSOperation(operation="patch", path="chapter.txt", content=patch), workspace
+        )
+        == "Content patched to file 'chapter.txt'"
+    )
+
+    assert file_codec(path) is not None
+    with open_decoded(path) as f:
+        text = f.read().decode("utf-8")
+    assert (
+        text
+        == "first\n" + CHAPTER.replace("brown", "red").split("\n", 1)[1] + "the end\n"
+    )
+
+
+@pytest.mark.parametrize("pattern", ["fox\nline", r"fox[\x00-\x7f]line"])
+def test_replace_across_lines_in_compressed_file(workspace: Path, pattern) -> None:
+    replace = FSOperation(
+        operation="replace",
+        glob_pattern="chapter.txt",
+        replace_pattern=pattern,
+        content="fox | line",
+    )
+    assert "'chapter.txt': 1999 replacement(s)" in fs._fs_opt(replace, workspace)
+    with open_decoded(workspace / "chapter.txt") as f:
+        text = f.read().decode("utf-8")
+    assert text.startswith("line 1: the quick brown fox | line 2:")
@@ -0,0 +1,63 @@
+"""Test the shared file content cache."""
+
+import re
+from pathlib import Path
+
+from agent.tools import filesystem as fs
+from agent.tools.filesystem import FSOperation
+from agent.tools.fs.content import ContentCache, content_cache
+from agent.tools.fs.search import scan_file
+
+
+def test_hits_misses_and_validation(tmp_path: Path) -> None:
+    cache = ContentCache(max_bytes=1 << 20)
+    path = tmp_path / "a.txt"
+    path.write_text("one\ntwo\n", encoding="utf-8")
+    assert cache.get(path).text() == "one\ntwo\n"
+    assert list(cache.get(path).line_starts) == [0, 4]
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    path.write_text("three\n", encoding="utf-8")
+    assert cache.get(path).text() == "three\n"
+    assert cache.stats()["misses"] == 2
+
+    binary = tmp_path / "b.bin"
+    binary.write_bytes(b"\0" * 100)
+    assert cache.get(binary).binary
+    assert cache.get(binary).cost == 0
+
+
+def test_byte_cap_evicts_least_recently_used(tmp_path: Path) -> None:
+    cache = ContentCache(max_bytes=250, max_file_size=200)
+    for name in "abc":
+        (tmp_path / name).write_bytes(b"x" * 100)
+    cache.get(tmp_path / "a")
+    cache.get(tmp_path / "b")
+    cache.get(tmp_path / "a")
+    cache.get(tmp_path / "c")
+    stats = cache.stats()
+    assert stats["evictions"] == 1 and stats["bytes"] <= 250
+    cache.get(tmp_path / "a")
+    assert cache.stats()["hits"] == 2
+
+    (tmp_path / "big").write_bytes(b"x" * 201)
+    assert cache.get(tmp_path / "big") is None
+    assert cache.stats()["entries"] == 2
+
+
+def test_read_search_and_replace_share_entries(tmp_path: Path) -> None:
+    content_cache.clear()
+    (tmp_path / "a.txt").write_text("alpha\nbeta\n", encoding="utf-8")
+    read = FSOperation(operation="read", path="a.txt", read_offset=1, read_length=1)
+    assert fs._fs_opt(read, tmp_path) == "beta\n"
+    assert scan_file(tmp_path / "a.txt", re.compile("alpha")).matches == [(1, "alpha")]
+    assert content_cache.stats()["hits"] == 1
+
+    replace = FSOperation(
+        operation="replace",
+        glob_pattern="a.txt",
+        replace_pattern="beta",
+        content="gamma",
+    )
+    fs._fs_opt(replace, tmp_path)
+    assert fs._fs_opt(read, tmp_path) == "gamma\n"
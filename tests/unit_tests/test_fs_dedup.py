@@ -0,0 +1,108 @@
+"""Test the content-addressed blob store."""
+
+import threading
+from pathlib import Path
+
+import pytest
+
+from agent.tools import filesystem as fs
+from agent.tools.filesystem import FSOperation
+from agent.tools.fs import dedup
+from agent.tools.fs.atomic import atomic_write, temp_path
+from agent.tools.fs.dedup import blob_dir, blob_stats, dedup_file, dedup_tree, gc
+
+CONTENT = "template\n" * 200
+
+
+@pytest.fixture
+def user_data(tmp_path: Path, monkeypatch) -> Path:
+    monkeypatch.setenv("FS_DEDUP", "1")
+    for user in ("alice", "bob"):
+        (tmp_path / "user_data" / user).mkdir(parents=True)
+    return (tmp_path / "user_data").resolve()
+
+
+def _write(root: Path, path: str, content: str, append: bool = False) -> str:
+    op = FSOperation(operation="write", path=path, content=content, write_append=append)
+    return fs._fs_opt(op, root)
+
+
+def test_identical_files_share_a_blob(user_data: Path) -> None:
+    alice, bob = user_data / "alice", user_data / "bob"
+    _write(alice, "a.txt", CONTENT)
+    _write(bob, "b.txt", CONTENT)
+    _write(bob, "small.txt", "tiny")
+    a, b = (alice / "a.txt").stat(), (bob / "b.txt").stat()
+    assert a.st_ino == b.st_ino and a.st_nlink == 3
+    assert (bob / "small.txt").stat().st_nlink == 1
+    stats = blob_stats(blob_dir(alice))
+    assert (stats.blobs, stats.references) == (1, 2)
+    assert stats.saved_bytes == len(CONTENT)
+
+
+def test_changes_do_not_leak_between_workspaces(user_data: Path, monkeypatch) -> None:
+    # 自动快照也会引用 blob，这里关闭以便验证回收
+    monkeypatch.setenv("FS_AUTO_SNAPSHOT", "off")
+    alice, bob = user_data / "alice", user_data / "bob"
+    _write(alice, "a.txt", CONTENT)
+    _write(bob, "a.txt", CONTENT)
+    _write(alice, "a.txt", "more\n", append=True)
+    replace = FSOperation(
+        operation="replace",
+        glob_pattern="a.txt",
+        replace_pattern="template",
+        content="x",
+    )
+    fs._fs_opt(replace, bob)
+    assert (alice / "a.txt").read_text(encoding="utf-8") == CONTENT + "more\n"
+    assert (bob / "a.txt").read_text(encoding="utf-8") == "x\n" * 200
+
+    blobs = blob_dir(alice)
+    # 两个工作区都不再引用最初的 blob，追加过的文件也不再去重
+    assert gc(blobs) == 1
+    assert blob_stats(blobs).blobs == 0
+
+
+def test_appends_copy_a_shared_file_once(user_data: Path, monkeypatch) -> None:
+    monkeypatch.setenv("FS_AUTO_SNAPSHOT", "off")
+    alice = user_data / "alice"
+    _write(alice, "log.txt", CONTENT)
+    assert (alice / "log.txt").stat().st_nlink == 2
+    copies = []
+    monkeypatch.setattr(fs, "dedup_file", lambda path, blobs: copies.append(path))
+    for i in range(3):
+        _write(alice, "log.txt", f"entry {i}\n", append=True)
+        assert (alice / "log.txt").stat().st_nlink == 1
+    assert copies == []
+    assert (alice / "log.txt").read_text(encoding="utf-8").endswith("entry 2\n")
+
+
+def test_dedup_tree(user_data: Path, monkeypatch) -> None:
+    monkeypatch.delenv("FS_DEDUP")
+    for user in ("alice", "bob"):
+        (user_data / user / "c.txt").write_text(CONTENT, encoding="utf-8")
+    blobs = blob_dir(user_data / "alice")
+    assert dedup_tree(user_data / "alice", blobs) == 1
+    assert dedup_tree(user_data / "bob", blobs) == 1
+    assert blob_stats(blobs).references == 2
+
+
+def test_concurrent_write_is_not_lost(user_data: Path, monkeypatch) -> None:
+    alice, bob = user_data / "alice", user_data / "bob"
+    blobs = blob_dir(alice)
+    _write(bob, "a.txt", CONTENT)
+    path = alice / "a.txt"
+    path.write_text(CONTENT, encoding="utf-8")
+    writer = threading.Thread(target=atomic_write, args=(path, "new"))
+
+    def racing_temp_path(target: Path) -> Path:
+        # 去重替换文件期间的写入必须等待，不能被覆盖
+        writer.start()
+        writer.join(0.1)
+        assert writer.is_alive()
+        return temp_path(target)
+
+    monkeypatch.setattr(dedup, "temp_path", racing_temp_path)
+    assert dedup_file(path, blobs)
+    writer.join()
+    assert path.read_text(encoding="utf-8") == "new"
@@ -0,0 +1,98 @@
+"""Test the in-process unified diff applier."""
+
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+import pytest
+
+from agent.tools import filesystem as fs
+from agent.tools.filesystem import FSOperation
+from agent.tools.fs.diff import PatchError, apply_hunks, parse_patch
+
+ORIGINAL = "".join(f"line {i}\n" for i in range(1, 21))
+
+
+@pytest.fixture
+def workspace():
+    with TemporaryDirectory() as temp_dir:
+        root = Path(temp_dir).resolve()
+        (root / "a.txt").write_text(ORIGINAL, encoding="utf-8")
+        yield root
+
+
+def _patch(root: Path, content: str, path: str = "a.txt") -> str:
+    return fs._fs_opt(FSOperation(operation="patch", path=path, content=content), root)
+
+
+def test_parse_strips_timestamps_and_git_prefixes() -> None:
+    patches = parse_patch(
+        "--- a.txt   2026-01-11 10:53:58.947771242 +0000\n"
+        "+++ a.txt\t2026-01-11 10:54:09 +0000\n"
+        "@@ -1 +1 @@\n-x\n\\ No newline at end of file\n+y\n"
+    )
+    assert patches[0].path == "a.txt"
+    assert patches[0].hunks[0].lines == ["-x", "+y\n"]
+
+    patches = parse_patch(
+        "diff --git a/s/b.py b/s/b.py\n--- a/s/b.py\n+++ b/s/b.py\n@@ -1 +1 @@\n-x\n+y\n"
+    )
+    assert patches[0].path == "s/b.py"
+
+    with pytest.raises(PatchError):
+        parse_patch("not a diff")
+    with pytest.raises(PatchError):
+        parse_patch("--- a\n+++ a\n@@ -1,3 +1,3 @@\n x\n")
+
+
+def test_offset_and_fuzz() -> None:
+    lines = ORIGINAL.splitlines(keepends=True)
+    (patch,) = parse_patch(
+        "--- a.txt\n+++ a.txt\n"
+        "@@ -1,3 +1,3 @@\n line 5\n-line 6\n+six\n line 7\n"
+        "@@ -10,3 +10,3 @@\n changed\n-line 12\n+twelve\n line 13\n"
+    )
+    patched, results = apply_hunks(lines, patch.hunks)
+    assert [(r.status, r.line, r.offset, r.fuzz) for r in results] == [
+        ("applied", 5, 4, 0),
+        ("applied", 11, 1, 1),
+    ]
+    assert patched[5] == "six\n" and patched[11] == "twelve\n"
+
+
+def test_patch_tool_reports_hunks(workspace: Path) -> None:
+    clean = "--- a.txt\n+++ a.txt\n@@ -2,1 +2,1 @@\n-line 2\n+two\n"
+    assert _patch(workspace, clean) == "Content patched to file 'a.txt'"
+
+    shifted = "--- a.txt\n+++ a.txt\n@@ -1,1 +1,1 @@\n-line 3\n+three\n"
+    result = _patch(workspace, shifted)
+    assert (
+        result.splitlines()[1]
+        == "Hunk #1 @@ -1,1 +1,1 @@: applied at line 3 (offset +2)"
+    )
+
+    rejected = (
+        "--- a.txt\n+++ a.txt\n"
+        "@@ -4,1 +4,1 @@\n-line 4\n+four\n"
+        "@@ -9,1 +9,1 @@\n-missing\n+nine\n"
+    )
+    result = _patch(workspace, rejected)
+    assert result.startswith(
+        "Error: Failed to patch file 'a.txt', no changes were written"
+    )
+    assert "Hunk #2 @@ -9,1 +9,1 @@: rejected" in result
+    content = (workspace / "a.txt").read_text(encoding="utf-8")
+    assert "line 4\n" in content and "two\n" in content and "three\n" in content
+
+
+def test_patch_creates_and_deletes_files(workspace: Path) -> None:
+    patch = (
+        "diff --git a/a.txt b/a.txt\n--- a/a.txt\n+++ /dev/null\n"
+        f"@@ -1,20 +0,0 @@\n{''.join('-' + line for line in ORIGINAL.splitlines(True))}"
+        "diff --git a/new.txt b/new.txt\n--- /dev/null\n+++ b/new.txt\n"
+        "@@ -0,0 +1,2 @@\n+hello\n+world\n"
+    )
+    assert _patch(workspace, patch) == (
+        "Content patched to 2 file(s): 'a.txt', 'new.txt'"
+    )
+    assert not (workspace / "a.txt").exists()
+    assert (workspace / "new.txt").read_text(encoding="utf-8") == "hello\nworld\n"
@@ -0,0 +1,74 @@
+"""Test the line index and ranged reads."""
+
+import os
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+import pytest
+
+from agent.tools import filesystem as fs
+from agent.tools.filesystem import FSOperation
+from agent.tools.fs.lines import LineIndex, line_index_cache, read_lines, read_tail
+
+
+@pytest.fixture
+def log_file():
+    with TemporaryDirectory() as temp_dir:
+        path = Path(temp_dir) / "app.log"
+        path.write_text("".join(f"line {i}\n" for i in range(100)), encoding="utf-8")
+        yield path
+
+
+def test_line_index(log_file: Path) -> None:
+    index = LineIndex.build(log_file)
+    assert index.line_count == 100
+    assert index.span(0, 1) == (0, len("line 0\n"))
+    assert index.span(99, 200) == (index.starts[99], index.size)
+    assert index.span(150, 160) == (0, 0)
+
+
+def test_read_exact_line_counts(log_file: Path) -> None:
+    assert read_lines(log_file, 10, 3) == "line 10\nline 11\nline 12\n"
+    assert read_lines(log_file, 98, 10) == "line 98\nline 99\n"
+    assert read_lines(log_file, 100, 10) == ""
+    assert read_tail(log_file, 0, 2) == "line 98\nline 99\n"
+    assert read_tail(log_file, 1, 2) == "line 97\nline 98\n"
+
+
+def test_index_invalidated_on_change(log_file: Path) -> None:
+    first = line_index_cache.get(log_file)
+    assert line_index_cache.get(log_file) is first
+
+    with log_file.open("a", encoding="utf-8") as f:
+        f.write("line 100")
+    st = log_file.stat()
+    os.utime(log_file, ns=(st.st_atime_ns, first.mtime_ns + 1))
+    assert read_tail(log_file, 0, 1) == "line 100"
+    assert line_index_cache.get(log_file) is not first
+
+
+def test_read_modes(log_file: Path) -> None:
+    root = log_file.parent
+    op = FSOperation(
+        operation="read", path="app.log", read_offset=1, read_length=1, read_mode="tail"
+    )
+    assert fs.read_file(op, root) == "line 98\n"
+    op = FSOperation(
+        operation="read",
+        path="app.log",
+        read_offset=5,
+        read_length=4,
+        read_mode="bytes",
+    )
+    assert fs.read_file(op, root) == "0\nli"
+
+    with pytest.raises(ValueError):
+        FSOperation(operation="read", path="app.log", read_offset=-1, read_length=1)
+
+
+def test_read_empty_file() -> None:
+    with TemporaryDirectory() as temp_dir:
+        path = Path(temp_dir) / "empty.txt"
+        path.touch()
+        assert read_lines(path, 0, 10) == ""
+        assert read_tail(path, 0, 10) == ""
@@ -0,0 +1,101 @@
+"""Test cursor-based pagination of search, glob and list results."""
+
+import re
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+import pytest
+
+from agent.tools import filesystem as fs
+from agent.tools.filesystem import FSOperation
+from agent.tools.fs.paging import (
+    InvalidCursorError,
+    decode_cursor,
+    encode_cursor,
+    paginate,
+)
+
+CURSOR = re.compile(r"cursor='([^']+)'")
+
+
+@pytest.fixture
+def workspace():
+    with TemporaryDirectory() as temp_dir:
+        root = Path(temp_dir).resolve()
+        for i in range(25):
+            (root / f"f{i:02d}.txt").write_text(f"match {i}\n", encoding="utf-8")
+        yield root
+
+
+def _collect(root: Path, **kwargs) -> list[str]:
+    lines: list[str] = []
+    cursor = None
+    while True:
+        op = FSOperation(**kwargs, cursor=cursor, page_size=10)
+        page = fs._fs_opt(op, root).splitlines()
+        found = CURSOR.search(page[-1])
+        if not found:
+            return lines + page
+        lines.extend(page[:-1])
+        cursor = found.group(1)
+
+
+def test_cursor_round_trip() -> None:
+    cursor = encode_cursor("abc", 42)
+    assert decode_cursor(cursor, "abc") == 42
+    assert decode_cursor(None, "abc") == 0
+    with pytest.raises(InvalidCursorError):
+        decode_cursor(cursor, "other")
+    with pytest.raises(InvalidCursorError):
+        decode_cursor("not-a-cursor", "abc")
+
+
+def test_paginate_is_lazy() -> None:
+    consumed = []
+
+    def items():
+        for i in range(100):
+            consumed.append(i)
+            yield str(i)
+
+    page, has_more = paginate(items(), 5, 3)
+    assert page == ["5", "6", "7"]
+    assert has_more
+    assert len(consumed) == 9
+
+
+def test_search_pages(workspace: Path) -> None:
+    lines = _collect(workspace, operation="search", query="match")
+    assert lines == [f"f{i:02d}.txt:1: match {i}" for i in range(25)]
+
+
+def test_glob_pages(workspace: Path) -> None:
+    lines = _collect(workspace, operation="glob", glob_pattern="*.txt")
+    assert lines == [f"f{i:02d}.txt" for i in range(25)]
+
+
+def test_list_pages(workspace: Path) -> None:
+    first = fs._fs_opt(FSOperation(operation="list", path=".", page_size=10), workspace)
+    assert first.splitlines()[0] == "Directory: ."
+    assert len(first.splitlines()) == 12
+    cursor = CURSOR.search(first).group(1)
+    second = fs._fs_opt(
+        FSOperation(operation="list", path=".", page_size=10, cursor=cursor), workspace
+    )
+    assert second.splitlines()[1] == "├── f10.txt (9 bytes)"
+
+
+def test_cursor_rejected_for_other_request(workspace: Path) -> None:
+    page = fs._fs_opt(
+        FSOperation(operation="glob", glob_pattern="*.txt", page_size=10), workspace
+    )
+    cursor = CURSOR.search(page).group(1)
+    op = FSOperation(operation="glob", glob_pattern="f1*.txt", cursor=cursor)
+    assert fs._fs_opt(op, workspace).startswith("Error: Cursor ")
+
+
+def test_search_truncation_with_pages(workspace: Path) -> None:
+    op = FSOperation(operation="search", query="match", max_results=5, page_size=10)
+    lines = fs._fs_opt(op, workspace).splitlines()
+    assert len(lines) == 6
+    assert lines[-1].startswith("... results truncated at 5 matches")
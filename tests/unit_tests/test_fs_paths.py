@@ -0,0 +1,84 @@
+"""Test workspace path confinement."""
+
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+import pytest
+
+from agent.tools import filesystem as fs
+from agent.tools.filesystem import FSOperation
+from agent.tools.fs.paths import (
+    PathEscapeError,
+    check_pattern,
+    resolve_path,
+    resolve_root,
+)
+
+
+@pytest.fixture
+def workspace():
+    with TemporaryDirectory() as temp_dir:
+        root = resolve_root(temp_dir)
+        (root / "user").mkdir()
+        (root / "outside.txt").write_text("secret", encoding="utf-8")
+        yield root / "user"
+
+
+def test_resolve_path_confines_to_root(workspace: Path) -> None:
+    assert resolve_path(workspace, "a/b.txt") == workspace / "a" / "b.txt"
+    assert resolve_path(workspace, ".") == workspace
+    with pytest.raises(PathEscapeError):
+        resolve_path(workspace, "../outside.txt")
+    with pytest.raises(PathEscapeError):
+        resolve_path(workspace, "/etc/passwd")
+
+    (workspace / "link").symlink_to(workspace.parent)
+    with pytest.raises(PathEscapeError):
+        resolve_path(workspace, "link/outside.txt")
+
+
+def test_check_pattern() -> None:
+    check_pattern("**/*.txt")
+    for pattern in ("../*", "/etc/*", "a/../../*"):
+        with pytest.raises(PathEscapeError):
+            check_pattern(pattern)
+
+
+def test_operations_reject_escaping_paths(workspace: Path) -> None:
+    op = FSOperation(
+        operation="read", path="../outside.txt", read_offset=0, read_length=1
+    )
+    assert fs._fs_opt(op, workspace) == (
+        "Error: Path '../outside.txt' is outside of the workspace"
+    )
+    op = FSOperation(operation="glob", glob_pattern="../*")
+    assert fs._fs_opt(op, workspace) == (
+        "Error: Pattern '../*' is outside of the workspace"
+    )
+    op = FSOperation(operation="delete", path=".")
+    assert fs._fs_opt(op, workspace) == "Error: Cannot delete the workspace root"
+
+    (workspace / "leak.txt").symlink_to(workspace.parent / "outside.txt")
+    op = FSOperation(operation="search", query="secret")
+    assert fs._fs_opt(op, workspace) == "No matches found for pattern 'secret'"
+
+
+def test_concurrent_users_on_threads(workspace: Path) -> None:
+    roots = [workspace.parent / f"user{i}" for i in range(8)]
+    for root in roots:
+        root.mkdir()
+
+    def run(root: Path) -> str:
+        write = FSOperation(
+            operation="write", path="me.txt", content=root.name, write_append=False
+        )
+        fs._fs_opt(write, root)
+        read = FSOperation(
+            operation="read", path="me.txt", read_offset=0, read_length=1
+        )
+        return fs._fs_opt(read, root)
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(executor.map(run, roots))
+    assert results == [root.name for root in roots]
@@ -0,0 +1,102 @@
+"""Test the filesystem worker pool."""
+
+import os
+import threading
+import time
+from concurrent.futures import BrokenExecutor, Future
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest.mock import MagicMock
+
+import pytest
+from langchain.tools import ToolRuntime
+
+from agent.tools import filesystem as fs
+from agent.tools.fs.pool import FSThreadPool, FSWorkerPool
+
+
+def test_pool_reuses_workers() -> None:
+    with FSWorkerPool(processes=1, max_tasks_per_child=None) as pool:
+        pids = {pool.apply(os.getpid) for _ in range(5)}
+    assert len(pids) == 1
+    assert os.getpid() not in pids
+
+
+def test_pool_recycles_workers() -> None:
+    with FSWorkerPool(processes=1, max_tasks_per_child=1) as pool:
+        pids = {pool.apply(os.getpid) for _ in range(3)}
+    assert len(pids) == 3
+
+
+def test_pool_close_is_idempotent() -> None:
+    pool = FSWorkerPool(processes=1)
+    assert not pool.started
+    pool.warmup()
+    assert pool.started
+    pool.close()
+    pool.close()
+    assert not pool.started
+
+
+def test_thread_pool_runs_in_process() -> None:
+    with FSThreadPool(threads=2) as pool:
+        assert pool.apply(os.getpid) == os.getpid()
+        name = pool.apply(lambda: threading.current_thread().name)
+    assert name.startswith("fs-worker")
+    assert not pool.started
+
+
+def test_fs_opt_through_pool() -> None:
+    runtime = MagicMock(spec=ToolRuntime)
+    runtime.context = {"user_id": "pool_user"}
+    with TemporaryDirectory() as temp_dir:
+        cwd = os.getcwd()
+        os.chdir(temp_dir)
+        try:
+            for i in range(3):
+                result = fs.fs_opt.invoke(
+                    {
+                        "operation": "write",
+                        "args": {
+                            "path": f"note{i}.txt",
+                            "content": "hello",
+                            "write_append": False,
+                        },
+                        "runtime": runtime,
+                    }
+                )
+                assert result == f"Content written to file 'note{i}.txt'"
+            assert sorted(p.name for p in Path("user_data/pool_user").iterdir()) == [
+                "note0.txt",
+                "note1.txt",
+                "note2.txt",
+            ]
+        finally:
+            os.chdir(cwd)
+
+
+def test_terminate_fails_in_flight_futures() -> None:
+    pool = FSWorkerPool(processes=1, max_tasks_per_child=None)
+    pool.warmup()
+    futures = [pool.submit(time.sleep, (5,)) for _ in range(2)]
+    pool.terminate()
+    for future in futures:
+        with pytest.raises(BrokenExecutor):
+            future.result(timeout=1)
+    assert pool.apply(os.getpid) != os.getpid()
+    pool.close()
+
+
+def test_tool_reports_interrupted_operation(tmp_path: Path, monkeypatch) -> None:
+    pool = MagicMock(spec=FSWorkerPool)
+    failed: Future = Future()
+    failed.set_exception(BrokenExecutor("the worker pool was terminated"))
+    pool.submit.return_value = failed
+    monkeypatch.setattr(fs, "get_pool", lambda: pool)
+    runtime = MagicMock(spec=ToolRuntime)
+    runtime.context = {"user_id": "pool_user"}
+    monkeypatch.chdir(tmp_path)
+    result = fs.fs_opt.invoke(
+        {"operation": "list", "args": {"path": "."}, "runtime": runtime}
+    )
+    assert result.startswith("Error: 'list' operation was interrupted")
@@ -0,0 +1,135 @@
+"""Test the regex safety checks and deadlines of search and replace."""
+
+import re
+import time
+from pathlib import Path
+
+import pytest
+
+from agent.tools import filesystem as fs
+from agent.tools.filesystem import FSOperation
+from agent.tools.fs.regex import (
+    Deadline,
+    UnsafePatternError,
+    can_match_newline,
+    compile_pattern,
+)
+from agent.tools.fs.replace import replace
+from agent.tools.fs.search import search
+
+
+@pytest.mark.parametrize(
+    "pattern",
+    [
+        r"(a+)+$",
+        r"(\w+\s?)*$",
+        r"(?:\w+\s)+x",
+        r"(a|b|ab)*c",
+        r"((ab)*)+",
+        # 解析器会提取公共前缀：(a|aa) 变成 a(?:|a)
+        r"(a|aa)+$",
+        r"(ab|a)+$",
+        r"(a|ab)*c",
+        r"(?:a|a?)+$",
+        r"(a?)*$",
+        r"(?i)(a|AA)+$",
+        r"(?:[a-z]x|[m-q]y)+$",
+        r"(?:\dx|\d)+$",
+        # 有上限的重复同样会指数回溯
+        r"(a+){2,60}b",
+        r"(a|aa){1,50}b",
+        r"(\w+){2}",
+        r"(a{1,30}){2,30}b",
+    ],
+)
+def test_unsafe_patterns_are_rejected(pattern: str) -> None:
+    with pytest.raises(UnsafePatternError):
+        compile_pattern(pattern)
+
+
+@pytest.mark.parametrize(
+    "pattern",
+    [
+        r"foo\d+",
+        r"(ab)+",
+        r"(?>a+)+",
+        r"(\d++\.)+",
+        r"(a|b)*",
+        r"(\w+)?",
+        r"(\d{3}){2,4}",
+        r"(ab?){1,10}",
+        r"(foo|bar)+",
+        r"(?:[a-f]x|[g-z]y)+",
+        r"(?>a|aa)+$",
+    ],
+)
+def test_safe_patterns_are_compiled(pattern: str) -> None:
+    assert compile_pattern(pattern) is compile_pattern(pattern)
+
+
+@pytest.mark.parametrize(
+    ("pattern", "expected"),
+    [
+        (r"foo\d+", False),
+        (r"^\w+$", False),
+        (r".*", False),
+        (r"[^\n]*x", False),
+        (r"(\S+)\1", False),
+        (r"[^z]*q", True),
+        (r"\s+", True),
+        (r"\D", True),
+        ("foo\nbar", True),
+        (r"[\x00-\x7f]", True),
+        (r"(?s).", True),
+        (r"a(?s:.)b", True),
+    ],
+)
+def test_can_match_newline(pattern: str, expected: bool) -> None:
+    assert can_match_newline(re.compile(pattern)) is expected
+
+
+def test_invalid_pattern_raises_re_error() -> None:
+    with pytest.raises(re.error):
+        compile_pattern("(")
+
+
+def test_deadline() -> None:
+    assert not Deadline(0).expired()
+    assert not Deadline(None).expired()
+    deadline = Deadline(1e-6)
+    time.sleep(0.01)
+    assert deadline.expired()
+    assert deadline.describe() == "deadline of 1e-06s exceeded"
+
+
+def test_expired_deadline_returns_partial_results(tmp_path: Path) -> None:
+    files = []
+    for i in range(5):
+        files.append(tmp_path / f"f{i}.txt")
+        files[-1].write_text("foo\n", encoding="utf-8")
+    deadline = Deadline(1e-9)
+    time.sleep(0.001)
+
+    matches, stats = search(files, re.compile("foo"), deadline=deadline)
+    assert stats.timed_out
+    assert len(matches) < 5
+
+    result = replace(files, re.compile("foo"), "bar", deadline=deadline)
+    assert result.limit == deadline.describe()
+    assert all(f.read_text(encoding="utf-8") == "foo\n" for f in files)
+
+
+def test_tool_reports_unsafe_pattern_and_timeout(tmp_path: Path, monkeypatch) -> None:
+    (tmp_path / "a.txt").write_text("foo\n", encoding="utf-8")
+    op = FSOperation(operation="search", query=r"(\w+\s?)*$")
+    assert fs._fs_opt(op, tmp_path).startswith("Error: Pattern")
+
+    monkeypatch.setenv("FS_REGEX_TIMEOUT", "1e-9")
+    result = fs._fs_opt(FSOperation(operation="search", query="foo"), tmp_path)
+    assert "search stopped, deadline of 1e-09s exceeded" in result
+
+    op = FSOperation(
+        operation="replace", glob_pattern="*.txt", replace_pattern="foo", content="x"
+    )
+    assert "deadline of 1e-09s exceeded" in fs._fs_opt(op, tmp_path)
+    assert (tmp_path / "a.txt").read_text(encoding="utf-8") == "foo\n"
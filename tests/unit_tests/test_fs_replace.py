@@ -0,0 +1,95 @@
+"""Test the concurrent, atomic replace engine."""
+
+import os
+import re
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+import pytest
+
+from agent.tools import filesystem as fs
+from agent.tools.filesystem import FSOperation
+from agent.tools.fs import replace as replace_module
+from agent.tools.fs.atomic import DEFAULT_MODE
+from agent.tools.fs.replace import is_line_local, replace
+
+
+@pytest.fixture
+def workspace():
+    with TemporaryDirectory() as temp_dir:
+        root = Path(temp_dir).resolve()
+        for i in range(10):
+            (root / f"f{i}.txt").write_text(f"foo {i}\r\nbar foo\n", encoding="utf-8")
+        yield root
+
+
+def _op(**kwargs) -> FSOperation:
+    return FSOperation(
+        operation="replace",
+        glob_pattern="*.txt",
+        replace_pattern="foo",
+        content="baz",
+        **kwargs,
+    )
+
+
+def test_is_line_local() -> None:
+    assert is_line_local(re.compile(r"foo\d+"))
+    assert not is_line_local(re.compile(r"foo\s+bar"))
+    assert not is_line_local(re.compile(r"[^x]+"))
+    assert not is_line_local(re.compile(r"foo$"))
+    assert not is_line_local(re.compile("foo", re.DOTALL))
+    assert not is_line_local(re.compile("fox\nline"))
+    assert not is_line_local(re.compile(r"fox[\x00-\x7f]line"))
+    assert not is_line_local(re.compile(r"(?s:x.y)"))
+
+
+def test_replace_preserves_line_endings(workspace: Path) -> None:
+    result = fs._fs_opt(_op(), workspace)
+    assert result.startswith("Replacements made in 10 file(s):")
+    assert (workspace / "f3.txt").read_bytes() == b"baz 3\r\nbar baz\n"
+    assert sorted(p.name for p in workspace.iterdir()) == sorted(
+        f"f{i}.txt" for i in range(10)
+    )
+
+
+def test_dry_run_writes_nothing(workspace: Path) -> None:
+    result = fs._fs_opt(_op(dry_run=True), workspace)
+    assert result.startswith("Dry run, no files written.")
+    assert "'f0.txt': 2 replacement(s)" in result
+    assert (workspace / "f0.txt").read_text(encoding="utf-8") == "foo 0\nbar foo\n"
+
+
+def test_limits_stop_in_path_order(workspace: Path) -> None:
+    result = fs._fs_opt(_op(max_files=3), workspace)
+    assert "'f2.txt': 2 replacement(s)" in result
+    assert "'f3.txt': Skipped - limit of 3 files reached" in result
+    assert "'f9.txt': Skipped - limit of 3 files reached" in result
+    assert "foo" not in (workspace / "f2.txt").read_text(encoding="utf-8")
+    assert "foo" in (workspace / "f3.txt").read_text(encoding="utf-8")
+
+    outcome = replace(
+        sorted(workspace.glob("*.txt")), re.compile("bar"), "baz", max_bytes=1
+    )
+    assert outcome.limit == "limit of 1 bytes reached"
+    assert len(outcome.skipped) == 10
+    assert len(list(workspace.iterdir())) == 10
+
+
+def test_large_files_are_streamed(workspace: Path, monkeypatch) -> None:
+    monkeypatch.setattr(replace_module, "STREAM_THRESHOLD", 4)
+    outcome = replace([workspace / "f1.txt"], re.compile("foo"), "qux")
+    assert outcome.total == 2
+    assert (workspace / "f1.txt").read_bytes() == b"qux 1\r\nbar qux\n"
+
+
+def test_written_files_get_default_or_previous_mode(workspace: Path) -> None:
+    (workspace / "f0.txt").chmod(0o640)
+    assert "Error" not in fs._fs_opt(_op(), workspace)
+    assert (workspace / "f0.txt").stat().st_mode & 0o777 == 0o640
+    assert (workspace / "f1.txt").stat().st_mode & 0o777 == DEFAULT_MODE
+
+    op = FSOperation(operation="write", path="new.txt", content="x", write_append=False)
+    fs._fs_opt(op, workspace)
+    assert (workspace / "new.txt").stat().st_mode & 0o777 == DEFAULT_MODE
+    assert DEFAULT_MODE == 0o666 & ~os.umask(os.umask(0o022))
@@ -0,0 +1,98 @@
+"""Test the parallel search engine."""
+
+import re
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+import pytest
+
+from agent.tools import filesystem as fs
+from agent.tools.filesystem import FSOperation
+from agent.tools.fs.search import iter_files, scan_file, search
+
+
+@pytest.fixture
+def workspace():
+    with TemporaryDirectory() as temp_dir:
+        root = Path(temp_dir).resolve()
+        for i in range(200):
+            sub = root / f"dir{i % 5}"
+            sub.mkdir(exist_ok=True)
+            (sub / f"file{i:03d}.txt").write_text(
+                f"header\nneedle {i}\nneedle again {i}\n", encoding="utf-8"
+            )
+        (root / "blob.bin").write_bytes(b"needle\0needle\n")
+        yield root
+
+
+def test_iter_files_sorted(workspace: Path) -> None:
+    files = list(iter_files(workspace))
+    assert len(files) == 201
+    assert files == sorted(files)
+
+
+def test_scan_file_skips_binary(workspace: Path) -> None:
+    pattern = re.compile("needle")
+    assert scan_file(workspace / "blob.bin", pattern).binary
+    result = scan_file(workspace / "dir0" / "file000.txt", pattern, max_matches=1)
+    assert result.matches == [(2, "needle 0")]
+
+
+def test_search_order_and_limits(workspace: Path) -> None:
+    pattern = re.compile(r"needle \d+")
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        results, stats = search(iter_files(workspace), pattern, executor=executor)
+    assert len(results) == 200
+    assert [p for p, _, _ in results] == sorted(p for p, _, _ in results)
+    assert stats.binary_skipped == 1
+    assert stats.files_scanned == 200
+    assert not stats.truncated
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        results, stats = search(
+            iter_files(workspace),
+            re.compile("needle"),
+            max_results=3,
+            max_matches_per_file=1,
+            executor=executor,
+        )
+    assert [line for _, _, line in results] == ["needle 0", "needle 5", "needle 10"]
+    assert stats.truncated
+    assert stats.files_scanned < 200
+
+
+def test_search_file_truncation_message(workspace: Path) -> None:
+    op = FSOperation(operation="search", query="needle", max_results=2)
+    lines = fs.search_file(op, workspace).splitlines()
+    assert lines[:2] == [
+        "dir0/file000.txt:2: needle 0",
+        "dir0/file000.txt:3: needle again 0",
+    ]
+    assert lines[2].startswith("... results truncated at 2 matches (scanned ")
+
+
+def test_search_line_sensitive_patterns(workspace: Path) -> None:
+    op = FSOperation(operation="search", path="dir0/file000.txt", query=r"^needle \d+$")
+    assert fs.search_file(op, workspace) == "2: needle 0"
+    op = FSOperation(operation="search", path="dir0/file000.txt", query=r"\Aneedle")
+    assert fs.search_file(op, workspace) == "2: needle 0\n3: needle again 0"
+
+
+@pytest.mark.parametrize("threshold", [None, 0])
+def test_lines_split_on_newlines_only(tmp_path: Path, monkeypatch, threshold) -> None:
+    if threshold is not None:
+        monkeypatch.setattr("agent.tools.fs.search.STREAM_THRESHOLD", threshold)
+    path = tmp_path / "a.txt"
+    path.write_bytes(b"x\rfoo\ny\x0cz\x85\nfoo\n")
+    assert scan_file(path, re.compile("^foo")).matches == [(3, "foo")]
+    assert scan_file(path, re.compile("foo")).matches == [(1, "x\rfoo"), (3, "foo")]
+
+
+def test_prefilter_only_for_patterns_within_lines(tmp_path: Path) -> None:
+    path = tmp_path / "a.txt"
+    # 预筛按整行分块，跨块的匹配不能丢失
+    path.write_text("x" * 100 + "\n" + "y\n" * 50_000 + "needle\n", encoding="utf-8")
+    assert scan_file(path, re.compile("needle")).matches == [(50_002, "needle")]
+    assert scan_file(path, re.compile(r"[^z]*q")).matches == []
+    assert scan_file(path, re.compile(r"^y\s*$")).matches[0] == (2, "y")
@@ -0,0 +1,90 @@
+"""Test copy-on-write workspace snapshots."""
+
+from pathlib import Path
+
+import pytest
+
+from agent.tools import filesystem as fs
+from agent.tools.filesystem import FSOperation
+from agent.tools.fs.snapshots import TREE_NAME, get_store
+from agent.tools.fs.usage import get_ledger
+
+
+@pytest.fixture
+def workspace(tmp_path: Path) -> Path:
+    root = tmp_path / "user_data" / "alice"
+    (root / "docs").mkdir(parents=True)
+    (root / "docs" / "a.txt").write_text("alpha\n", encoding="utf-8")
+    (root / "b.txt").write_text("beta\n", encoding="utf-8")
+    (root / "link").symlink_to("b.txt")
+    return root.resolve()
+
+
+def test_snapshot_shares_files(workspace: Path) -> None:
+    store = get_store(workspace)
+    info = store.take("first")
+    assert (info.files, info.label, info.automatic) == (2, "first", False)
+    tree = store.path / info.id / TREE_NAME
+    assert (tree / "b.txt").stat().st_ino == (workspace / "b.txt").stat().st_ino
+    assert (tree / "link").is_symlink()
+    assert [s.id for s in store.list()] == [info.id]
+
+
+def test_mutations_leave_snapshot_intact(workspace: Path) -> None:
+    info = get_store(workspace).take()
+    tree = get_store(workspace).path / info.id / TREE_NAME
+    write = FSOperation(operation="write", path="b.txt", content="x", write_append=True)
+    fs._fs_opt(write, workspace)
+    overwrite = FSOperation(
+        operation="write", path="docs/a.txt", content="new", write_append=False
+    )
+    fs._fs_opt(overwrite, workspace)
+    assert (workspace / "b.txt").read_text(encoding="utf-8") == "beta\nx"
+    assert (tree / "b.txt").read_text(encoding="utf-8") == "beta\n"
+    assert (tree / "docs" / "a.txt").read_text(encoding="utf-8") == "alpha\n"
+
+
+def test_restore_after_delete(workspace: Path, monkeypatch) -> None:
+    monkeypatch.setenv("FS_AUTO_SNAPSHOT", "delete")
+    result = fs._fs_opt(FSOperation(operation="delete", path="docs"), workspace)
+    assert "deleted successfully" in result
+    assert not (workspace / "docs").exists()
+    (auto,) = get_store(workspace).list()
+    assert auto.automatic and auto.label == "before delete 'docs'"
+
+    restore = FSOperation(operation="restore", snapshot_id=auto.id)
+    result = fs._fs_opt(restore, workspace)
+    assert result.startswith(f"Workspace restored to snapshot '{auto.id}'")
+    assert (workspace / "docs" / "a.txt").read_text(encoding="utf-8") == "alpha\n"
+    assert get_ledger(workspace).read().files == 2
+    # 恢复前的状态也保存为快照
+    assert len(get_store(workspace).list()) == 2
+
+
+def test_restore_after_replace(workspace: Path, monkeypatch) -> None:
+    monkeypatch.setenv("FS_AUTO_SNAPSHOT", "replace")
+    replace = FSOperation(
+        operation="replace", glob_pattern="**/*.txt", replace_pattern="a", content="o"
+    )
+    assert "Replacements made" in fs._fs_opt(replace, workspace)
+    (auto,) = get_store(workspace).list()
+    fs._fs_opt(FSOperation(operation="restore", snapshot_id=auto.id), workspace)
+    assert (workspace / "b.txt").read_text(encoding="utf-8") == "beta\n"
+    search = FSOperation(operation="search", query="alpha")
+    assert "docs/a.txt:1: alpha" in fs._fs_opt(search, workspace)
+
+
+def test_snapshot_operation_and_retention(workspace: Path, monkeypatch) -> None:
+    monkeypatch.setenv("FS_SNAPSHOT_KEEP", "2")
+    for label in ("one", "two", "three"):
+        op = FSOperation(operation="snapshot", content=label)
+        result = fs._fs_opt(op, workspace)
+    assert result.startswith("Snapshot '")
+    assert [s.label for s in get_store(workspace).list()] == ["two", "three"]
+
+    missing = FSOperation(operation="restore", snapshot_id="nope")
+    assert fs._fs_opt(missing, workspace).startswith(
+        "Error: Snapshot 'nope' does not exist\nSnapshots:"
+    )
+    with pytest.raises(ValueError, match="snapshot_id is required"):
+        FSOperation(operation="restore")
@@ -0,0 +1,74 @@
+"""Test the cached workspace tree snapshot."""
+
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+import pytest
+
+from agent.tools import filesystem as fs
+from agent.tools.filesystem import FSOperation
+from agent.tools.fs import tree
+from agent.tools.fs.tree import TreeSnapshot
+
+
+@pytest.fixture
+def workspace():
+    with TemporaryDirectory() as temp_dir:
+        root = Path(temp_dir).resolve()
+        (root / "sub").mkdir()
+        (root / "a.txt").write_text("a", encoding="utf-8")
+        (root / "sub" / "b.txt").write_text("bb", encoding="utf-8")
+        yield root
+
+
+def test_listing_is_served_from_cache(workspace: Path, monkeypatch) -> None:
+    snapshot = TreeSnapshot(workspace)
+    assert [e.name for e in snapshot.listing()] == ["a.txt", "sub"]
+    scans = []
+    monkeypatch.setattr(tree, "_scan", lambda d: scans.append(d))
+    # 原地追加不改变目录 mtime，但大小仍需更新
+    with (workspace / "a.txt").open("a", encoding="utf-8") as f:
+        f.write("aa")
+    sized = snapshot.listing(sizes=True)
+    assert [(e.name, e.size) for e in sized] == [("a.txt", 3), ("sub", 0)]
+    assert scans == []
+
+
+def test_glob_does_not_stat_files(workspace: Path, monkeypatch) -> None:
+    stats = []
+    monkeypatch.setattr(tree, "_sizes", lambda d, entries: stats.append(d))
+    glob_op = FSOperation(operation="glob", glob_pattern="**/*.txt")
+    assert "sub/b.txt" in fs._fs_opt(glob_op, workspace)
+    assert stats == []
+
+
+def test_listing_revalidates_on_mtime_change(workspace: Path) -> None:
+    snapshot = TreeSnapshot(workspace)
+    assert len(snapshot.listing("sub")) == 1
+    (workspace / "sub" / "c.txt").write_text("c", encoding="utf-8")
+    assert [e.name for e in snapshot.listing("sub")] == ["b.txt", "c.txt"]
+
+
+def test_tool_writes_are_visible(workspace: Path) -> None:
+    list_op = FSOperation(operation="list", path=".")
+    glob_op = FSOperation(operation="glob", glob_pattern="**/*.txt")
+    assert "a.txt (1 bytes)" in fs._fs_opt(list_op, workspace)
+    assert "new/c.txt" not in fs._fs_opt(glob_op, workspace)
+
+    write = FSOperation(
+        operation="write", path="new/c.txt", content="ccc", write_append=False
+    )
+    fs._fs_opt(write, workspace)
+    fs._fs_opt(
+        FSOperation(
+            operation="write", path="a.txt", content="aaaa", write_append=False
+        ),
+        workspace,
+    )
+    assert "new/c.txt" in fs._fs_opt(glob_op, workspace)
+    listing = fs._fs_opt(list_op, workspace)
+    assert "a.txt (4 bytes)" in listing
+    assert "└── c.txt (3 bytes)" in listing
+
+    fs._fs_opt(FSOperation(operation="delete", path="new"), workspace)
+    assert "new/" not in fs._fs_opt(list_op, workspace)
@@ -0,0 +1,124 @@
+"""Test the trigram index."""
+
+import re
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+import pytest
+
+from agent.tools import filesystem as fs
+from agent.tools.filesystem import FSOperation
+from agent.tools.fs import trigram
+from agent.tools.fs.trigram import TrigramIndex, required_trigrams
+
+
+@pytest.fixture
+def workspace(monkeypatch: pytest.MonkeyPatch):
+    with TemporaryDirectory() as temp_dir:
+        base = Path(temp_dir).resolve()
+        root = base / "user"
+        root.mkdir()
+        monkeypatch.setenv("FS_TRIGRAM_INDEX", "1")
+        monkeypatch.setenv("FS_STATE_DIR", str(base / "state"))
+        monkeypatch.setattr(trigram, "_indexes", {})
+        yield root
+
+
+def test_required_trigrams() -> None:
+    assert required_trigrams(re.compile("hello")) == {"hel", "ell", "llo"}
+    assert required_trigrams(re.compile(r"ab\d+cde")) == {"cde"}
+    assert required_trigrams(re.compile("(?i)FOO.*bar")) == {"foo", "bar"}
+    assert required_trigrams(re.compile("(abc)+x")) == {"abc"}
+    assert required_trigrams(re.compile("(abc)?x")) == set()
+    assert required_trigrams(re.compile("abc|xyz")) == set()
+
+
+def test_candidates_narrow_search(workspace: Path) -> None:
+    (workspace / "a.txt").write_text("the quick brown fox", encoding="utf-8")
+    (workspace / "b.txt").write_text("lazy dog", encoding="utf-8")
+    index = TrigramIndex(workspace, workspace.parent / "idx")
+    index.refresh()
+    assert index.candidates(re.compile("quick")) == [workspace / "a.txt"]
+    assert index.candidates(re.compile("DOG", re.I)) == [workspace / "b.txt"]
+    assert index.candidates(re.compile("missing")) == []
+    assert index.candidates(re.compile(r"\w+")) is None
+
+
+def test_index_updated_by_operations(workspace: Path) -> None:
+    def run(**kwargs) -> str:
+        return fs._fs_opt(FSOperation(**kwargs), workspace)
+
+    run(operation="write", path="notes/a.txt", content="alpha\n", write_append=False)
+    run(operation="write", path="notes/b.txt", content="beta\n", write_append=False)
+    index = fs._trigram_index(workspace)
+    assert index.candidates(re.compile("beta")) == [workspace / "notes" / "b.txt"]
+
+    run(
+        operation="replace",
+        glob_pattern="notes/*.txt",
+        replace_pattern="beta",
+        content="gamma",
+    )
+    assert index.candidates(re.compile("beta")) == []
+    assert index.candidates(re.compile("gamma")) == [workspace / "notes" / "b.txt"]
+
+    run(operation="delete", path="notes")
+    assert len(index) == 0
+
+    # 新实例从快照与日志恢复
+    run(operation="write", path="c.txt", content="persisted", write_append=False)
+    reloaded = TrigramIndex(workspace, index.index_dir)
+    assert reloaded.candidates(re.compile("persist")) == [workspace / "c.txt"]
+
+
+def test_out_of_band_changes(workspace: Path) -> None:
+    fs._fs_opt(
+        FSOperation(operation="write", path="a.txt", content="one", write_append=False),
+        workspace,
+    )
+    (workspace / "b.txt").write_text("needle", encoding="utf-8")
+    op = FSOperation(operation="search", query="needle")
+    assert fs._fs_opt(op, workspace) == "b.txt:1: needle"
+
+    index = fs._trigram_index(workspace)
+    index.rebuild()
+    assert not index.journal_path.exists()
+    assert len(TrigramIndex(workspace, index.index_dir)) == 2
+
+
+def test_case_insensitive_patterns_match_special_cases(workspace: Path) -> None:
+    (workspace / "city.txt").write_text("İstanbul", encoding="utf-8")
+    (workspace / "long_s.txt").write_text("ſtop here", encoding="utf-8")
+    index = TrigramIndex(workspace, workspace.parent / "idx")
+    index.refresh()
+    assert index.candidates(re.compile("(?i)istanbul")) == [workspace / "city.txt"]
+    assert index.candidates(re.compile("(?i)stop")) == [workspace / "long_s.txt"]
+    assert index.candidates(re.compile("(?i)STOP")) == [workspace / "long_s.txt"]
+
+
+def test_writes_of_other_processes_are_seen(workspace: Path) -> None:
+    index_dir = workspace.parent / "idx"
+    ours = TrigramIndex(workspace, index_dir)
+    ours.refresh()
+    # 另一个 worker 进程持有自己的内存索引，只通过快照与日志共享
+    theirs = TrigramIndex(workspace, index_dir)
+    (workspace / "new.txt").write_text("fresh content", encoding="utf-8")
+    theirs.update(workspace / "new.txt")
+    assert ours.candidates(re.compile("fresh")) == [workspace / "new.txt"]
+
+    theirs.save()
+    (workspace / "other.txt").write_text("another", encoding="utf-8")
+    theirs.update(workspace / "other.txt")
+    assert ours.candidates(re.compile("another")) == [workspace / "other.txt"]
+    assert ours.candidates(re.compile("fresh")) == [workspace / "new.txt"]
+
+
+def test_update_applies_ignore_rules(workspace: Path) -> None:
+    (workspace / ".gitignore").write_text("build/\n*.log\n", encoding="utf-8")
+    (workspace / "build").mkdir()
+    for rel in ("build/out.txt", "run.log", "kept.txt"):
+        (workspace / rel).write_text("needle", encoding="utf-8")
+    index = TrigramIndex(workspace, workspace.parent / "idx")
+    for rel in ("build/out.txt", "run.log", "kept.txt"):
+        index.update(workspace / rel)
+    assert index.candidates(re.compile("needle")) == [workspace / "kept.txt"]
@@ -0,0 +1,141 @@
+"""Test the workspace usage ledger and quotas."""
+
+from pathlib import Path
+
+import pytest
+
+from agent.tools import filesystem as fs
+from agent.tools.filesystem import FSOperation
+from agent.tools.fs.snapshots import get_store
+from agent.tools.fs.usage import get_ledger, measure, usage_report
+
+
+@pytest.fixture
+def workspace(tmp_path: Path) -> Path:
+    root = tmp_path / "user_data" / "alice"
+    (root / "docs").mkdir(parents=True)
+    (root / "docs" / "a.txt").write_text("12345", encoding="utf-8")
+    return root.resolve()
+
+
+def _write(root: Path, path: str, content: str, append: bool = False) -> str:
+    op = FSOperation(operation="write", path=path, content=content, write_append=append)
+    return fs._fs_opt(op, root)
+
+
+def test_ledger_tracks_mutations(workspace: Path) -> None:
+    ledger = get_ledger(workspace)
+    assert ledger.read() is None
+    _write(workspace, "b.txt", "abc")
+    # 首次变更时对工作区做一次全量统计
+    assert (ledger.read().bytes, ledger.read().files) == (8, 2)
+
+    _write(workspace, "b.txt", "de", append=True)
+    _write(workspace, "docs/a.txt", "1")
+    replace = FSOperation(
+        operation="replace", glob_pattern="b.txt", replace_pattern="abc", content="x"
+    )
+    fs._fs_opt(replace, workspace)
+    patch = "--- c.txt\n+++ c.txt\n@@ -1 +1 @@\n-xde\n+xdef\n"
+    fs._fs_opt(FSOperation(operation="patch", path="b.txt", content=patch), workspace)
+    assert (ledger.read().bytes, ledger.read().files) == (6, 2)
+
+    fs._fs_opt(FSOperation(operation="delete", path="docs"), workspace)
+    usage = ledger.read()
+    assert (usage.bytes, usage.files) == (5, 1)
+    actual = measure(workspace)
+    assert (actual.bytes, actual.files) == (5, 1)
+
+
+def test_quotas(workspace: Path, monkeypatch) -> None:
+    monkeypatch.setenv("FS_QUOTA_BYTES", "10")
+    monkeypatch.setenv("FS_QUOTA_FILES", "2")
+    assert _write(workspace, "b.txt", "abcd") == "Content written to file 'b.txt'"
+    assert _write(workspace, "c.txt", "a").startswith(
+        "Error: Quota exceeded: the workspace would hold 3 of 2 files"
+    )
+    assert _write(workspace, "b.txt", "abcdef").startswith(
+        "Error: Quota exceeded: the workspace would use 11 of 10 bytes"
+    )
+    assert not (workspace / "c.txt").exists()
+    # 缩小文件总是允许的
+    assert (
+        _write(workspace, "docs/a.txt", "1") == "Content written to file 'docs/a.txt'"
+    )
+
+    replace = FSOperation(
+        operation="replace",
+        glob_pattern="b.txt",
+        replace_pattern="a",
+        content="xxxxxxx",
+    )
+    assert "Skipped - Quota exceeded" in fs._fs_opt(replace, workspace)
+    assert (workspace / "b.txt").read_text(encoding="utf-8") == "abcd"
+
+
+def test_quota_is_reserved_before_writing(workspace: Path, monkeypatch) -> None:
+    monkeypatch.setenv("FS_QUOTA_BYTES", "10")
+    ledger = get_ledger(workspace)
+    # 已预留但尚未写入的变更同样占用配额
+    assert ledger.reserve(4, 1) is None
+    assert _write(workspace, "b.txt", "ab").startswith("Error: Quota exceeded")
+    ledger.update(-4, -1)
+
+    def fail(path: Path, data: bytes) -> None:
+        raise OSError("disk full")
+
+    monkeypatch.setattr(fs, "atomic_write", fail)
+    assert _write(workspace, "b.txt", "ab") == "Error writing file 'b.txt': disk full"
+    usage = ledger.read()
+    assert (usage.bytes, usage.files) == (5, 1)
+
+
+def test_usage_report(workspace: Path) -> None:
+    user_data = workspace.parent
+    (user_data / "bob").mkdir()
+    report = usage_report(user_data)
+    assert report == {"alice": None, "bob": None}
+    report = usage_report(user_data, reconcile=True)
+    assert (report["alice"].bytes, report["alice"].files) == (5, 1)
+    assert usage_report(user_data)["bob"].files == 0
+
+
+def test_snapshots_count_against_quotas(workspace: Path, monkeypatch) -> None:
+    monkeypatch.setenv("FS_SNAPSHOT_MODE", "link")
+    monkeypatch.setenv("FS_QUOTA_BYTES", "20")
+    ledger = get_ledger(workspace)
+    assert fs._fs_opt(FSOperation(operation="snapshot"), workspace).startswith(
+        "Snapshot '"
+    )
+    # 快照链接的旧内容在覆盖后转为快照占用
+    assert _write(workspace, "docs/a.txt", "123456789").startswith("Content")
+    usage = ledger.read()
+    assert (usage.bytes, usage.snapshot_bytes, usage.snapshot_files) == (9, 5, 1)
+    reconciled = ledger.reconcile()
+    assert (reconciled.bytes, reconciled.snapshot_bytes) == (9, 5)
+    assert _write(workspace, "b.txt", "1234567") == (
+        "Error: Quota exceeded: the workspace would use 21 of 20 bytes "
+        "(5 of them held only by snapshots)"
+    )
+
+    monkeypatch.setenv("FS_SNAPSHOT_MODE", "copy")
+    monkeypatch.setenv("FS_QUOTA_BYTES", "16")
+    result = fs._fs_opt(FSOperation(operation="snapshot"), workspace)
+    assert result.startswith("Error taking snapshot: Quota exceeded")
+    assert len(get_store(workspace).list()) == 1
+    assert ledger.read().snapshot_bytes == 5
+
+
+@pytest.mark.parametrize("auto_snapshot", [None, "delete,replace"])
+def test_deleting_frees_quota(workspace: Path, monkeypatch, auto_snapshot) -> None:
+    monkeypatch.setenv("FS_SNAPSHOT_MODE", "link")
+    monkeypatch.setenv("FS_QUOTA_BYTES", "100")
+    if auto_snapshot is not None:
+        monkeypatch.setenv("FS_AUTO_SNAPSHOT", auto_snapshot)
+    assert _write(workspace, "big.txt", "x" * 90).startswith("Content")
+    fs._fs_opt(FSOperation(operation="delete", path="big.txt"), workspace)
+    # 自动快照在配额不足时被删除，为新的写入腾出空间
+    assert _write(workspace, "new.txt", "y" * 90).startswith("Content")
+    assert all(not s.automatic for s in get_store(workspace).list())
+    usage = get_ledger(workspace).read()
+    assert (usage.bytes, usage.snapshot_bytes) == (95, 0)
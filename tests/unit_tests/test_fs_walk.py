@@ -0,0 +1,90 @@
+"""Test the ignore-aware traversal engine."""
+
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+import pytest
+
+from agent.tools import filesystem as fs
+from agent.tools.filesystem import FSOperation
+from agent.tools.fs.globbing import iter_glob
+from agent.tools.fs.search import iter_files
+from agent.tools.fs.walk import IgnoreRules, format_size, summarize, walk
+
+
+@pytest.fixture
+def workspace():
+    with TemporaryDirectory() as temp_dir:
+        root = Path(temp_dir).resolve()
+        for rel in (
+            "a.txt",
+            "app.log",
+            "src/main.py",
+            "src/pkg/util.py",
+            "src/pkg/deep/x.py",
+            "node_modules/lib/index.js",
+            ".git/HEAD",
+        ):
+            (root / rel).parent.mkdir(parents=True, exist_ok=True)
+            (root / rel).write_text("needle\n", encoding="utf-8")
+        (root / ".gitignore").write_text("*.log\n", encoding="utf-8")
+        yield root
+
+
+def test_ignore_rules() -> None:
+    rules = IgnoreRules(["# comment", "*.log", "!keep.log", "/build/", "docs/**/*.md"])
+    assert rules.ignored("x/app.log", is_dir=False)
+    assert not rules.ignored("x/keep.log", is_dir=False)
+    assert rules.ignored("build", is_dir=True)
+    assert not rules.ignored("build", is_dir=False)
+    assert not rules.ignored("src/build", is_dir=True)
+    assert rules.ignored("docs/a/b.md", is_dir=False)
+
+
+def test_walk_prunes_ignored_and_deep_directories(workspace: Path) -> None:
+    rules = IgnoreRules([".git/", "node_modules/"])
+    nodes = list(walk(workspace, rules=rules, max_depth=2))
+    rels = [n.rel for n in nodes]
+    assert ".git" not in rels and "node_modules" not in rels
+    assert "src/pkg" in rels and "src/pkg/util.py" not in rels
+    assert next(n for n in nodes if n.rel == "src/pkg").pruned == "depth"
+    assert summarize(workspace, "src/pkg").files == 2
+
+    nodes = list(walk(workspace, rules=rules, include_ignored=True, max_depth=1))
+    assert next(n for n in nodes if n.rel == ".git").pruned == "ignored"
+
+
+def test_iter_files_and_glob_skip_ignored(workspace: Path) -> None:
+    files = [p.relative_to(workspace).as_posix() for p in iter_files(workspace)]
+    assert files == [
+        ".gitignore",
+        "a.txt",
+        "src/main.py",
+        "src/pkg/deep/x.py",
+        "src/pkg/util.py",
+    ]
+    assert "node_modules/lib/index.js" not in list(iter_glob(workspace, "**/*.js"))
+    # 显式指定的被忽略目录仍然可以遍历
+    assert list(iter_glob(workspace, ".git/*")) == [".git/HEAD"]
+
+    (workspace / ".fsignore").write_text("!node_modules/\n", encoding="utf-8")
+    assert list(iter_glob(workspace, "**/*.js")) == ["node_modules/lib/index.js"]
+
+
+def test_list_depth_summary_and_entry_cap(workspace: Path) -> None:
+    op = FSOperation(operation="list", path=".", max_depth=1)
+    lines = fs._fs_opt(op, workspace).splitlines()
+    assert "├── .git/ (ignored)" in lines
+    assert "├── node_modules/ (ignored)" in lines
+    assert "└── src/ (3 files, 21 B)" in lines
+    assert not any("app.log" in line for line in lines)
+
+    op = FSOperation(operation="list", path=".", max_entries=2)
+    lines = fs._fs_opt(op, workspace).splitlines()
+    assert lines[-1] == "... listing truncated at 2 entries"
+    assert len(lines) == 4
+
+
+def test_format_size() -> None:
+    assert format_size(512) == "512 B"
+    assert format_size(3 * 1024 * 1024 + 200 * 1024) == "3.2 MB"
@@ -0,0 +1,87 @@
+"""Test the shared HTTP connection pool of the model clients."""
+
+import asyncio
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from agent import http_pool
+from agent.agent import clear_agent_cache, create_custom_agent
+
+COMPLETION = {
+    "id": "chatcmpl-1",
+    "object": "chat.completion",
+    "created": 0,
+    "model": "gpt-4o-mini",
+    "choices": [
+        {
+            "index": 0,
+            "message": {"role": "assistant", "content": "pong"},
+            "finish_reason": "stop",
+        }
+    ],
+    "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # 头和正文一起发送，避免 Nagle 与延迟 ACK 叠加的 40ms 等待
+    wbufsize = 1 << 16
+
+    def do_POST(self) -> None:
+        self.rfile.read(int(self.headers["Content-Length"]))
+        body = json.dumps(COMPLETION).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+@pytest.fixture
+def server(monkeypatch):
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+    monkeypatch.setenv("OPENAI_BASE_URL", f"http://127.0.0.1:{httpd.server_port}/v1")
+    http_pool.reset_pool()
+    clear_agent_cache()
+    yield httpd
+    clear_agent_cache()
+    http_pool.reset_pool()
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_connections_are_reused(server) -> None:
+    for _ in range(3):
+        assert create_custom_agent(use_tools=False).invoke("ping").content == "pong"
+    metrics = http_pool.pool_metrics()
+    assert metrics["requests"] == 3
+    assert metrics["responses"] == 3
+    assert metrics["connections_opened"] == 1
+    assert metrics["reused"] == 2
+
+
+def test_async_client_works_across_event_loops(server) -> None:
+    async def call() -> str:
+        result = await create_custom_agent(use_tools=False).ainvoke("ping")
+        return result.content
+
+    assert asyncio.run(call()) == "pong"
+    assert asyncio.run(call()) == "pong"
+    assert http_pool.pool_metrics()["requests"] == 2
+
+
+def test_limits_from_environment(monkeypatch) -> None:
+    monkeypatch.setenv("LLM_HTTP_MAX_CONNECTIONS", "7")
+    monkeypatch.setenv("LLM_HTTP_KEEPALIVE_SECONDS", "5")
+    limits = http_pool.limits()
+    assert limits.max_connections == 7
+    assert limits.keepalive_expiry == 5
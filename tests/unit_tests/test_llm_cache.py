@@ -0,0 +1,163 @@
+"""Test the persistent model response cache."""
+
+import json
+import time
+from pathlib import Path
+
+import pytest
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+from langchain_core.outputs import ChatGeneration
+from langgraph.graph import END, START, MessagesState, StateGraph
+
+from agent.llm_cache import SQLiteResponseCache
+from agent.minhash import signature, similarity
+
+
+@pytest.fixture
+def cache(tmp_path: Path) -> SQLiteResponseCache:
+    return SQLiteResponseCache(tmp_path / "cache.sqlite3")
+
+
+def _model(cache: SQLiteResponseCache, *answers: str) -> GenericFakeChatModel:
+    return GenericFakeChatModel(
+        messages=iter(AIMessage(content=a) for a in answers), cache=cache
+    )
+
+
+def test_identical_calls_are_served_from_cache(
+    cache: SQLiteResponseCache, tmp_path: Path
+) -> None:
+    model = _model(cache, "first", "second")
+    assert model.invoke("hi").content == "first"
+    # 消息 id 不同也应命中
+    assert model.invoke([HumanMessage("hi", id="other")]).content == "first"
+    assert model.invoke("bye").content == "second"
+    assert (cache.hits, cache.misses, len(cache)) == (1, 2, 2)
+
+    reopened = SQLiteResponseCache(tmp_path / "cache.sqlite3")
+    assert _model(reopened).invoke("hi").content == "first"
+    assert reopened._connection().execute("PRAGMA journal_mode").fetchone() == ("wal",)
+
+
+def test_expired_entries_are_ignored(tmp_path: Path) -> None:
+    cache = SQLiteResponseCache(tmp_path / "cache.sqlite3", ttl=0.01)
+    model = _model(cache, "first", "second")
+    assert model.invoke("hi").content == "first"
+    time.sleep(0.02)
+    assert model.invoke("hi").content == "second"
+    time.sleep(0.02)
+    assert cache.evict() == 1
+
+
+def test_least_recently_used_are_evicted(tmp_path: Path) -> None:
+    cache = SQLiteResponseCache(tmp_path / "cache.sqlite3", max_bytes=1000)
+    for i in range(5):
+        cache.update(f"p{i}", "llm", [ChatGeneration(message=AIMessage("x" * 150))])
+        time.sleep(0.001)
+    cache.lookup("p0", "llm")
+    cache.update("p5", "llm", [ChatGeneration(message=AIMessage("x" * 150))])
+    assert cache.evict() > 0
+    assert cache.lookup("p0", "llm") is not None
+    assert cache.lookup("p1", "llm") is None
+
+
+def test_nodes_can_bypass_the_cache(cache: SQLiteResponseCache, monkeypatch) -> None:
+    model = _model(cache, *(str(i) for i in range(10)))
+
+    def classify(state: MessagesState) -> dict:
+        return {"messages": [model.invoke(state["messages"])]}
+
+    builder = StateGraph(MessagesState)
+    builder.add_node("classify", classify)
+    builder.add_edge(START, "classify")
+    builder.add_edge("classify", END)
+    graph = builder.compile()
+
+    def answer(config: dict | None = None) -> str:
+        return graph.invoke({"messages": [HumanMessage("hi")]}, config)["messages"][
+            -1
+        ].content
+
+    assert answer() == answer() == "0"
+    assert answer({"configurable": {"llm_cache": False}}) == "1"
+    assert answer({"configurable": {"llm_cache_bypass": ["classify"]}}) == "2"
+    monkeypatch.setenv("LLM_CACHE_BYPASS_NODES", "classify")
+    assert answer() == "3"
+
+
+QUESTION = "I want a fantasy novel about a dragon who learns to read, set in a mountain kingdom."
+REWORDED = "I want a fantasy novel about a dragon that learns to read, set in a mountain kingdom!"
+
+
+def _near_graph(model: GenericFakeChatModel):
+    def node(state: MessagesState) -> dict:
+        return {"messages": [model.invoke(state["messages"])]}
+
+    builder = StateGraph(MessagesState)
+    builder.add_node("extract_goal", node)
+    builder.add_edge(START, "extract_goal")
+    builder.add_edge("extract_goal", END)
+    graph = builder.compile()
+
+    def answer(
+        text: str,
+        system: str = "Extract the goal.",
+        near: bool = True,
+        user: str = "alice",
+    ) -> str:
+        config = {"configurable": {"llm_near_cache": ["extract_goal"] if near else []}}
+        messages = [SystemMessage(system), HumanMessage(text)]
+        result = graph.invoke({"messages": messages}, config, context={"user_id": user})
+        return result["messages"][-1].content
+
+    return answer
+
+
+def test_near_duplicates_are_served_to_opted_in_nodes(tmp_path: Path) -> None:
+    audit = tmp_path / "audit.jsonl"
+    cache = SQLiteResponseCache(
+        tmp_path / "cache.sqlite3", near_threshold=0.8, audit_path=audit
+    )
+    answer = _near_graph(_model(cache, *(str(i) for i in range(10))))
+
+    assert answer(QUESTION) == "0"
+    assert answer(REWORDED) == "0"
+    assert answer("Summarize the quarterly sales report of the northern region.") == "1"
+    assert answer(REWORDED, system="Extract the genre.") == "2"
+    assert answer(QUESTION + " Dark tone.", near=False) == "3"
+    # 其他用户的近似问题不会命中 alice 的回答
+    assert answer(QUESTION + " Please.", user="bob") == "4"
+
+    record = json.loads(audit.read_text(encoding="utf-8"))
+    assert record["event"] == "hit"
+    assert record["node"] == "extract_goal"
+    assert record["scope"] == "user:alice"
+    assert 0.8 <= record["similarity"] < 1
+    stats = cache.stats()
+    assert (stats["hits"], stats["near_hits"], stats["near_misses"]) == (0, 1, 4)
+    assert stats["hit_rate"] == 1 / 6
+
+
+def test_audited_near_hits_are_checked_against_the_model(tmp_path: Path) -> None:
+    audit = tmp_path / "audit.jsonl"
+    cache = SQLiteResponseCache(
+        tmp_path / "cache.sqlite3",
+        near_threshold=0.8,
+        audit_path=audit,
+        audit_rate=1.0,
+    )
+    answer = _near_graph(_model(cache, "fantasy", "romance"))
+
+    assert answer(QUESTION) == "fantasy"
+    assert answer(REWORDED) == "romance"
+    record = json.loads(audit.read_text(encoding="utf-8"))
+    assert record["event"] == "audit"
+    assert record["agree"] is False
+    assert cache.stats()["audits"] == 1
+
+
+def test_minhash_similarity() -> None:
+    assert similarity(signature(QUESTION), signature(QUESTION)) == 1
+    assert similarity(signature(QUESTION), signature(REWORDED)) > 0.8
+    assert similarity(signature(QUESTION), signature("Summarize the report.")) < 0.2
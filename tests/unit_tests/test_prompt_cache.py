@@ -0,0 +1,81 @@
+"""Test the prefix-stable message layout and the prompt-cache telemetry."""
+
+from pathlib import Path
+
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+from langgraph.graph import END, START, MessagesState, StateGraph
+
+from agent.llm_cache import SQLiteResponseCache
+from agent.prompts import layout_messages
+from agent.role_graph.wizard_v1 import prompt_template
+from agent.telemetry import PromptCacheTelemetry
+
+
+def test_layout_puts_static_prompt_first() -> None:
+    history = [HumanMessage("hi"), AIMessage("hello")]
+    messages = layout_messages("static", "goal: x", history, "question")
+    assert messages == [
+        SystemMessage("static"),
+        SystemMessage("goal: x"),
+        *history,
+        HumanMessage("question"),
+    ]
+    assert layout_messages("static") == [SystemMessage("static")]
+
+
+def test_wizard_system_prompt_is_static() -> None:
+    def first_message(background: str, examples: str) -> str:
+        prompt = prompt_template.invoke(
+            {
+                "role": "r",
+                "profile": "p",
+                "background": background,
+                "constraints": "c",
+                "workflow": "",
+                "standard_output": "",
+                "examples": examples,
+                "messages": [],
+            }
+        )
+        return prompt.to_messages()[0].content
+
+    assert first_message("a", "b") == first_message("other", "run")
+
+
+def _usage(cached: int) -> dict:
+    return {
+        "input_tokens": 100,
+        "output_tokens": 1,
+        "total_tokens": 101,
+        "input_token_details": {"cache_read": cached},
+    }
+
+
+def test_cached_tokens_are_recorded_per_node(tmp_path: Path) -> None:
+    telemetry = PromptCacheTelemetry(tmp_path / "usage.jsonl")
+    answers = [AIMessage("a", usage_metadata=_usage(c)) for c in (0, 80, 80)]
+    model = GenericFakeChatModel(
+        messages=iter(answers),
+        callbacks=[telemetry],
+        cache=SQLiteResponseCache(tmp_path / "cache.sqlite3"),
+    )
+
+    def node(state: MessagesState) -> dict:
+        return {"messages": [model.invoke(state["messages"])]}
+
+    builder = StateGraph(MessagesState)
+    builder.add_node("extract_goal", node)
+    builder.add_edge(START, "extract_goal")
+    builder.add_edge("extract_goal", END)
+    graph = builder.compile()
+    for text in ("one", "two", "three", "three"):
+        graph.invoke({"messages": [HumanMessage(text)]})
+
+    stats = telemetry.stats()["extract_goal"]
+    assert (stats.calls, stats.local_hits) == (4, 1)
+    assert (stats.input_tokens, stats.cached_tokens) == (300, 160)
+    assert "extract_goal: 4 calls, 160/300 input tokens cached (53%)" in (
+        telemetry.summary()
+    )
+    assert len((tmp_path / "usage.jsonl").read_text().splitlines()) == 4